@@ -3,6 +3,8 @@ Módulo de herramientas para los agentes financieros.
 Cada agente tiene su archivo de herramientas separado.
 """
 
+from datastore import cachear_herramientas
+
 from .ar_manager_tools import (
     AR_MANAGER_TOOLS,
     consultar_facturas,
@@ -18,7 +20,10 @@ from .tesorero_tools import (
     consultar_pagos_pendientes,
     consultar_deuda_bancaria,
     consultar_gastos_fijos,
-    analisis_liquidez
+    analisis_liquidez,
+    proyeccion_flujo_caja,
+    estres_liquidez,
+    escenarios_euribor
 )
 
 from .controller_tools import (
@@ -32,7 +37,8 @@ from .fpa_analyst_tools import (
     FPA_ANALYST_TOOLS,
     consultar_ocupacion,
     consultar_kpis,
-    analisis_desviaciones
+    analisis_desviaciones,
+    escenarios_ocupacion_precio
 )
 
 from .fiscalista_tools import (
@@ -45,6 +51,7 @@ from .gestor_activos_tools import (
     GESTOR_ACTIVOS_TOOLS,
     consultar_activos_fijos,
     calcular_amortizacion_mensual,
+    proyeccion_amortizaciones,
     consultar_mantenimientos
 )
 
@@ -77,6 +84,11 @@ AGENT_TOOLS = {
     "gestor_activos": GESTOR_ACTIVOS_TOOLS
 }
 
+# Las herramientas de datos guardan sus resultados en la cache versionada
+# (las de búsqueda web no dependen de data/ y quedan fuera)
+_WEB_TOOL_NAMES = {t.name for t in WEB_SEARCH_TOOLS}
+cachear_herramientas(t for tools in AGENT_TOOLS.values() for t in tools if t.name not in _WEB_TOOL_NAMES)
+
 
 def get_tools_for_agent(agent_key: str) -> list:
     """
@@ -6,13 +6,12 @@ Normativa española y formato de moneda EUR (1.234,56€).
 
 from langchain_core.tools import tool
 from .web_tools import buscar_normativa_fiscal
-import pandas as pd
-import os
-from datetime import datetime
-from .utils import formato_euro, formato_numero, formato_porcentaje
+from datastore import data_store, indice_estudiantes, buscar_facturas, resumen_cobros, fila_estudiante, resolver_as_of
+from engines import calcular_aging, ranking_morosos, scoring_pagos
+from .utils import formato_euro, formato_numero, formato_porcentaje, formato_fecha
 
-# Configuración
-DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data")
+MOROSOS_POR_PAGINA = 15
+ICONOS_RIESGO = {"alto": "🔴", "medio": "🟡", "bajo": "🟢"}
 
 
 @tool
@@ -28,26 +27,20 @@ def consultar_facturas(estado: str = "todas", residencia: str = "todas") -> str:
         Listado de facturas con id, estudiante, importe, estado, vencimiento
     """
     try:
-        df = pd.read_csv(os.path.join(DATA_PATH, "facturas_emitidas.csv"))
-        
-        if estado != "todas":
-            df = df[df["estado"] == estado]
-        if residencia != "todas":
-            df = df[df["residencia"].str.contains(residencia, case=False, na=False)]
-        
-        if df.empty:
+        # Totales desde el cubo (o SQL); solo se leen las filas del listado
+        num_facturas, total, df = buscar_facturas(estado, residencia, limite=20)
+        if num_facturas == 0:
             return "No se encontraron facturas con los filtros especificados."
         
-        total = df["importe"].sum()
-        resultado = f"📋 **{len(df)} facturas encontradas** | Total: {formato_euro(total)}\n\n"
+        resultado = f"📋 **{num_facturas} facturas encontradas** | Total: {formato_euro(total)}\n\n"
         resultado += "| Factura | Estudiante | Concepto | Importe | Estado | Vencimiento |\n"
         resultado += "|---------|------------|----------|---------|--------|-------------|\n"
         
-        for _, row in df.head(20).iterrows():
-            resultado += f"| {row['id_factura']} | {row['id_estudiante']} | {row['concepto'][:15]}... | {formato_euro(row['importe'])} | {row['estado']} | {row['fecha_vencimiento']} |\n"
+        for _, row in df.iterrows():
+            resultado += f"| {row['id_factura']} | {row['id_estudiante']} | {row['concepto'][:15]}... | {formato_euro(row['importe'])} | {row['estado']} | {formato_fecha(row['fecha_vencimiento'], '%Y-%m-%d')} |\n"
         
-        if len(df) > 20:
-            resultado += f"\n*Mostrando 20 de {len(df)} facturas*"
+        if num_facturas > 20:
+            resultado += f"\n*Mostrando 20 de {num_facturas} facturas*"
         
         return resultado
     except Exception as e:
@@ -55,57 +48,51 @@ def consultar_facturas(estado: str = "todas", residencia: str = "todas") -> str:
 
 
 @tool
-def consultar_morosos(dias_minimo: int = 1) -> str:
+def consultar_morosos(dias_minimo: int = 1, pagina: int = 1, as_of: str = "") -> str:
     """
     Obtiene listado de estudiantes con facturas vencidas (morosos).
     Según Ley 3/2004 de morosidad en operaciones comerciales.
     
     Args:
         dias_minimo: Días mínimos de retraso para considerar moroso (default: 1)
+        pagina: Página del listado, 15 morosos por página ordenados por deuda (default: 1)
+        as_of: Fecha de análisis YYYY-MM-DD (opcional, por defecto hoy)
     
     Returns:
         Lista de morosos con nombre, deuda total, días de retraso, contacto
     """
     try:
-        facturas = pd.read_csv(os.path.join(DATA_PATH, "facturas_emitidas.csv"))
-        estudiantes = pd.read_csv(os.path.join(DATA_PATH, "estudiantes.csv"))
-        
-        vencidas = facturas[facturas["estado"] == "vencida"].copy()
-        
-        if vencidas.empty:
-            return "✅ ¡Excelente! No hay estudiantes morosos. Todas las facturas están al día."
+        hoy = resolver_as_of(as_of)
+        ranking = ranking_morosos(dias_minimo=dias_minimo, as_of=hoy)
         
-        vencidas["fecha_vencimiento"] = pd.to_datetime(vencidas["fecha_vencimiento"])
-        vencidas["dias_retraso"] = (datetime.now() - vencidas["fecha_vencimiento"]).dt.days
-        vencidas = vencidas[vencidas["dias_retraso"] >= dias_minimo]
-        
-        if vencidas.empty:
+        if ranking.total_morosos == 0:
+            if resumen_cobros(dias_minimo=dias_minimo, ahora=hoy).num_vencidas == 0:
+                return "✅ ¡Excelente! No hay estudiantes morosos. Todas las facturas están al día."
             return f"✅ No hay morosos con más de {dias_minimo} días de retraso."
         
-        morosos = vencidas.groupby("id_estudiante").agg({
-            "importe": "sum",
-            "id_factura": "count",
-            "dias_retraso": "max"
-        }).reset_index()
-        morosos.columns = ["id_estudiante", "deuda_total", "num_facturas", "max_dias_retraso"]
-        morosos = morosos.merge(estudiantes, on="id_estudiante", how="left")
-        morosos = morosos.sort_values("deuda_total", ascending=False)
+        desde = (max(pagina, 1) - 1) * MOROSOS_POR_PAGINA
+        morosos = ranking.pagina(MOROSOS_POR_PAGINA, desde)
+        if morosos.empty:
+            return f"❌ La página {pagina} no existe: hay {ranking.total_morosos} morosos."
+        morosos = scoring_pagos(hoy).anotar(morosos)
         
-        total_deuda = morosos['deuda_total'].sum()
         resultado = f"🔴 **LISTADO DE MOROSOS**\n"
-        resultado += f"Total morosos: {len(morosos)} | Deuda total: {formato_euro(total_deuda)}\n\n"
+        resultado += f"Total morosos: {ranking.total_morosos} | Deuda total: {formato_euro(ranking.deuda_total)}\n\n"
         
-        for _, m in morosos.head(15).iterrows():
+        for _, m in morosos.iterrows():
             resultado += f"""**{m['nombre']}** ({m['id_estudiante']})
 - Deuda: {formato_euro(m['deuda_total'])} ({int(m['num_facturas'])} facturas)
 - Días máximo retraso: {int(m['max_dias_retraso'])}
+- Riesgo de impago: {ICONOS_RIESGO.get(m['nivel_riesgo'], '')} {formato_porcentaje(m['prob_impago'])} (perfil {m['perfil']})
 - Residencia: {m['residencia']} - Hab. {m['habitacion']}
 - Email: {m['email']}
 - Teléfono: {m['telefono']}
 
 """
-        if len(morosos) > 15:
-            resultado += f"\n*Mostrando 15 de {len(morosos)} morosos*"
+        if desde > 0 or ranking.hay_mas(MOROSOS_POR_PAGINA, desde):
+            resultado += f"\n*Mostrando {desde + 1}-{desde + len(morosos)} de {ranking.total_morosos} morosos*"
+            if ranking.hay_mas(MOROSOS_POR_PAGINA, desde):
+                resultado += f" (siguiente: pagina={max(pagina, 1) + 1})"
         
         return resultado
     except Exception as e:
@@ -124,20 +111,20 @@ def consultar_estudiante(id_estudiante: str) -> str:
         Ficha completa con datos personales, alojamiento y facturas
     """
     try:
-        estudiantes = pd.read_csv(os.path.join(DATA_PATH, "estudiantes.csv"))
-        facturas = pd.read_csv(os.path.join(DATA_PATH, "facturas_emitidas.csv"))
-        
-        est = estudiantes[estudiantes["id_estudiante"] == id_estudiante.upper()]
+        est = fila_estudiante(id_estudiante.upper())
         
         if est.empty:
             return f"❌ Estudiante {id_estudiante} no encontrado. Verifica el ID."
         
         est = est.iloc[0]
-        fact_est = facturas[facturas["id_estudiante"] == id_estudiante.upper()]
+        # Índice por estudiante: sin escanear toda la tabla de facturas
+        indice = indice_estudiantes()
+        fact_est = indice.facturas_de(id_estudiante.upper())
+        totales = indice.totales(id_estudiante.upper())
         
-        pagadas = fact_est[fact_est["estado"] == "pagada"]["importe"].sum()
-        pendientes = fact_est[fact_est["estado"] == "pendiente"]["importe"].sum()
-        vencidas = fact_est[fact_est["estado"] == "vencida"]["importe"].sum()
+        pagadas = totales["pagado"]
+        pendientes = totales["pendiente"]
+        vencidas = totales["vencido"]
         
         resultado = f"""## 👤 Ficha: {est['nombre']}
 
@@ -149,7 +136,7 @@ def consultar_estudiante(id_estudiante: str) -> str:
 ### Alojamiento
 - **Residencia:** {est['residencia']}
 - **Habitación:** {est['habitacion']}
-- **Fecha entrada:** {est['fecha_entrada']}
+- **Fecha entrada:** {formato_fecha(est['fecha_entrada'], '%Y-%m-%d')}
 - **Cuota mensual:** {formato_euro(est['cuota_mensual'])}
 
 ### Resumen Financiero
@@ -171,88 +158,83 @@ def consultar_estudiante(id_estudiante: str) -> str:
 
 
 @tool
-def generar_aging_report() -> str:
+def generar_aging_report(as_of: str = "") -> str:
     """
     Genera análisis de antigüedad de cuentas por cobrar (Aging Report).
     Clasifica facturas pendientes por tramos según normativa española.
     
+    Args:
+        as_of: Fecha de análisis YYYY-MM-DD (opcional, por defecto hoy)
+    
     Returns:
         Reporte aging con importes y porcentajes por tramo
     """
     try:
-        facturas = pd.read_csv(os.path.join(DATA_PATH, "facturas_emitidas.csv"))
-        pendientes = facturas[facturas["estado"].isin(["pendiente", "vencida"])].copy()
+        aging = calcular_aging(resolver_as_of(as_of))
         
-        if pendientes.empty:
+        if aging.total_facturas == 0:
             return "✅ No hay facturas pendientes de cobro."
         
-        pendientes["fecha_vencimiento"] = pd.to_datetime(pendientes["fecha_vencimiento"])
-        pendientes["dias"] = (datetime.now() - pendientes["fecha_vencimiento"]).dt.days
-        
-        def clasificar(dias):
-            if dias <= 0: return "No vencido"
-            elif dias <= 30: return "1-30 días"
-            elif dias <= 60: return "31-60 días"
-            elif dias <= 90: return "61-90 días"
-            return ">90 días"
-        
-        pendientes["tramo"] = pendientes["dias"].apply(clasificar)
-        aging = pendientes.groupby("tramo").agg({"importe": ["sum", "count"]}).reset_index()
-        aging.columns = ["tramo", "importe", "num_facturas"]
-        
-        total = aging["importe"].sum()
+        total = aging.total_importe
         
         resultado = f"""## 📊 AGING DE CUENTAS POR COBRAR
-**Total pendiente:** {formato_euro(total)}
+**Fecha de corte:** {aging.as_of.strftime('%d/%m/%Y')} | **Total pendiente:** {formato_euro(total)}
 
 | Tramo | Importe | Facturas | % Total |
 |-------|---------|----------|---------|
 """
-        orden = ["No vencido", "1-30 días", "31-60 días", "61-90 días", ">90 días"]
-        for tramo in orden:
-            row = aging[aging["tramo"] == tramo]
-            if not row.empty:
-                imp = row["importe"].values[0]
-                num = int(row["num_facturas"].values[0])
-                pct = (imp / total) * 100
-                icono = "🟢" if tramo == "No vencido" else "🟡" if "30" in tramo else "🟠" if "60" in tramo else "🔴"
-                resultado += f"| {icono} {tramo} | {formato_euro(imp)} | {num} | {formato_porcentaje(pct)} |\n"
-        
-        resultado += f"| **TOTAL** | **{formato_euro(total)}** | **{len(pendientes)}** | **100%** |"
+        for _, row in aging.presentes().iterrows():
+            tramo = row["etiqueta"]
+            imp = row["importe"]
+            num = int(row["num_facturas"])
+            pct = (imp / total) * 100
+            icono = "🟢" if tramo == "No vencido" else "🟡" if "30" in tramo else "🟠" if "60" in tramo else "🔴"
+            resultado += f"| {icono} {tramo} | {formato_euro(imp)} | {num} | {formato_porcentaje(pct)} |\n"
+        
+        resultado += f"| **TOTAL** | **{formato_euro(total)}** | **{aging.total_facturas}** | **100%** |"
         return resultado
     except Exception as e:
         return f"Error: {str(e)}"
 
 
 @tool
-def prevision_cobros_semanal() -> str:
+def prevision_cobros_semanal(as_of: str = "") -> str:
     """
     Genera previsión de cobros para enviar al Tesorero.
-    Lista facturas pendientes ordenadas por fecha de vencimiento.
+    Lista facturas pendientes ordenadas por fecha de vencimiento, con la
+    probabilidad de cobro según el historial de pagos de cada estudiante.
+    
+    Args:
+        as_of: Fecha de análisis YYYY-MM-DD (opcional, por defecto hoy)
     
     Returns:
         Previsión de cobros con fechas e importes para planificación de tesorería
     """
     try:
-        facturas = pd.read_csv(os.path.join(DATA_PATH, "facturas_emitidas.csv"))
-        pendientes = facturas[facturas["estado"] == "pendiente"].copy()
-        pendientes["fecha_vencimiento"] = pd.to_datetime(pendientes["fecha_vencimiento"])
-        pendientes = pendientes.sort_values("fecha_vencimiento")
+        # Solo se conservan los 30 primeros vencimientos; los totales cubren todas
+        hoy = resolver_as_of(as_of)
+        resumen = resumen_cobros(max_cobros=30, ahora=hoy)
+        scoring = scoring_pagos(hoy)
+        pendientes = resumen.cobros()
+        if not pendientes.empty:
+            pendientes = scoring.anotar(pendientes)
         
-        total = pendientes["importe"].sum()
+        total = resumen.importe_previsto
         
         resultado = f"""## 📅 PREVISIÓN DE COBROS
-**Para:** Tesorero | **Generado:** {datetime.now().strftime('%d/%m/%Y %H:%M')}
+**Para:** Tesorero | **Generado:** {hoy.strftime('%d/%m/%Y')}
 **Total previsto:** {formato_euro(total)}
+**Cobro esperado (ajustado por riesgo):** {formato_euro(scoring.cobro_esperado())}
 
-| Fecha Venc. | Estudiante | Residencia | Importe |
-|-------------|------------|------------|---------|
+| Fecha Venc. | Estudiante | Residencia | Importe | Prob. Cobro |
+|-------------|------------|------------|---------|-------------|
 """
-        for _, row in pendientes.head(30).iterrows():
-            resultado += f"| {row['fecha_vencimiento'].strftime('%d/%m/%Y')} | {row['id_estudiante']} | {row['residencia'][:15]} | {formato_euro(row['importe'])} |\n"
+        for _, row in pendientes.iterrows():
+            icono = ICONOS_RIESGO.get(row['nivel_riesgo'], '')
+            resultado += f"| {row['fecha_vencimiento'].strftime('%d/%m/%Y')} | {row['id_estudiante']} | {row['residencia'][:15]} | {formato_euro(row['importe'])} | {icono} {formato_porcentaje(100 - row['prob_impago'])} |\n"
         
-        if len(pendientes) > 30:
-            resultado += f"\n*Mostrando 30 de {len(pendientes)} cobros previstos*"
+        if resumen.num_previstos > 30:
+            resultado += f"\n*Mostrando 30 de {resumen.num_previstos} cobros previstos*"
         
         return resultado
     except Exception as e:
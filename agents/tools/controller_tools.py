@@ -7,29 +7,10 @@ Formato EUR (1.234,56€).
 
 from langchain_core.tools import tool
 from .web_tools import buscar_normativa_fiscal, buscar_indicadores_economicos
-import pandas as pd
-import os
-from datetime import datetime
+from datastore import ahora, data_store
+from engines import NOTA_GASTOS_ESTIMADOS, gastos_anuales, gastos_estimados
 from .utils import formato_euro, formato_numero, formato_porcentaje
 
-# Configuración
-DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data")
-
-def normalizar_tipo(tipo_val):
-    """Normaliza los valores de tipo (activo/pasivo/patrimonio)."""
-    tipo_lower = str(tipo_val).lower().strip()
-    if tipo_lower in ['act', 'activo', 'a']:
-        return 'activo'
-    elif tipo_lower in ['pas', 'pasivo', 'p']:
-        return 'pasivo'
-    elif tipo_lower in ['pat', 'patrimonio', 'pn', 'neto']:
-        return 'patrimonio'
-    elif tipo_lower in ['ing', 'ingreso', 'ingresos', 'i']:
-        return 'ingreso'
-    elif tipo_lower in ['gas', 'gasto', 'gastos', 'g']:
-        return 'gasto'
-    return tipo_lower
-
 
 @tool
 def consultar_balance() -> str:
@@ -41,8 +22,7 @@ def consultar_balance() -> str:
         Balance de situación con totales por masa patrimonial
     """
     try:
-        df = pd.read_csv(os.path.join(DATA_PATH, "balance.csv"))
-        df['tipo_norm'] = df['tipo'].apply(normalizar_tipo)
+        df = data_store.get("balance")
         
         activo = df[df["tipo_norm"] == "activo"]["importe"].sum()
         pasivo = df[df["tipo_norm"] == "pasivo"]["importe"].sum()
@@ -53,7 +33,7 @@ def consultar_balance() -> str:
             patrimonio = activo - pasivo
         
         resultado = f"""## 📊 BALANCE DE SITUACIÓN
-**Fecha:** {datetime.now().strftime('%d/%m/%Y')}
+**Fecha:** {ahora().strftime('%d/%m/%Y')}
 **Según Plan General Contable (RD 1514/2007)**
 
 | Masa Patrimonial | Importe |
@@ -85,19 +65,11 @@ def consultar_cuenta_resultados() -> str:
         Cuenta de resultados con ingresos, gastos y resultado neto
     """
     try:
-        df = pd.read_csv(os.path.join(DATA_PATH, "cuenta_resultados.csv"))
-        df['tipo_norm'] = df['tipo'].apply(normalizar_tipo)
+        df = data_store.get("cuenta_resultados")
         
         ingresos = df[df["tipo_norm"] == "ingreso"]["importe"].sum()
-        gastos = df[df["tipo_norm"] == "gasto"]["importe"].sum()
-        
-        # Si no hay gastos en el CSV, cargar de gastos_fijos
-        if gastos == 0:
-            try:
-                gastos_df = pd.read_csv(os.path.join(DATA_PATH, "gastos_fijos.csv"))
-                gastos = gastos_df["importe_mensual"].sum() * 12  # Anualizar
-            except:
-                pass
+        # Si no hay gastos en el CSV, se usan los gastos fijos anualizados
+        gastos = gastos_anuales()
         
         resultado_neto = ingresos - gastos
         margen = (resultado_neto / ingresos * 100) if ingresos > 0 else 0
@@ -110,7 +82,7 @@ def consultar_cuenta_resultados() -> str:
 |----------|------|---------|
 """
         for _, row in df.iterrows():
-            signo = "+" if normalizar_tipo(row["tipo"]) == "ingreso" else "-"
+            signo = "+" if row["tipo_norm"] == "ingreso" else "-"
             resultado += f"| {row['concepto']} | {row['tipo']} | {signo}{formato_euro(row['importe'])} |\n"
         
         resultado += f"""
@@ -122,6 +94,8 @@ def consultar_cuenta_resultados() -> str:
 | **Resultado Neto** | **{formato_euro(resultado_neto)}** |
 | Margen | {formato_porcentaje(margen)} |
 """
+        if gastos_estimados():
+            resultado += f"\n⚠️ *{NOTA_GASTOS_ESTIMADOS}*\n"
         return resultado
     except Exception as e:
         return f"Error: {str(e)}"
@@ -137,11 +111,8 @@ def calcular_ratios_financieros() -> str:
         Ratios financieros con valores, interpretación y semáforo
     """
     try:
-        balance = pd.read_csv(os.path.join(DATA_PATH, "balance.csv"))
-        balance['tipo_norm'] = balance['tipo'].apply(normalizar_tipo)
-        
-        pyg = pd.read_csv(os.path.join(DATA_PATH, "cuenta_resultados.csv"))
-        pyg['tipo_norm'] = pyg['tipo'].apply(normalizar_tipo)
+        balance = data_store.get("balance")
+        pyg = data_store.get("cuenta_resultados")
         
         activo = balance[balance["tipo_norm"] == "activo"]["importe"].sum()
         pasivo = balance[balance["tipo_norm"] == "pasivo"]["importe"].sum()
@@ -152,8 +123,7 @@ def calcular_ratios_financieros() -> str:
             patrimonio = activo - pasivo
         
         ingresos = pyg[pyg["tipo_norm"] == "ingreso"]["importe"].sum()
-        gastos = pyg[pyg["tipo_norm"] == "gasto"]["importe"].sum()
-        resultado = ingresos - gastos
+        resultado = ingresos - gastos_anuales()
         
         liquidez = activo / pasivo if pasivo > 0 else 0
         endeudamiento = (pasivo / activo * 100) if activo > 0 else 0
@@ -185,6 +155,8 @@ def calcular_ratios_financieros() -> str:
 - **ROE:** Rentabilidad sobre fondos propios
 - **Margen:** Beneficio por cada euro de ingreso
 """
+        if gastos_estimados():
+            resultado_txt += f"\n⚠️ *{NOTA_GASTOS_ESTIMADOS}*\n"
         return resultado_txt
     except Exception as e:
         return f"Error: {str(e)}"
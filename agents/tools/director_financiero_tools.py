@@ -6,13 +6,10 @@ Normativa española y formato EUR (1.234,56€).
 
 from langchain_core.tools import tool
 from .web_tools import buscar_tipos_interes, buscar_mercado_residencias, buscar_indicadores_economicos
-import pandas as pd
-import os
-from datetime import datetime
+from datastore import ahora, data_store, cubo_facturas
+from engines import NOTA_GASTOS_ESTIMADOS, calcular_kpis, gastos_estimados
 from .utils import formato_euro, formato_numero, formato_porcentaje
 
-# Configuración
-DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data")
 
 @tool
 def generar_dashboard_ejecutivo() -> str:
@@ -25,31 +22,32 @@ def generar_dashboard_ejecutivo() -> str:
     """
     try:
         # Cargar todos los datos necesarios
-        caja = pd.read_csv(os.path.join(DATA_PATH, "posicion_caja.csv"))
-        facturas = pd.read_csv(os.path.join(DATA_PATH, "facturas_emitidas.csv"))
-        ocupacion = pd.read_csv(os.path.join(DATA_PATH, "ocupacion.csv"))
-        deuda = pd.read_csv(os.path.join(DATA_PATH, "deuda_bancaria.csv"))
-        kpis = pd.read_csv(os.path.join(DATA_PATH, "kpis.csv"))
+        caja = data_store.get("posicion_caja")
+        cubo = cubo_facturas()
+        ocupacion = data_store.get("ocupacion")
+        deuda = data_store.get("deuda_bancaria")
+        kpis = calcular_kpis().set_index("kpi")
         
         # Calcular métricas
         saldo_caja = caja["saldo"].sum()
         
-        total_facturado = facturas["importe"].sum()
-        cobrado = facturas[facturas["estado"] == "pagada"]["importe"].sum()
-        pendiente = facturas[facturas["estado"] == "pendiente"]["importe"].sum()
-        vencido = facturas[facturas["estado"] == "vencida"]["importe"].sum()
+        # Totales por estado desde el cubo de facturación
+        total_facturado = cubo.importe()
+        cobrado = cubo.importe(estado="pagada")
+        pendiente = cubo.importe(estado="pendiente")
+        vencido = cubo.importe(estado="vencida")
         
         total_plazas = ocupacion["capacidad"].sum()
         plazas_ocupadas = ocupacion["ocupacion_actual"].sum()
-        pct_ocupacion = (plazas_ocupadas / total_plazas * 100) if total_plazas > 0 else 0
+        pct_ocupacion = kpis.loc["ocupacion", "valor"]
         
         deuda_total = deuda["capital_pendiente"].sum()
         cuota_mensual = deuda["cuota_mensual"].sum()
         
-        tasa_morosidad = (vencido / total_facturado * 100) if total_facturado > 0 else 0
+        tasa_morosidad = kpis.loc["morosidad", "valor"]
         
         resultado = f"""## 📊 DASHBOARD EJECUTIVO
-**Fecha:** {datetime.now().strftime('%d/%m/%Y %H:%M')}
+**Fecha:** {ahora().strftime('%d/%m/%Y')}
 **Empresa:** Grupo Residencias Estudiantiles, S.L.
 
 ---
@@ -85,7 +83,7 @@ def generar_dashboard_ejecutivo() -> str:
 ### 📋 KPIs CLAVE
 """
         for _, kpi in kpis.iterrows():
-            unidad = kpi.get('unidad', '')
+            unidad = kpi['unidad']
             valor = kpi['valor']
             if unidad == '€':
                 valor_fmt = formato_euro(valor)
@@ -95,6 +93,8 @@ def generar_dashboard_ejecutivo() -> str:
                 valor_fmt = f"{formato_numero(valor, 1)} {unidad}"
             resultado += f"- **{kpi['nombre']}:** {valor_fmt}\n"
         
+        if "ebitda" in kpis.index and gastos_estimados():
+            resultado += f"\n⚠️ *{NOTA_GASTOS_ESTIMADOS}*\n"
         return resultado
     except Exception as e:
         return f"Error generando dashboard: {str(e)}"
@@ -110,21 +110,11 @@ def resumen_para_consejo() -> str:
     """
     try:
         # Cargar datos
-        balance = pd.read_csv(os.path.join(DATA_PATH, "balance.csv"))
-        pyg = pd.read_csv(os.path.join(DATA_PATH, "cuenta_resultados.csv"))
-        ocupacion = pd.read_csv(os.path.join(DATA_PATH, "ocupacion.csv"))
-        
-        # Normalizar tipos
-        def norm_tipo(t):
-            t = str(t).lower()
-            if t in ['act', 'activo']: return 'activo'
-            if t in ['pas', 'pasivo']: return 'pasivo'
-            if t in ['ing', 'ingreso']: return 'ingreso'
-            return t
-        
-        balance['tipo_norm'] = balance['tipo'].apply(norm_tipo)
-        pyg['tipo_norm'] = pyg['tipo'].apply(norm_tipo)
+        balance = data_store.get("balance")
+        pyg = data_store.get("cuenta_resultados")
+        ocupacion = data_store.get("ocupacion")
         
+        # tipo_norm viene normalizado desde la carga (datastore/schemas.py)
         activo = balance[balance['tipo_norm'] == 'activo']['importe'].sum()
         pasivo = balance[balance['tipo_norm'] == 'pasivo']['importe'].sum()
         patrimonio = activo - pasivo
@@ -135,7 +125,7 @@ def resumen_para_consejo() -> str:
         ocupadas = ocupacion['ocupacion_actual'].sum()
         
         resultado = f"""## 📋 INFORME PARA CONSEJO DE ADMINISTRACIÓN
-**Fecha:** {datetime.now().strftime('%d/%m/%Y')}
+**Fecha:** {ahora().strftime('%d/%m/%Y')}
 **Ejercicio:** 2025
 
 ---
@@ -6,13 +6,10 @@ Formato EUR (1.234,56€).
 """
 
 from langchain_core.tools import tool
-import pandas as pd
-import os
-from .utils import formato_euro, formato_numero, formato_porcentaje
+from datastore import data_store
+from .utils import formato_euro, formato_numero, formato_porcentaje, formato_fecha
 from .web_tools import buscar_normativa_fiscal, consultar_boe_aeat
 
-# Configuración
-DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data")
 
 @tool
 def consultar_obligaciones_fiscales() -> str:
@@ -24,7 +21,7 @@ def consultar_obligaciones_fiscales() -> str:
         Calendario de obligaciones fiscales con modelos, fechas y estados
     """
     try:
-        df = pd.read_csv(os.path.join(DATA_PATH, "obligaciones_fiscales.csv"))
+        df = data_store.get("obligaciones_fiscales")
         
         resultado = """## ⚖️ OBLIGACIONES FISCALES (AEAT)
 
@@ -34,7 +31,7 @@ def consultar_obligaciones_fiscales() -> str:
         for _, row in df.iterrows():
             estado = str(row['estado']).lower()
             icono = "✅" if estado == "presentado" else "🟡" if estado in ["pendiente", "pdte"] else "🔴"
-            resultado += f"| {row['modelo']} | {row['concepto']} | {row['periodo']} | {row['fecha_limite']} | {icono} {row['estado']} | {formato_euro(row['importe_estimado'])} |\n"
+            resultado += f"| {row['modelo']} | {row['concepto']} | {row['periodo']} | {formato_fecha(row['fecha_limite'], '%Y-%m-%d')} | {icono} {row['estado']} | {formato_euro(row['importe_estimado'])} |\n"
         
         resultado += """
 ### Calendario AEAT 2025
@@ -59,8 +56,8 @@ def calcular_liquidacion_iva() -> str:
         Cálculo de IVA: repercutido - soportado = resultado a ingresar/compensar
     """
     try:
-        soportado = pd.read_csv(os.path.join(DATA_PATH, "iva_soportado.csv"))
-        repercutido = pd.read_csv(os.path.join(DATA_PATH, "iva_repercutido.csv"))
+        soportado = data_store.get("iva_soportado")
+        repercutido = data_store.get("iva_repercutido")
         
         # Detectar nombres de columnas (flexibilidad)
         def get_col(df, options):
@@ -7,11 +7,11 @@ Normativa española y formato EUR (1.234,56€).
 from langchain_core.tools import tool
 from .web_tools import buscar_mercado_residencias, buscar_indicadores_economicos
 import pandas as pd
-import os
+from datastore import data_store
+from engines import (NOTA_GASTOS_ESTIMADOS, calcular_kpis, calcular_desviaciones, escenarios_fpa, gastos_estimados,
+                     rango, semaforo)
 from .utils import formato_euro, formato_numero, formato_porcentaje
 
-# Configuración
-DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data")
 
 @tool
 def consultar_ocupacion() -> str:
@@ -22,7 +22,7 @@ def consultar_ocupacion() -> str:
         Ocupación por residencia con plazas totales, ocupadas y porcentaje
     """
     try:
-        df = pd.read_csv(os.path.join(DATA_PATH, "ocupacion.csv"))
+        df = data_store.get("ocupacion")
         
         total_capacidad = df["capacidad"].sum()
         total_ocupacion = df["ocupacion_actual"].sum()
@@ -49,38 +49,39 @@ def consultar_ocupacion() -> str:
 
 
 @tool
-def consultar_kpis() -> str:
+def consultar_kpis(residencia: str = "todas", desde: str = "", hasta: str = "") -> str:
     """
-    Consulta los KPIs operativos y financieros principales.
+    Consulta los KPIs operativos y financieros principales, calculados
+    desde las facturas, la ocupación y la cuenta de resultados.
+    
+    Args:
+        residencia: Residencia a analizar - todas o nombre de residencia
+        desde: Primer mes de emisión a incluir (YYYY-MM, opcional)
+        hasta: Último mes de emisión a incluir (YYYY-MM, opcional)
     
     Returns:
         Dashboard de KPIs con valor actual, objetivo y estado
     """
     try:
-        df = pd.read_csv(os.path.join(DATA_PATH, "kpis.csv"))
+        df = calcular_kpis(residencia=residencia, desde=desde or None, hasta=hasta or None)
+        
+        titulo = "## 📈 DASHBOARD DE KPIs"
+        if residencia != "todas":
+            titulo += f" - {residencia}"
+        if desde or hasta:
+            titulo += f" ({desde or 'inicio'} a {hasta or 'hoy'})"
         
-        resultado = """## 📈 DASHBOARD DE KPIs
+        resultado = f"""{titulo}
 
 | KPI | Valor | Objetivo | Unidad | Estado |
 |-----|-------|----------|--------|--------|
 """
         for _, row in df.iterrows():
             valor = row['valor']
-            objetivo = row.get('objetivo', None)
-            unidad = row.get('unidad', '')
-            
-            # Determinar si cumple objetivo
-            if pd.notna(objetivo):
-                if unidad == '%' and 'morosidad' in row['nombre'].lower():
-                    cumple = valor <= objetivo  # Para morosidad, menor es mejor
-                elif unidad == 'días':
-                    cumple = valor <= objetivo  # Para DSO, menor es mejor
-                else:
-                    cumple = valor >= objetivo
-            else:
-                cumple = True
+            objetivo = row['objetivo']
+            unidad = row['unidad']
             
-            icono = "🟢" if cumple else "🔴"
+            icono = "🟢" if row['cumple'] else "🔴"
             
             # Formatear valor según unidad
             if unidad == '€':
@@ -95,34 +96,73 @@ def consultar_kpis() -> str:
             
             resultado += f"| {row['nombre']} | {valor_fmt} | {obj_fmt} | {unidad} | {icono} |\n"
         
+        if (df["kpi"] == "ebitda").any() and gastos_estimados():
+            resultado += f"\n⚠️ *{NOTA_GASTOS_ESTIMADOS}*\n"
         return resultado
     except Exception as e:
         return f"Error: {str(e)}"
 
 
 @tool
-def analisis_desviaciones() -> str:
+def analisis_desviaciones(residencia: str = "todas", desde: str = "", hasta: str = "") -> str:
     """
-    Compara presupuesto con datos reales y analiza desviaciones.
+    Compara el presupuesto con los reales (facturas emitidas y gastos fijos)
+    y descompone la desviación de ingresos en precio, volumen y mix. Sin
+    residencia desglosa por residencia; con residencia, por mes.
+    
+    Args:
+        residencia: Residencia a analizar - todas o nombre de residencia
+        desde: Primer mes a incluir (YYYY-MM, opcional)
+        hasta: Último mes a incluir (YYYY-MM, opcional)
     
     Returns:
         Análisis de desviaciones presupuestarias con causas
     """
     try:
-        df = pd.read_csv(os.path.join(DATA_PATH, "desviaciones.csv"))
+        filtros = {"residencia": residencia, "desde": desde or None, "hasta": hasta or None}
+        total = calcular_desviaciones("total", **filtros).iloc[0]
+        nivel = "residencia" if residencia == "todas" else "mes"
+        detalle = calcular_desviaciones(nivel, **filtros)
+        
+        if total["facturas_real"] == 0 and total["facturas_ppto"] == 0:
+            return f"No hay reales ni presupuesto para '{residencia}' en el periodo indicado."
         
-        resultado = """## 📊 ANÁLISIS DE DESVIACIONES PRESUPUESTARIAS
-**Ejercicio 2025**
+        titulo = "## 📊 ANÁLISIS DE DESVIACIONES PRESUPUESTARIAS"
+        if residencia != "todas":
+            titulo += f" - {residencia}"
+        periodo = f"{desde or 'inicio'} a {hasta or 'fin'}" if desde or hasta else "Ejercicio completo"
+        
+        resultado = f"""{titulo}
+**Periodo:** {periodo}
 
 | Concepto | Presupuesto | Real | Desviación | % |
 |----------|-------------|------|------------|---|
 """
-        for _, row in df.iterrows():
-            desv = row['real'] - row['presupuesto']
-            pct = (desv / row['presupuesto'] * 100) if row['presupuesto'] != 0 else 0
-            icono = "🟢" if abs(pct) < 5 else "🟡" if abs(pct) < 10 else "🔴"
+        filas = [
+            ("Ingresos", total["ingresos_ppto"], total["ingresos_real"]),
+            ("Gastos fijos", total["gastos_ppto"], total["gastos_real"]),
+            ("Margen (ingresos - gastos fijos)", total["ingresos_ppto"] - total["gastos_ppto"], total["ingresos_real"] - total["gastos_real"]),
+        ]
+        for concepto, presupuesto, real in filas:
+            desv = real - presupuesto
+            pct = (desv / presupuesto * 100) if presupuesto != 0 else 0
             signo = "+" if desv >= 0 else ""
-            resultado += f"| {row['concepto']} | {formato_euro(row['presupuesto'])} | {formato_euro(row['real'])} | {icono} {signo}{formato_euro(desv)} | {signo}{formato_porcentaje(pct)} |\n"
+            resultado += f"| {concepto} | {formato_euro(presupuesto)} | {formato_euro(real)} | {semaforo(pct)} {signo}{formato_euro(desv)} | {signo}{formato_porcentaje(pct)} |\n"
+        
+        resultado += f"""
+### Causas de la desviación de ingresos
+- **Precio:** {formato_euro(total['desv_precio'])} (precio real frente al presupuestado)
+- **Volumen:** {formato_euro(total['desv_volumen'])} ({formato_numero(total['facturas_real'], 0)} facturas frente a {formato_numero(total['facturas_ppto'], 0)} presupuestadas)
+- **Mix:** {formato_euro(total['desv_mix'])} (peso de residencias y meses de distinto precio)
+
+### Detalle por {nivel}
+| {nivel.capitalize()} | Ingresos Real | Desv. Precio | Desv. Volumen | Desv. Mix | Desv. Gastos | Desv. Resultado |
+|---|---|---|---|---|---|---|
+"""
+        if nivel == "residencia":
+            detalle = detalle.reindex(detalle["desv_resultado"].abs().sort_values(ascending=False, kind="stable").index)
+        for grupo, row in detalle.iterrows():
+            resultado += f"| {grupo} | {formato_euro(row['ingresos_real'])} | {formato_euro(row['desv_precio'])} | {formato_euro(row['desv_volumen'])} | {formato_euro(row['desv_mix'])} | {formato_euro(row['desv_gastos'])} | {formato_euro(row['desv_resultado'])} |\n"
         
         resultado += """
 ### Interpretación
@@ -135,10 +175,87 @@ def analisis_desviaciones() -> str:
         return f"Error: {str(e)}"
 
 
+@tool
+def escenarios_ocupacion_precio(variacion_precio_max: float = 10.0, ocupacion_min: float = 80.0,
+                                morosidad_max: float = 10.0, residencia: str = "todas") -> str:
+    """
+    Escenarios what-if de precio, ocupación y morosidad: evalúa una rejilla
+    completa (variación de precio ±variacion_precio_max en pasos de 1 punto,
+    ocupación de ocupacion_min a 100% y morosidad de 0 a morosidad_max en
+    pasos de 0,5) y devuelve el impacto en ingresos, EBITDA y caja anuales.
+    
+    Args:
+        variacion_precio_max: Variación máxima de precio en % (default: 10)
+        ocupacion_min: Ocupación mínima a evaluar en % (default: 80)
+        morosidad_max: Morosidad máxima a evaluar en % (default: 10)
+        residencia: Nombre de la residencia o "todas"
+    
+    Returns:
+        Situación actual, sensibilidad precio × ocupación, mejores y peores
+        escenarios y ocupación de equilibrio de caja
+    """
+    try:
+        rejilla = escenarios_fpa(
+            rango(-abs(variacion_precio_max), abs(variacion_precio_max), 1),
+            rango(min(ocupacion_min, 100), 100, 1),
+            rango(0, morosidad_max, 0.5),
+            residencia=residencia
+        )
+        actual = rejilla.actual
+        
+        resultado = f"""## 🎯 ESCENARIOS DE OCUPACIÓN Y PRECIO
+**Residencias:** {residencia} ({len(rejilla.residencias)}) | **Escenarios evaluados:** {formato_numero(rejilla.num_celdas, 0)}
+
+### Situación actual (anual)
+- **Ocupación:** {formato_porcentaje(actual['ocupacion'])} | **Morosidad:** {formato_porcentaje(actual['morosidad'])}
+- **Ingresos:** {formato_euro(actual['ingresos'])}
+- **EBITDA:** {formato_euro(actual['ebitda'])}
+- **Caja (tras servicio de la deuda):** {formato_euro(actual['caja'])}
+"""
+        corte = rejilla.corte(actual["morosidad"])
+        morosidad_corte = rejilla.celda(0, 100, actual["morosidad"])["morosidad"]
+        resultado += f"""
+### Sensibilidad del EBITDA (morosidad {formato_porcentaje(morosidad_corte)})
+| Precio \\ Ocupación |"""
+        ocupaciones = [o for o in corte.columns if o in (corte.columns[0], 90.0, 95.0, 100.0)]
+        precios = [p for p in corte.index if p in (corte.index[0], -5.0, 0.0, 5.0, corte.index[-1])]
+        resultado += "".join(f" {formato_porcentaje(o)} |" for o in ocupaciones) + "\n"
+        resultado += "|---|" + "---|" * len(ocupaciones) + "\n"
+        for p in precios:
+            signo = "+" if p > 0 else ""
+            resultado += f"| {signo}{formato_porcentaje(p)} |" + "".join(
+                f" {formato_euro(corte.loc[p, o])} |" for o in ocupaciones) + "\n"
+        
+        tabla = rejilla.tabla()
+        for titulo, filas in (("🟢 Mejores escenarios", tabla.nlargest(3, "ebitda")),
+                              ("🔴 Peores escenarios", tabla.nsmallest(3, "ebitda"))):
+            resultado += f"""
+### {titulo}
+| Precio | Ocupación | Morosidad | EBITDA | Δ EBITDA | Δ Caja |
+|--------|-----------|-----------|--------|----------|--------|
+"""
+            for _, row in filas.iterrows():
+                signo = "+" if row['variacion_precio'] > 0 else ""
+                resultado += f"| {signo}{formato_porcentaje(row['variacion_precio'])} | {formato_porcentaje(row['ocupacion'])} | {formato_porcentaje(row['morosidad'])} | {formato_euro(row['ebitda'])} | {formato_euro(row['delta_ebitda'])} | {formato_euro(row['delta_caja'])} |\n"
+        
+        equilibrio = rejilla.equilibrio("caja")
+        peor = equilibrio.iloc[0, -1]
+        if equilibrio.isna().all().all():
+            resultado += "\n⚠️ **Ningún escenario de la rejilla genera caja positiva.**\n"
+        elif peor == peor:
+            resultado += f"\n*Ocupación mínima para caja positiva en el peor caso (precio {formato_porcentaje(equilibrio.index[0])}, morosidad {formato_porcentaje(equilibrio.columns[-1])}): {formato_porcentaje(peor)}*\n"
+        else:
+            resultado += f"\n⚠️ *En el peor caso (precio {formato_porcentaje(equilibrio.index[0])}, morosidad {formato_porcentaje(equilibrio.columns[-1])}) ninguna ocupación de la rejilla genera caja positiva.*\n"
+        return resultado
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
 # Lista de herramientas para exportar
 FPA_ANALYST_TOOLS = [
     consultar_ocupacion,
     consultar_kpis,
     analisis_desviaciones,
+    escenarios_ocupacion_precio,
     buscar_mercado_residencias, buscar_indicadores_economicos
 ]
@@ -7,13 +7,11 @@ Formato EUR (1.234,56€).
 
 from langchain_core.tools import tool
 from .web_tools import buscar_normativa_fiscal
-import pandas as pd
-import os
-from datetime import datetime, timedelta
+from datetime import timedelta
+from datastore import data_store, resolver_as_of
+from engines import METODOS_AMORTIZACION, calendario_amortizacion
 from .utils import formato_euro, formato_numero, formato_porcentaje
 
-# Configuración
-DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data")
 
 @tool
 def consultar_activos_fijos(categoria: str = "todos") -> str:
@@ -27,7 +25,7 @@ def consultar_activos_fijos(categoria: str = "todos") -> str:
         Lista de activos con valor de adquisición, amortización y valor neto
     """
     try:
-        df = pd.read_csv(os.path.join(DATA_PATH, "activos_fijos.csv"))
+        df = data_store.get("activos_fijos")
         
         if categoria != "todos":
             df = df[df["categoria"].str.lower().str.contains(categoria.lower())]
@@ -60,42 +58,55 @@ def consultar_activos_fijos(categoria: str = "todos") -> str:
 
 
 @tool
-def calcular_amortizacion_mensual() -> str:
+def calcular_amortizacion_mensual(as_of: str = "") -> str:
     """
-    Calcula la amortización mensual de todos los activos.
-    Método lineal según tablas de amortización del Impuesto de Sociedades.
+    Calcula la amortización del mes en curso de todos los activos desde su
+    fecha de adquisición (prorrateando el primer mes y las bajas), con el
+    método de cada activo (lineal por defecto, según tablas del Impuesto de Sociedades).
+    
+    Args:
+        as_of: Fecha de análisis YYYY-MM-DD (opcional, por defecto hoy)
     
     Returns:
         Cuadro de amortización mensual para enviar al Controller
     """
     try:
-        df = pd.read_csv(os.path.join(DATA_PATH, "activos_fijos.csv"))
-        df = df[df["vida_util_anos"] > 0].copy()
-        
-        df["amort_anual"] = df["valor_adquisicion"] / df["vida_util_anos"]
-        df["amort_mensual"] = df["amort_anual"] / 12
+        hoy = resolver_as_of(as_of)
+        calendario = calendario_amortizacion()
+        situacion = calendario.situacion(hoy)
+        df = data_store.get("activos_fijos").reset_index(drop=True).join(
+            situacion[["metodo", "dotacion_mes", "acumulada_calculada", "valor_neto_calculado", "en_servicio", "amortizado"]])
+        df = df[(df["vida_util_anos"] > 0) & df["en_servicio"]]
         
-        total_mensual = df["amort_mensual"].sum()
-        total_anual = df["amort_anual"].sum()
+        anual = calendario.por_anio()
+        anio = anual[anual["anio"] == hoy.year]
+        total_mensual = df["dotacion_mes"].sum()
+        total_anual = float(anio["dotacion"].iloc[0]) if not anio.empty else 0.0
+        diferencia = df["acumulada_calculada"].sum() - df["amortizacion_acumulada"].sum()
+        metodos = ", ".join(METODOS_AMORTIZACION[m]["nombre"] for m in sorted(df["metodo"].unique()))
         
         resultado = f"""## 📉 CUADRO DE AMORTIZACIÓN
-**Para:** Controller | **Fecha:** {datetime.now().strftime('%d/%m/%Y')}
-**Método:** Lineal según tablas IS (Ley 27/2014)
+**Para:** Controller | **Fecha:** {hoy.strftime('%d/%m/%Y')}
+**Método:** {metodos or 'Lineal'} según tablas IS (Ley 27/2014)
 
 ### Resumen
 | Período | Importe |
 |---------|---------|
-| Amortización Mensual | {formato_euro(total_mensual)} |
-| Amortización Anual | {formato_euro(total_anual)} |
+| Amortización Mensual ({hoy.strftime('%m/%Y')}) | {formato_euro(total_mensual)} |
+| Amortización Anual ({hoy.year}) | {formato_euro(total_anual)} |
+| Amortización Acumulada (calculada) | {formato_euro(df['acumulada_calculada'].sum())} |
+| Amortización Acumulada (contabilizada) | {formato_euro(df['amortizacion_acumulada'].sum())} |
+| Diferencia a regularizar | {formato_euro(diferencia)} |
 
 ### Detalle por Activo
-| Activo | Categoría | V. Adquisición | Vida Útil | Amort. Mensual |
-|--------|-----------|----------------|-----------|----------------|
+| Activo | Categoría | V. Adquisición | Vida Útil | Amort. Mensual | Amort. Acum. | V. Neto |
+|--------|-----------|----------------|-----------|----------------|--------------|---------|
 """
         for _, row in df.iterrows():
-            resultado += f"| {row['descripcion'][:25]} | {row['categoria']} | {formato_euro(row['valor_adquisicion'])} | {int(row['vida_util_anos'])} años | {formato_euro(row['amort_mensual'])} |\n"
+            icono = " ✅" if row['amortizado'] else ""
+            resultado += f"| {row['descripcion'][:25]} | {row['categoria']} | {formato_euro(row['valor_adquisicion'])} | {int(row['vida_util_anos'])} años | {formato_euro(row['dotacion_mes'])} | {formato_euro(row['acumulada_calculada'])} | {formato_euro(row['valor_neto_calculado'])}{icono} |\n"
         
-        resultado += f"| **TOTAL** | | | | **{formato_euro(total_mensual)}** |"
+        resultado += f"| **TOTAL** | | | | **{formato_euro(total_mensual)}** | **{formato_euro(df['acumulada_calculada'].sum())}** | **{formato_euro(df['valor_neto_calculado'].sum())}** |"
         
         resultado += """
 
@@ -112,21 +123,61 @@ def calcular_amortizacion_mensual() -> str:
 
 
 @tool
-def consultar_mantenimientos(dias: int = 60) -> str:
+def proyeccion_amortizaciones(anios: int = 5, categoria: str = "todos", as_of: str = "") -> str:
+    """
+    Proyección anual de la amortización de los activos fijos a lo largo de
+    su vida útil: dotación, amortización acumulada y valor neto contable al
+    cierre de cada año.
+    
+    Args:
+        anios: Años a proyectar desde el actual (default: 5)
+        categoria: Filtrar por tipo - todos, inmuebles, mobiliario, equipos, vehiculos
+        as_of: Fecha de análisis YYYY-MM-DD (opcional, por defecto hoy)
+    
+    Returns:
+        Cuadro anual de dotaciones y valor neto contable
+    """
+    try:
+        anio_actual = resolver_as_of(as_of).year
+        anual = calendario_amortizacion().por_anio(categoria)
+        tabla = anual[(anual["anio"] >= anio_actual) & (anual["anio"] < anio_actual + anios)]
+        
+        if tabla.empty:
+            return f"No hay amortizaciones previstas para '{categoria}' en los próximos {anios} años."
+        
+        resultado = f"""## 📆 PROYECCIÓN DE AMORTIZACIONES
+**Filtro:** {categoria} | **Años:** {anio_actual}-{anio_actual + anios - 1}
+**Dotación total del periodo:** {formato_euro(tabla['dotacion'].sum())}
+
+| Año | Dotación | Amort. Acumulada | Valor Neto Contable | Bajas |
+|-----|----------|------------------|---------------------|-------|
+"""
+        for _, row in tabla.iterrows():
+            resultado += f"| {int(row['anio'])} | {formato_euro(row['dotacion'])} | {formato_euro(row['acumulada'])} | {formato_euro(row['valor_neto'])} | {formato_euro(row['bajas'])} |\n"
+        
+        ultimo = anual.iloc[-1]
+        resultado += f"\n*Fin de la vida útil de los activos actuales: {int(ultimo['anio'])}*\n"
+        return resultado
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+@tool
+def consultar_mantenimientos(dias: int = 60, as_of: str = "") -> str:
     """
     Lista los mantenimientos programados en los próximos días.
     
     Args:
         dias: Días hacia adelante para buscar mantenimientos (default: 60)
+        as_of: Fecha de análisis YYYY-MM-DD (opcional, por defecto hoy)
     
     Returns:
         Mantenimientos programados con fechas, tipo y coste estimado
     """
     try:
-        df = pd.read_csv(os.path.join(DATA_PATH, "mantenimientos.csv"))
-        df["proximo_mantenimiento"] = pd.to_datetime(df["proximo_mantenimiento"])
+        df = data_store.get("mantenimientos")
         
-        limite = datetime.now() + timedelta(days=dias)
+        limite = resolver_as_of(as_of) + timedelta(days=dias)
         proximos = df[df["proximo_mantenimiento"] <= limite].sort_values("proximo_mantenimiento")
         
         if proximos.empty:
@@ -154,6 +205,7 @@ def consultar_mantenimientos(dias: int = 60) -> str:
 GESTOR_ACTIVOS_TOOLS = [
     consultar_activos_fijos,
     calcular_amortizacion_mensual,
+    proyeccion_amortizaciones,
     consultar_mantenimientos,
     buscar_normativa_fiscal
 ]
@@ -5,14 +5,31 @@ Normativa española y formato EUR (1.234,56€).
 """
 
 from langchain_core.tools import tool
-import pandas as pd
-import os
-from datetime import datetime, timedelta
-from .utils import formato_euro, formato_numero, formato_porcentaje
-from .web_tools import buscar_tipos_interes, buscar_indicadores_economicos
+from datetime import timedelta
+from typing import Optional
+import secrets
+from datastore import ahora, data_store, resolver_as_of
+from engines import CHOQUES_EURIBOR_PB, cuadro_amortizacion, proyectar_caja, simular_estres_liquidez
+from .utils import formato_euro, formato_numero, formato_porcentaje, formato_fecha
+from .web_tools import DATOS_MERCADO, buscar_tipos_interes, buscar_indicadores_economicos
+
+
+def notas_cuadro_deuda(cuadro) -> str:
+    """Supuestos del cuadro de amortización: modalidad fijo/variable y diferencia entre cuota contractual y recalculada."""
+    notas = ""
+    if not cuadro.modalidad_informada:
+        num_variables = int(cuadro.prestamos["variable"].sum())
+        notas += (f"\n⚠️ *deuda_bancaria.csv no indica la modalidad (fijo/variable): se consideran variables "
+                  f"los préstamos cuyo tipo no dice \"fijo\" ({num_variables} de {len(cuadro.prestamos)}).*\n")
+    conciliacion = cuadro.conciliacion_cuota()
+    if abs(conciliacion["diferencia"]) >= 1:
+        notas += (f"\n⚠️ *La cuota recalculada (sistema francés con capital pendiente, tipo y meses hasta el "
+                  f"vencimiento) es {formato_euro(conciliacion['cuota_calculada'])} frente a "
+                  f"{formato_euro(conciliacion['cuota_contractual'])} contractuales "
+                  f"({formato_euro(conciliacion['diferencia'])}): con esa cuota contractual el capital no se "
+                  f"amortizaría en el plazo restante (carencia, cuota final o datos desactualizados).*\n")
+    return notas
 
-# Configuración
-DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data")
 
 @tool
 def consultar_posicion_caja() -> str:
@@ -23,11 +40,11 @@ def consultar_posicion_caja() -> str:
         Saldo total disponible y desglose por cuenta bancaria
     """
     try:
-        df = pd.read_csv(os.path.join(DATA_PATH, "posicion_caja.csv"))
+        df = data_store.get("posicion_caja")
         total = df["saldo"].sum()
         
         resultado = f"""## 🏦 POSICIÓN DE CAJA
-**Fecha:** {datetime.now().strftime('%d/%m/%Y %H:%M')}
+**Fecha:** {ahora().strftime('%d/%m/%Y')}
 **Saldo Total Disponible: {formato_euro(total)}**
 
 | Banco | Cuenta | Tipo | Saldo |
@@ -42,21 +59,21 @@ def consultar_posicion_caja() -> str:
 
 
 @tool
-def consultar_pagos_pendientes(dias: int = 30) -> str:
+def consultar_pagos_pendientes(dias: int = 30, as_of: str = "") -> str:
     """
     Lista los pagos pendientes de realizar en los próximos días.
     
     Args:
         dias: Días hacia adelante para buscar vencimientos (default: 30)
+        as_of: Fecha de análisis YYYY-MM-DD (opcional, por defecto hoy)
     
     Returns:
         Lista de pagos con proveedor, concepto, importe y fecha de vencimiento
     """
     try:
-        df = pd.read_csv(os.path.join(DATA_PATH, "pagos_pendientes.csv"))
-        df["fecha_vencimiento"] = pd.to_datetime(df["fecha_vencimiento"])
+        df = data_store.get("pagos_pendientes")
         
-        limite = datetime.now() + timedelta(days=dias)
+        limite = resolver_as_of(as_of) + timedelta(days=dias)
         proximos = df[df["fecha_vencimiento"] <= limite].sort_values("fecha_vencimiento")
         
         if proximos.empty:
@@ -81,28 +98,35 @@ def consultar_pagos_pendientes(dias: int = 30) -> str:
 
 
 @tool
-def consultar_deuda_bancaria() -> str:
+def consultar_deuda_bancaria(as_of: str = "") -> str:
     """
     Obtiene el detalle de la deuda bancaria (préstamos e hipotecas).
     
+    Args:
+        as_of: Fecha de análisis YYYY-MM-DD (opcional, por defecto hoy)
+    
     Returns:
-        Lista de préstamos con capital pendiente, cuota mensual, tipo de interés y vencimiento
+        Lista de préstamos con capital pendiente, cuota mensual (contractual y
+        según el cuadro de amortización), intereses pendientes y vencimiento
     """
     try:
-        df = pd.read_csv(os.path.join(DATA_PATH, "deuda_bancaria.csv"))
+        cuadro = cuadro_amortizacion(resolver_as_of(as_of))
+        df = cuadro.prestamos
         
         total_deuda = df["capital_pendiente"].sum()
         cuota_total = df["cuota_mensual"].sum()
         
         resultado = f"""## 🏛️ DEUDA BANCARIA
 **Deuda total:** {formato_euro(total_deuda)} | **Cuota mensual total:** {formato_euro(cuota_total)}
+**Cuota según cuadro de amortización:** {formato_euro(df['cuota_calculada'].sum())} | **Intereses pendientes:** {formato_euro(df['intereses_pendientes'].sum())}
 
-| Entidad | Tipo | Capital Pendiente | Cuota Mensual | Interés | Vencimiento |
-|---------|------|-------------------|---------------|---------|-------------|
+| Entidad | Tipo | Capital Pendiente | Cuota Mensual | Cuota Cuadro | Interés | Meses | Vencimiento |
+|---------|------|-------------------|---------------|--------------|---------|-------|-------------|
 """
         for _, row in df.iterrows():
-            resultado += f"| {row['entidad']} | {row['tipo'][:25]} | {formato_euro(row['capital_pendiente'])} | {formato_euro(row['cuota_mensual'])} | {formato_porcentaje(row['tipo_interes'])} | {row['fecha_vencimiento']} |\n"
+            resultado += f"| {row['entidad']} | {row['tipo'][:25]} | {formato_euro(row['capital_pendiente'])} | {formato_euro(row['cuota_mensual'])} | {formato_euro(row['cuota_calculada'])} | {formato_porcentaje(row['tipo_interes'])} | {row['meses_restantes']} | {formato_fecha(row['fecha_vencimiento'], '%Y-%m-%d')} |\n"
         
+        resultado += notas_cuadro_deuda(cuadro)
         return resultado
     except Exception as e:
         return f"Error: {str(e)}"
@@ -117,7 +141,7 @@ def consultar_gastos_fijos() -> str:
         Desglose de gastos fijos por categoría con importes mensuales
     """
     try:
-        df = pd.read_csv(os.path.join(DATA_PATH, "gastos_fijos.csv"))
+        df = data_store.get("gastos_fijos")
         total = df["importe_mensual"].sum()
         
         por_categoria = df.groupby("categoria")["importe_mensual"].sum().sort_values(ascending=False)
@@ -155,8 +179,8 @@ def analisis_liquidez() -> str:
         Análisis de liquidez con ratio de cobertura, alertas y recomendaciones
     """
     try:
-        caja = pd.read_csv(os.path.join(DATA_PATH, "posicion_caja.csv"))
-        gastos = pd.read_csv(os.path.join(DATA_PATH, "gastos_fijos.csv"))
+        caja = data_store.get("posicion_caja")
+        gastos = data_store.get("gastos_fijos")
         
         saldo_total = caja["saldo"].sum()
         gastos_mensuales = gastos["importe_mensual"].sum()
@@ -196,6 +220,180 @@ def analisis_liquidez() -> str:
         return f"Error: {str(e)}"
 
 
+@tool
+def proyeccion_flujo_caja(dias: int = 90, as_of: str = "") -> str:
+    """
+    Proyecta día a día el saldo de caja combinando cobros previstos de facturas
+    pendientes, pagos pendientes, gastos fijos y cuotas de préstamos.
+    
+    Args:
+        dias: Horizonte de la proyección en días (default: 90, máximo recomendado: 365)
+        as_of: Fecha de análisis YYYY-MM-DD (opcional, por defecto hoy)
+    
+    Returns:
+        Saldo inicial y final, saldo mínimo, alertas de caja negativa y flujos por semana o mes
+    """
+    try:
+        proyeccion = proyectar_caja(horizonte_dias=dias, as_of=resolver_as_of(as_of))
+        totales = proyeccion.totales()
+        frecuencia, nombre_periodo = ("W", "Semana") if dias <= 92 else ("M", "Mes")
+        periodos = proyeccion.por_periodo(frecuencia)
+        
+        if proyeccion.primer_dia_negativo is not None:
+            semaforo = f"🔴 CAJA NEGATIVA desde el {formato_fecha(proyeccion.primer_dia_negativo)}"
+        elif proyeccion.saldo_minimo < proyeccion.saldo_inicial * 0.25:
+            semaforo = "🟡 TENSIÓN: el saldo cae por debajo del 25% del actual"
+        else:
+            semaforo = "🟢 SIN TENSIONES DE LIQUIDEZ"
+        
+        resultado = f"""## 📅 PROYECCIÓN DE FLUJO DE CAJA ({dias} días)
+
+### Estado: {semaforo}
+
+| Métrica | Valor |
+|---------|-------|
+| Saldo inicial | {formato_euro(proyeccion.saldo_inicial)} |
+| (+) Cobros previstos | {formato_euro(totales['cobros'])} |
+| (-) Pagos pendientes | {formato_euro(-totales['pagos'])} |
+| (-) Gastos fijos | {formato_euro(-totales['gastos_fijos'])} |
+| (-) Cuotas de deuda | {formato_euro(-totales['cuotas_deuda'])} |
+| **Saldo final** | **{formato_euro(proyeccion.saldo_final)}** |
+| Saldo mínimo | {formato_euro(proyeccion.saldo_minimo)} ({formato_fecha(proyeccion.fecha_saldo_minimo)}) |
+
+### Detalle por {nombre_periodo.lower()}
+| {nombre_periodo} | Cobros | Pagos y gastos | Flujo neto | Saldo final |
+|--------|--------|----------------|------------|-------------|
+"""
+        for _, p in periodos.iterrows():
+            salidas = p['pagos'] + p['gastos_fijos'] + p['cuotas_deuda']
+            icono = "🔴" if p['saldo'] < 0 else ""
+            resultado += f"| {formato_fecha(p['inicio'])} | {formato_euro(p['cobros'])} | {formato_euro(-salidas)} | {formato_euro(p['flujo_neto'])} | {icono} {formato_euro(p['saldo'])} |\n"
+        
+        return resultado
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+@tool
+def estres_liquidez(escenarios: int = 2000, dias: int = 365, caida_ocupacion_pct: float = 2.0,
+                    subida_tipos_pb: float = 0.0, factor_impago: float = 1.0, as_of: str = "",
+                    semilla: Optional[int] = None) -> str:
+    """
+    Test de estrés de liquidez por Monte Carlo: simula miles de escenarios con
+    retrasos de pago e impagos por estudiante (según el histórico de cobros),
+    caídas de ocupación y movimientos de tipos de interés.
+    
+    Args:
+        escenarios: Número de escenarios simulados (default: 2000)
+        dias: Horizonte en días (default: 365)
+        caida_ocupacion_pct: Caída media de ocupación en % (default: 2.0)
+        subida_tipos_pb: Movimiento medio de tipos en puntos básicos (default: 0)
+        factor_impago: Multiplicador de la tasa histórica de impago (default: 1.0)
+        as_of: Fecha de análisis YYYY-MM-DD (opcional, por defecto hoy)
+        semilla: Semilla para repetir una simulación (opcional, por defecto aleatoria)
+    
+    Returns:
+        Probabilidad de caja negativa y distribución del saldo mínimo y de los meses de cobertura
+    """
+    try:
+        if semilla is None:
+            semilla = secrets.randbelow(2**32)
+        resultado_estres = simular_estres_liquidez(
+            escenarios=escenarios,
+            horizonte_dias=dias,
+            as_of=resolver_as_of(as_of),
+            parametros={
+                "caida_ocupacion_media": caida_ocupacion_pct / 100,
+                "subida_tipos_media": subida_tipos_pb / 100,
+                "factor_impago": factor_impago
+            },
+            semilla=semilla
+        )
+        dist = resultado_estres.distribucion
+        prob = resultado_estres.prob_caja_negativa * 100
+        
+        if prob >= 5:
+            semaforo = "🔴 RIESGO ALTO"
+        elif prob > 0:
+            semaforo = "🟡 RIESGO MODERADO"
+        else:
+            semaforo = "🟢 SIN ESCENARIOS DE CAJA NEGATIVA"
+        
+        resultado = f"""## 🎲 TEST DE ESTRÉS DE LIQUIDEZ
+**{formato_numero(escenarios, 0)} escenarios a {dias} días** | Semilla: {semilla}
+
+### Estado: {semaforo}
+**Probabilidad de caja negativa: {formato_porcentaje(prob)}**
+
+### Hipótesis
+| Factor | Valor |
+|--------|-------|
+| Retraso medio histórico | {formato_numero(dist.retraso_medio, 1)} días |
+| Tasa de impago mensual | {formato_porcentaje(dist.prob_impago * 100 * factor_impago)} |
+| Caída media de ocupación | {formato_porcentaje(caida_ocupacion_pct)} |
+| Movimiento medio de tipos | {formato_numero(subida_tipos_pb, 0)} pb |
+
+### Distribución de resultados
+| Percentil | Saldo mínimo | Saldo final | Meses de cobertura |
+|-----------|--------------|-------------|--------------------|
+"""
+        for _, p in resultado_estres.percentiles().iterrows():
+            resultado += f"| P{int(p['percentil'])} | {formato_euro(p['saldo_minimo'])} | {formato_euro(p['saldo_final'])} | {formato_numero(p['cobertura_meses'], 1)} |\n"
+        
+        resultado += f"""
+*Referencia (todos pagan al vencimiento, sin shocks): saldo mínimo {formato_euro(resultado_estres.saldo_minimo_al_vencimiento)}*
+"""
+        return resultado
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+@tool
+def escenarios_euribor(choque_pb: int = 200, as_of: str = "") -> str:
+    """
+    Sensibilidad de la deuda bancaria al Euribor: reprecia los préstamos
+    variables bajo una rejilla de subidas y bajadas del Euribor a 12 meses
+    (cuota mensual e intereses a 12 meses y hasta el vencimiento).
+    
+    Args:
+        choque_pb: Escenario a destacar, en puntos básicos (default: +200)
+        as_of: Fecha de análisis YYYY-MM-DD (opcional, por defecto hoy)
+    
+    Returns:
+        Tabla de escenarios con la variación de cuota e intereses frente al actual
+    """
+    try:
+        choques = sorted(set(CHOQUES_EURIBOR_PB) | {int(choque_pb)})
+        cuadro = cuadro_amortizacion(resolver_as_of(as_of))
+        rejilla = cuadro.rejilla_euribor(DATOS_MERCADO["euribor"], choques)
+        actual = rejilla[rejilla["choque_pb"] == 0].iloc[0]
+        destacado = rejilla[rejilla["choque_pb"] == int(choque_pb)].iloc[0]
+        num_variables = int(cuadro.prestamos["variable"].sum())
+        conciliacion = cuadro.conciliacion_cuota()
+        
+        resultado = f"""## 📈 ESCENARIOS DE EURIBOR
+**Euribor 12 meses actual:** {DATOS_MERCADO['euribor']['12_meses']:.3f}% ({DATOS_MERCADO['euribor']['fecha']}) | **Préstamos variables:** {num_variables} de {len(cuadro.prestamos)}{'' if cuadro.modalidad_informada else ' (supuesto)'}
+**Cuota contractual:** {formato_euro(conciliacion['cuota_contractual'])} | **Cuota recalculada (base de los escenarios):** {formato_euro(conciliacion['cuota_calculada'])}
+
+### Escenario {int(choque_pb):+d} pb
+- Cuota mensual: {formato_euro(destacado['cuota_mensual'])} ({formato_euro(destacado['variacion_cuota'])} al mes)
+- Intereses próximos 12 meses: {formato_euro(destacado['intereses_12m'])} ({formato_euro(destacado['intereses_12m'] - actual['intereses_12m'])})
+- Intereses hasta vencimiento: {formato_euro(destacado['intereses_hasta_vencimiento'])} ({formato_euro(destacado['intereses_hasta_vencimiento'] - actual['intereses_hasta_vencimiento'])})
+
+| Shock | Euribor | Cuota Mensual | Variación | Intereses 12m | Intereses hasta Vto. |
+|-------|---------|---------------|-----------|---------------|----------------------|
+"""
+        for _, e in rejilla.iterrows():
+            marca = "**" if e['choque_pb'] == int(choque_pb) else ""
+            resultado += f"| {marca}{int(e['choque_pb']):+d} pb{marca} | {e['euribor']:.3f}% | {formato_euro(e['cuota_mensual'])} | {formato_euro(e['variacion_cuota'])} | {formato_euro(e['intereses_12m'])} | {formato_euro(e['intereses_hasta_vencimiento'])} |\n"
+        
+        resultado += "\n*Los préstamos variables mantienen su diferencial sobre el Euribor; los fijos no cambian. La variación se mide sobre la cuota recalculada.*\n"
+        resultado += notas_cuadro_deuda(cuadro)
+        return resultado
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
 # Lista de herramientas para exportar
 TESORERO_TOOLS = [
     consultar_posicion_caja,
@@ -203,6 +401,9 @@ TESORERO_TOOLS = [
     consultar_deuda_bancaria,
     consultar_gastos_fijos,
     analisis_liquidez,
+    proyeccion_flujo_caja,
+    estres_liquidez,
+    escenarios_euribor,
     buscar_tipos_interes,
     buscar_indicadores_economicos
 ]
@@ -31,6 +31,19 @@ def formato_numero(valor: float, decimales: int = 2) -> str:
         return str(valor)
 
 
+def formato_fecha(valor, formato: str = "%d/%m/%Y") -> str:
+    """
+    Formatea una fecha (Timestamp/datetime). Fechas vacías (NaT) -> "-".
+    Ejemplo: 2025-01-06 -> 06/01/2025
+    """
+    try:
+        if valor is None or valor != valor:
+            return "-"
+        return valor.strftime(formato)
+    except (ValueError, TypeError, AttributeError):
+        return str(valor)
+
+
 def formato_porcentaje(valor: float) -> str:
     """
     Formatea un porcentaje en formato español.
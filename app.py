@@ -22,9 +22,10 @@ CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 if CURRENT_DIR not in sys.path:
     sys.path.insert(0, CURRENT_DIR)
 
-DATA_PATH = os.path.join(CURRENT_DIR, "data")
-
 from graphs.financial_graph import run_agent_query, AGENT_CONFIG, MODEL_NAME
+from datastore import ahora, data_store, cubo_facturas, reloj_fijo
+from engines import (ESTADOS_MOROSOS, calcular_aging, ranking_morosos, calcular_kpis, escenarios_fpa, gastos_estimados,
+                     rango)
 
 # ============================================
 # FUNCIONES DE FORMATO ESPAÑOL
@@ -156,19 +157,25 @@ st.markdown(f"""
 # FUNCIONES DE CARGA DE DATOS
 # ============================================
 
-@st.cache_data(ttl=60)
 def cargar_datos():
-    """Carga todos los CSVs necesarios."""
+    """
+    Obtiene todos los datasets del DataStore compartido.
+    El DataStore solo relee un CSV cuando cambia su contenido (versión de
+    datos), así que no hace falta caché de Streamlit (que además copiaría
+    los 14 frames en cada rerun).
+    """
+    # Vigilancia de data/ (idempotente): publica una versión nueva en cada cambio
+    data_store.versiones.vigilar()
     datos = {}
     archivos = [
         "estudiantes", "facturas_emitidas", "ocupacion", "posicion_caja",
         "deuda_bancaria", "gastos_fijos", "balance", "cuenta_resultados",
-        "kpis", "obligaciones_fiscales", "activos_fijos", "iva_repercutido",
-        "iva_soportado", "desviaciones", "pagos_pendientes", "mantenimientos"
+        "obligaciones_fiscales", "activos_fijos", "iva_repercutido",
+        "iva_soportado", "pagos_pendientes", "mantenimientos"
     ]
     for archivo in archivos:
         try:
-            datos[archivo] = pd.read_csv(os.path.join(DATA_PATH, f"{archivo}.csv"))
+            datos[archivo] = data_store.get(archivo)
         except:
             datos[archivo] = pd.DataFrame()
     return datos
@@ -217,18 +224,22 @@ def dashboard_resumen(datos):
     caja = datos.get("posicion_caja", pd.DataFrame())
     deuda = datos.get("deuda_bancaria", pd.DataFrame())
     
-    total_facturado = facturas["importe"].sum() if not facturas.empty else 0
-    cobrado = facturas[facturas["estado"] == "pagada"]["importe"].sum() if not facturas.empty else 0
-    vencido = facturas[facturas["estado"] == "vencida"]["importe"].sum() if not facturas.empty else 0
+    # Totales de facturación desde el cubo precalculado
+    cubo = cubo_facturas() if not facturas.empty else None
+    total_facturado = cubo.importe() if cubo is not None else 0
+    cobrado = cubo.importe(estado="pagada") if cubo is not None else 0
+    moroso = cubo.importe(estado=ESTADOS_MOROSOS) if cubo is not None else 0
     
     total_plazas = ocupacion["capacidad"].sum() if not ocupacion.empty else 0
     ocupadas = ocupacion["ocupacion_actual"].sum() if not ocupacion.empty else 0
-    pct_ocupacion = (ocupadas / total_plazas * 100) if total_plazas > 0 else 0
     
     saldo_caja = caja["saldo"].sum() if not caja.empty else 0
     deuda_total = deuda["capital_pendiente"].sum() if not deuda.empty else 0
     
-    tasa_morosidad = (vencido / total_facturado * 100) if total_facturado > 0 else 0
+    # KPIs calculados desde los datos (memoizados por versión)
+    kpis = calcular_kpis().set_index("kpi") if not facturas.empty and not ocupacion.empty else None
+    pct_ocupacion = kpis.loc["ocupacion", "valor"] if kpis is not None else 0
+    tasa_morosidad = kpis.loc["morosidad", "valor"] if kpis is not None else 0
     
     # Fila de KPIs principales
     col1, col2, col3, col4, col5 = st.columns(5)
@@ -266,7 +277,7 @@ def dashboard_resumen(datos):
         st.markdown(crear_kpi_card(
             "Morosidad",
             formato_porcentaje(tasa_morosidad),
-            formato_euro(vencido) + " vencido",
+            formato_euro(moroso) + " vencido o impagado",
             "negative" if tasa_morosidad > 3 else "positive",
             "⚠️"
         ), unsafe_allow_html=True)
@@ -280,6 +291,30 @@ def dashboard_resumen(datos):
             "🏛️"
         ), unsafe_allow_html=True)
     
+    # Fila de KPIs de cobro y resultado frente a objetivo
+    if kpis is not None:
+        secundarios = kpis.loc[["dso", "eficiencia_cobro", "ebitda"]]
+        iconos = {"dso": "⏱️", "eficiencia_cobro": "✅", "ebitda": "📈"}
+        for col, (clave, kpi) in zip(st.columns(len(secundarios)), secundarios.iterrows()):
+            if kpi["unidad"] == "€":
+                valor_fmt, obj_fmt = formato_euro(kpi["valor"]), formato_euro(kpi["objetivo"])
+            elif kpi["unidad"] == "%":
+                valor_fmt, obj_fmt = formato_porcentaje(kpi["valor"]), formato_porcentaje(kpi["objetivo"])
+            else:
+                valor_fmt = f"{formato_numero(kpi['valor'], 1)} {kpi['unidad']}"
+                obj_fmt = f"{formato_numero(kpi['objetivo'], 1)} {kpi['unidad']}"
+            subtitulo = f"Objetivo: {obj_fmt}"
+            if clave == "ebitda" and gastos_estimados():
+                subtitulo += " · gastos fijos anualizados"
+            with col:
+                st.markdown(crear_kpi_card(
+                    kpi["nombre"],
+                    valor_fmt,
+                    subtitulo,
+                    "positive" if kpi["cumple"] else "negative",
+                    iconos[clave]
+                ), unsafe_allow_html=True)
+    
     st.markdown("---")
     
     # Gráficos principales
@@ -323,12 +358,12 @@ def dashboard_resumen(datos):
     
     with col_right:
         st.markdown('<div class="section-title">💳 Estado de Facturación</div>', unsafe_allow_html=True)
-        if not facturas.empty:
-            estados = facturas.groupby("estado")["importe"].sum().reset_index()
+        if cubo is not None:
+            importe_estados = cubo.por("estado")["importe"].reset_index()
             colores = {'pagada': '#2ecc71', 'pendiente': '#f1c40f', 'vencida': '#e74c3c'}
             
             fig_facturas = px.pie(
-                estados,
+                importe_estados,
                 values='importe',
                 names='estado',
                 color='estado',
@@ -369,10 +404,11 @@ def dashboard_cobros(datos):
     # Métricas rápidas
     col1, col2, col3, col4 = st.columns(4)
     
-    pendiente = facturas[facturas["estado"] == "pendiente"]["importe"].sum()
-    vencido = facturas[facturas["estado"] == "vencida"]["importe"].sum()
-    total_facturas = len(facturas)
-    facturas_vencidas = len(facturas[facturas["estado"] == "vencida"])
+    cubo = cubo_facturas()
+    pendiente = cubo.importe(estado="pendiente")
+    vencido = cubo.importe(estado="vencida")
+    total_facturas = cubo.num_facturas()
+    facturas_vencidas = cubo.num_facturas(estado="vencida")
     
     col1.metric("💵 Pendiente de Cobro", formato_euro(pendiente))
     col2.metric("🔴 Importe Vencido", formato_euro(vencido))
@@ -386,25 +422,10 @@ def dashboard_cobros(datos):
     with col_left:
         st.markdown("#### 📊 Aging Report")
         
-        # Calcular aging
-        facturas_pend = facturas[facturas["estado"].isin(["pendiente", "vencida"])].copy()
-        if not facturas_pend.empty:
-            facturas_pend["fecha_vencimiento"] = pd.to_datetime(facturas_pend["fecha_vencimiento"])
-            facturas_pend["dias"] = (datetime.now() - facturas_pend["fecha_vencimiento"]).dt.days
-            
-            def clasificar(dias):
-                if dias <= 0: return "No vencido"
-                elif dias <= 30: return "1-30 días"
-                elif dias <= 60: return "31-60 días"
-                elif dias <= 90: return "61-90 días"
-                return ">90 días"
-            
-            facturas_pend["tramo"] = facturas_pend["dias"].apply(clasificar)
-            aging = facturas_pend.groupby("tramo")["importe"].sum().reset_index()
-            
-            orden = ["No vencido", "1-30 días", "31-60 días", "61-90 días", ">90 días"]
-            aging["tramo"] = pd.Categorical(aging["tramo"], categories=orden, ordered=True)
-            aging = aging.sort_values("tramo")
+        # Aging desde el motor común (tramos ya ordenados)
+        aging = calcular_aging().presentes()
+        if not aging.empty:
+            aging = aging[["etiqueta", "importe"]].rename(columns={"etiqueta": "tramo"})
             
             colores = ["#2ecc71", "#f1c40f", "#e67e22", "#e74c3c", "#c0392b"]
             
@@ -432,22 +453,11 @@ def dashboard_cobros(datos):
     with col_right:
         st.markdown("#### 🔴 Top 10 Morosos")
         
-        vencidas = facturas[facturas["estado"] == "vencida"].copy()
-        if not vencidas.empty and not estudiantes.empty:
-            vencidas["fecha_vencimiento"] = pd.to_datetime(vencidas["fecha_vencimiento"])
-            vencidas["dias_retraso"] = (datetime.now() - vencidas["fecha_vencimiento"]).dt.days
-            
-            morosos = vencidas.groupby("id_estudiante").agg({
-                "importe": "sum",
-                "id_factura": "count",
-                "dias_retraso": "max"
-            }).reset_index()
-            morosos.columns = ["ID", "Deuda", "Facturas", "Días"]
-            morosos = morosos.merge(
-                estudiantes[["id_estudiante", "nombre", "email"]],
-                left_on="ID", right_on="id_estudiante", how="left"
-            )
-            morosos = morosos.sort_values("Deuda", ascending=False).head(10)
+        morosos = ranking_morosos().pagina(10)
+        if not morosos.empty and not estudiantes.empty:
+            morosos = morosos.rename(columns={
+                "deuda_total": "Deuda", "num_facturas": "Facturas", "max_dias_retraso": "Días"
+            })
             
             # Formatear para mostrar
             morosos["Deuda_fmt"] = morosos["Deuda"].apply(formato_euro)
@@ -626,6 +636,92 @@ def dashboard_fiscal(datos):
             )
 
 
+def dashboard_escenarios(datos):
+    """Dashboard de escenarios FP&A (precio × ocupación × morosidad)."""
+    
+    ocupacion = datos.get("ocupacion", pd.DataFrame())
+    
+    st.markdown('<div class="section-title">🎯 Escenarios de Ocupación y Precio</div>', unsafe_allow_html=True)
+    
+    if ocupacion.empty:
+        st.info("No hay datos de ocupación para construir escenarios.")
+        return
+    
+    # Rejilla de escenarios
+    col1, col2, col3 = st.columns(3)
+    residencia = col1.selectbox("Residencia", ["todas"] + ocupacion["residencia"].astype(str).tolist())
+    variacion_precio = col2.slider("Variación de precio (%)", -30, 30, (-10, 10))
+    rango_ocupacion = col3.slider("Ocupación (%)", 50, 100, (80, 100))
+    col1, col2, col3 = st.columns(3)
+    morosidad_max = col1.slider("Morosidad máxima (%)", 0.0, 30.0, 10.0, 0.5)
+    paso_precio = col2.select_slider("Paso de precio (pp)", [0.25, 0.5, 1.0, 2.0], value=1.0)
+    paso_ocupacion = col3.select_slider("Paso de ocupación (pp)", [0.25, 0.5, 1.0, 2.0], value=1.0)
+    
+    rejilla = escenarios_fpa(
+        rango(variacion_precio[0], variacion_precio[1], paso_precio),
+        rango(rango_ocupacion[0], rango_ocupacion[1], paso_ocupacion),
+        rango(0, morosidad_max, 0.5),
+        residencia=residencia
+    )
+    actual = rejilla.actual
+    
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("🧮 Escenarios", formato_numero(rejilla.num_celdas, 0))
+    col2.metric("🏠 Ocupación Actual", formato_porcentaje(actual["ocupacion"]))
+    col3.metric("📈 EBITDA Actual", formato_euro(actual["ebitda"]))
+    col4.metric("💰 Caja Actual", formato_euro(actual["caja"]))
+    
+    st.markdown("---")
+    
+    col_left, col_right = st.columns(2)
+    
+    with col_left:
+        st.markdown("#### 🗺️ EBITDA por Precio y Ocupación")
+        morosidades = rejilla.morosidades.tolist()
+        morosidad = st.select_slider("Morosidad (%)", morosidades,
+                                     value=rejilla.celda(0, 100, actual["morosidad"])["morosidad"])
+        corte = rejilla.corte(morosidad)
+        fig_corte = px.imshow(
+            corte,
+            labels=dict(x="Ocupación (%)", y="Variación de precio (%)", color="EBITDA"),
+            color_continuous_scale="RdYlGn",
+            aspect="auto",
+            origin="lower"
+        )
+        fig_corte.update_layout(height=400, margin=dict(l=20, r=20, t=20, b=20))
+        fig_corte = aplicar_tema_plotly(fig_corte)
+        st.plotly_chart(fig_corte, use_container_width=True)
+    
+    with col_right:
+        st.markdown("#### 🔎 Escenario Seleccionado")
+        precio_sel = st.select_slider("Precio (%)", rejilla.variaciones_precio.tolist(),
+                                      value=rejilla.celda(0, 100, morosidad)["variacion_precio"])
+        ocupacion_sel = st.select_slider("Ocupación (%)", rejilla.ocupaciones.tolist(),
+                                         value=rejilla.celda(0, actual["ocupacion"], morosidad)["ocupacion"])
+        celda = rejilla.celda(precio_sel, ocupacion_sel, morosidad)
+        
+        col_a, col_b, col_c = st.columns(3)
+        col_a.metric("Ingresos", formato_euro(celda["ingresos"]), delta=formato_euro(celda["delta_ingresos"]))
+        col_b.metric("EBITDA", formato_euro(celda["ebitda"]), delta=formato_euro(celda["delta_ebitda"]))
+        col_c.metric("Caja", formato_euro(celda["caja"]), delta=formato_euro(celda["delta_caja"]))
+        
+        desglose = rejilla.por_residencia(precio_sel, ocupacion_sel, morosidad)
+        for columna in ["ingresos", "ebitda"]:
+            desglose[columna] = desglose[columna].apply(formato_euro)
+        desglose["plazas_ocupadas"] = desglose["plazas_ocupadas"].apply(lambda x: formato_numero(x, 1))
+        st.dataframe(
+            desglose.rename(columns={
+                "residencia": "Residencia",
+                "plazas_ocupadas": "Plazas Ocupadas",
+                "ingresos": "Ingresos",
+                "ebitda": "EBITDA"
+            }),
+            use_container_width=True,
+            hide_index=True,
+            height=250
+        )
+
+
 # ============================================
 # EXPORTACIÓN PDF
 # ============================================
@@ -639,9 +735,10 @@ def generar_pdf_dashboard(datos):
         ocupacion = datos.get("ocupacion", pd.DataFrame())
         caja = datos.get("posicion_caja", pd.DataFrame())
         
-        total_facturado = facturas["importe"].sum() if not facturas.empty else 0
-        cobrado = facturas[facturas["estado"] == "pagada"]["importe"].sum() if not facturas.empty else 0
-        vencido = facturas[facturas["estado"] == "vencida"]["importe"].sum() if not facturas.empty else 0
+        cubo = cubo_facturas() if not facturas.empty else None
+        total_facturado = cubo.importe() if cubo is not None else 0
+        cobrado = cubo.importe(estado="pagada") if cubo is not None else 0
+        vencido = cubo.importe(estado="vencida") if cubo is not None else 0
         
         total_plazas = ocupacion["capacidad"].sum() if not ocupacion.empty else 0
         ocupadas = ocupacion["ocupacion_actual"].sum() if not ocupacion.empty else 0
@@ -675,7 +772,8 @@ def generar_pdf_dashboard(datos):
         
         # Fecha
         pdf.set_font('DejaVu', 'I', 10)
-        pdf.cell(0, 10, f'Generado: {datetime.now().strftime("%d/%m/%Y %H:%M")}')
+        pdf.cell(0, 10, f'Fecha de corte: {ahora().strftime("%d/%m/%Y")}  |  '
+                        f'Generado: {datetime.now().strftime("%d/%m/%Y %H:%M")}')
         pdf.ln(15)
         
         # KPIs
@@ -820,7 +918,8 @@ def main():
     datos = cargar_datos()
     
     # Tabs principales
-    pages = ["📊 Resumen Ejecutivo", "💳 Cobros y Morosidad", "🏦 Tesorería", "⚖️ Fiscal", "🤖 Chat Agentes"]
+    pages = ["📊 Resumen Ejecutivo", "💳 Cobros y Morosidad", "🏦 Tesorería", "⚖️ Fiscal", "🎯 Escenarios",
+             "🤖 Chat Agentes"]
     if "active_page" not in st.session_state:
         st.session_state.active_page = "📊 Resumen Ejecutivo"
 
@@ -834,24 +933,30 @@ def main():
 
     st.session_state.active_page = page
 
-    if page == "📊 Resumen Ejecutivo":
-        dashboard_resumen(datos)
-    elif page == "💳 Cobros y Morosidad":
-        dashboard_cobros(datos)
-    elif page == "🏦 Tesorería":
-        dashboard_tesoreria(datos)
-    elif page == "⚖️ Fiscal":
-        dashboard_fiscal(datos)
-    else:
-        chat_agentes()
+    # Fecha de análisis: dashboards, PDF y agentes se calculan con el reloj fijado a esta fecha
+    fecha_analisis = st.sidebar.date_input("📅 Fecha de análisis", value=ahora().date(), key="fecha_analisis")
+
+    with reloj_fijo(fecha_analisis):
+        if page == "📊 Resumen Ejecutivo":
+            dashboard_resumen(datos)
+        elif page == "💳 Cobros y Morosidad":
+            dashboard_cobros(datos)
+        elif page == "🏦 Tesorería":
+            dashboard_tesoreria(datos)
+        elif page == "⚖️ Fiscal":
+            dashboard_fiscal(datos)
+        elif page == "🎯 Escenarios":
+            dashboard_escenarios(datos)
+        else:
+            chat_agentes()
 
+        # Botón PDF (a la misma fecha de análisis)
+        pdf_data = generar_pdf_dashboard(datos)
     
     # Sidebar
     with st.sidebar:
         st.markdown("### 📥 Exportar")
         
-        # Botón PDF
-        pdf_data = generar_pdf_dashboard(datos)
         if pdf_data:
             st.download_button(
                 label="📕 Descargar PDF",
@@ -887,7 +992,7 @@ def main():
         st.markdown("### ℹ️ Sistema")
         st.caption(f"🤖 Modelo: {MODEL_NAME}")
         st.caption(f"📊 Agentes: {len(AGENT_CONFIG)}")
-        st.caption(f"📅 {datetime.now().strftime('%d/%m/%Y %H:%M')}")
+        st.caption(f"📅 Datos a {fecha_analisis.strftime('%d/%m/%Y')}")
         
         if st.button("🗑️ Limpiar Chat", use_container_width=True):
             st.session_state.messages = []
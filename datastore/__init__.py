@@ -0,0 +1,123 @@
+"""
+Capa de datos compartida por herramientas, servidores MCP y dashboard.
+"""
+
+from .reloj import (
+    ahora,
+    fijar_reloj,
+    parsear_fecha,
+    reloj_fijado,
+    reloj_fijo,
+    resolver_as_of
+)
+
+from .schemas import (
+    ESQUEMAS,
+    a_registros,
+    normalizar_tipo
+)
+
+from .snapshots import (
+    SNAPSHOTS_AVAILABLE,
+    SnapshotCache
+)
+
+from .versiones import (
+    WATCHDOG_AVAILABLE,
+    VersionDatos
+)
+
+from .store import (
+    DATA_PATH,
+    MAX_DIAS_MEMO,
+    DataStore,
+    MemoAcotada,
+    data_store
+)
+
+from .indices import (
+    IndiceEstudiantes,
+    ParticionEstados,
+    indice_estudiantes,
+    particion_estados,
+    fila_estudiante,
+    filas_estudiantes
+)
+
+from .cubo import (
+    CuboFacturas,
+    cubo_facturas,
+    buscar_facturas
+)
+
+from .particiones import (
+    ParticionesMensuales,
+    particiones_facturas
+)
+
+from .streaming import (
+    UMBRAL_STREAMING,
+    AgregadorCobros,
+    resumen_cobros,
+    usar_streaming,
+    vencimientos_abiertos
+)
+
+from .sql import (
+    BackendSQL,
+    ResumenCobrosSQL,
+    backend_sql
+)
+
+from .resultados import (
+    CONFIG_CACHE,
+    CacheResultados,
+    cache_resultados,
+    cachear,
+    cachear_herramientas
+)
+
+__all__ = [
+    "ahora",
+    "fijar_reloj",
+    "parsear_fecha",
+    "reloj_fijado",
+    "reloj_fijo",
+    "resolver_as_of",
+    "ESQUEMAS",
+    "a_registros",
+    "normalizar_tipo",
+    "SNAPSHOTS_AVAILABLE",
+    "SnapshotCache",
+    "WATCHDOG_AVAILABLE",
+    "VersionDatos",
+    "DATA_PATH",
+    "MAX_DIAS_MEMO",
+    "DataStore",
+    "MemoAcotada",
+    "data_store",
+    "IndiceEstudiantes",
+    "ParticionEstados",
+    "indice_estudiantes",
+    "particion_estados",
+    "fila_estudiante",
+    "filas_estudiantes",
+    "CuboFacturas",
+    "cubo_facturas",
+    "buscar_facturas",
+    "ParticionesMensuales",
+    "particiones_facturas",
+    "UMBRAL_STREAMING",
+    "AgregadorCobros",
+    "resumen_cobros",
+    "usar_streaming",
+    "vencimientos_abiertos",
+    "BackendSQL",
+    "ResumenCobrosSQL",
+    "backend_sql",
+    "CONFIG_CACHE",
+    "CacheResultados",
+    "cache_resultados",
+    "cachear",
+    "cachear_herramientas"
+]
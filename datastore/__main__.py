@@ -0,0 +1,105 @@
+"""
+CLI de la capa de datos.
+
+Uso:
+    python -m datastore snapshots            # genera los snapshots que falten
+    python -m datastore snapshots --force    # los regenera todos
+    python -m datastore sql                  # crea/actualiza la base SQLite (activa el backend SQL)
+    python -m datastore sql --force          # la recarga entera
+    python -m datastore particiones          # particiona las facturas por mes de emisión
+    python -m datastore cache                # crea la cache persistente de resultados y purga caducados
+    python -m datastore cache --limpiar      # la vacía
+"""
+
+import argparse
+import sys
+
+from .schemas import huella_esquema
+from .snapshots import SNAPSHOTS_AVAILABLE, hash_fichero
+from .particiones import particiones_facturas
+from .resultados import cache_resultados
+from .sql import backend_sql
+from .store import data_store
+
+
+def cmd_snapshots(args) -> int:
+    """Prepara los snapshots columnares de todos los CSV de data/."""
+    if not SNAPSHOTS_AVAILABLE:
+        print("❌ pyarrow no está instalado: los snapshots están desactivados.")
+        return 1
+
+    snapshots = data_store.snapshots
+    for nombre in data_store.datasets():
+        ruta = data_store.ruta(nombre)
+        hash_csv = hash_fichero(ruta)
+        esquema = huella_esquema(nombre)
+        if args.force or not snapshots.vigente(nombre, hash_csv, esquema):
+            snapshots.guardar(nombre, data_store.leer_csv(nombre), hash_csv, esquema)
+            print(f"✅ {nombre}: snapshot generado")
+        else:
+            print(f"   {nombre}: snapshot al día")
+    print(f"\n📂 Snapshots en {snapshots.directorio}")
+    return 0
+
+
+def cmd_sql(args) -> int:
+    """Carga todos los CSV de data/ en la base SQLite del backend SQL."""
+    backend = backend_sql(data_store, crear=True)
+    for nombre in data_store.datasets():
+        if backend.cargar(nombre, forzar=args.force):
+            print(f"✅ {nombre}: tabla cargada")
+        else:
+            print(f"   {nombre}: tabla al día")
+    print(f"\n🗄️ Base de datos en {backend.ruta}")
+    return 0
+
+
+def cmd_particiones(args) -> int:
+    """Genera las particiones mensuales de facturas_emitidas."""
+    particiones = particiones_facturas(data_store)
+    if not particiones.construir(forzar=args.force):
+        print("   facturas_emitidas: particiones al día")
+    print(particiones.resumen().to_string(index=False))
+    print(f"\n📂 Particiones en {particiones.directorio}")
+    return 0
+
+
+def cmd_cache(args) -> int:
+    """Activa la cache persistente (SQLite) de resultados de herramientas."""
+    cache_resultados.conexion(crear=True)
+    if args.limpiar:
+        cache_resultados.limpiar()
+        print("✅ Cache de resultados vaciada")
+    else:
+        print(f"✅ {cache_resultados.purgar()} resultados caducados eliminados")
+    print(f"   {cache_resultados.estadisticas()['entradas_sqlite']} resultados guardados")
+    print(f"\n🗄️ Cache en {cache_resultados.ruta}")
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m datastore", description="Utilidades de la capa de datos")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_snap = sub.add_parser("snapshots", help="Genera los snapshots columnares de data/*.csv")
+    p_snap.add_argument("--force", action="store_true", help="Regenera aunque estén al día")
+    p_snap.set_defaults(func=cmd_snapshots)
+
+    p_sql = sub.add_parser("sql", help="Carga data/*.csv en la base SQLite (backend SQL opcional)")
+    p_sql.add_argument("--force", action="store_true", help="Recarga todas las tablas")
+    p_sql.set_defaults(func=cmd_sql)
+
+    p_part = sub.add_parser("particiones", help="Particiona facturas_emitidas por mes de emisión")
+    p_part.add_argument("--force", action="store_true", help="Regenera aunque estén al día")
+    p_part.set_defaults(func=cmd_particiones)
+
+    p_cache = sub.add_parser("cache", help="Crea la cache persistente de resultados de herramientas")
+    p_cache.add_argument("--limpiar", action="store_true", help="Borra todos los resultados guardados")
+    p_cache.set_defaults(func=cmd_cache)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
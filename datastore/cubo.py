@@ -0,0 +1,115 @@
+"""
+Cubo agregado de facturación: residencia × mes de emisión × estado.
+Se materializa una vez por versión de datos (DataStore.derivado) y sirve
+los totales de facturación a herramientas y dashboards sin recorrer las
+facturas; las filas originales solo se leen para los listados de detalle.
+"""
+
+from typing import Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from .indices import particion_estados
+from .sql import backend_sql
+from .store import DataStore, data_store
+
+Filtro = Union[str, Iterable[str], None]
+
+
+class CuboFacturas:
+    """
+    Importe y número de facturas por (residencia, mes, estado).
+
+    Los filtros de residencia usan la misma semántica que las herramientas
+    (coincidencia parcial sin distinguir mayúsculas); "todas" o None
+    equivale a no filtrar.
+    """
+
+    DIMENSIONES = ("residencia", "mes", "estado")
+
+    def __init__(self, facturas: pd.DataFrame):
+        mes = facturas["fecha_emision"].dt.to_period("M").rename("mes")
+        self.celdas = (
+            facturas.groupby([facturas["residencia"], mes, facturas["estado"]], observed=True, dropna=False)["importe"]
+            .agg(importe="sum", num_facturas="size")
+        )
+        self._residencia = self.celdas.index.get_level_values("residencia").astype(object)
+        self._mes = self.celdas.index.get_level_values("mes")
+        self._estado = self.celdas.index.get_level_values("estado").astype(object)
+        self.residencias: List[str] = sorted(str(r) for r in pd.unique(self._residencia) if pd.notna(r))
+
+    @staticmethod
+    def _valores(filtro: Filtro) -> Optional[List[str]]:
+        if filtro is None or (isinstance(filtro, str) and filtro == "todas"):
+            return None
+        return [filtro] if isinstance(filtro, str) else list(filtro)
+
+    def residencias_coincidentes(self, patron: str) -> List[str]:
+        """Residencias cuyo nombre contiene el patrón (sin distinguir mayúsculas)."""
+        patron = patron.lower()
+        return [r for r in self.residencias if patron in r.lower()]
+
+    def _mascara(self, estado: Filtro = None, residencia: Optional[str] = None,
+                 desde: Optional[str] = None, hasta: Optional[str] = None) -> np.ndarray:
+        mascara = np.ones(len(self.celdas), dtype=bool)
+        estados = self._valores(estado)
+        if estados is not None:
+            mascara &= np.isin(self._estado, estados)
+        if residencia is not None and residencia != "todas":
+            mascara &= np.isin(self._residencia, self.residencias_coincidentes(residencia))
+        if desde is not None:
+            mascara &= np.asarray(self._mes >= pd.Period(desde, freq="M"))
+        if hasta is not None:
+            mascara &= np.asarray(self._mes <= pd.Period(hasta, freq="M"))
+        return mascara
+
+    def seleccionar(self, **filtros) -> pd.DataFrame:
+        """Celdas del cubo que cumplen los filtros (estado, residencia, desde, hasta)."""
+        return self.celdas[self._mascara(**filtros)]
+
+    def importe(self, **filtros) -> float:
+        """Importe total facturado que cumple los filtros."""
+        return float(self.celdas["importe"].to_numpy()[self._mascara(**filtros)].sum())
+
+    def num_facturas(self, **filtros) -> int:
+        """Número de facturas que cumplen los filtros."""
+        return int(self.celdas["num_facturas"].to_numpy()[self._mascara(**filtros)].sum())
+
+    def por(self, dimension: str, **filtros) -> pd.DataFrame:
+        """Importe y número de facturas agregados por una dimensión del cubo."""
+        if dimension not in self.DIMENSIONES:
+            raise ValueError(f"Dimensión no válida: {dimension}. Opciones: {', '.join(self.DIMENSIONES)}")
+        return self.seleccionar(**filtros).groupby(level=dimension, observed=True)[["importe", "num_facturas"]].sum()
+
+
+def cubo_facturas(store: DataStore = data_store) -> CuboFacturas:
+    """Cubo de facturación para la versión actual de los datos."""
+    return store.derivado(
+        "cubo_facturas", ["facturas_emitidas"],
+        lambda: CuboFacturas(store.get("facturas_emitidas"))
+    )
+
+
+def buscar_facturas(estado: str = "todas", residencia: Optional[str] = "todas", limite: Optional[int] = None,
+                    store: DataStore = data_store) -> Tuple[int, float, pd.DataFrame]:
+    """
+    Número, importe total y filas (hasta limite) de las facturas filtradas.
+
+    Con backend SQL la consulta se resuelve en SQLite; si no, los totales
+    salen del cubo y solo se recorren las filas del estado pedido.
+    """
+    backend = backend_sql(store)
+    if backend is not None:
+        return backend.facturas(estado, residencia, limite)
+
+    cubo = cubo_facturas(store)
+    num_facturas = cubo.num_facturas(estado=estado, residencia=residencia)
+    total = cubo.importe(estado=estado, residencia=residencia)
+    if estado != "todas":
+        df = particion_estados(store).filas(estado)
+    else:
+        df = store.get("facturas_emitidas")
+    if residencia is not None and residencia != "todas":
+        df = df[df["residencia"].isin(cubo.residencias_coincidentes(residencia))]
+    return num_facturas, total, df if limite is None else df.head(limite)
@@ -0,0 +1,128 @@
+"""
+Índices precalculados sobre los datasets del DataStore.
+Se construyen una vez por versión de datos (DataStore.derivado) y evitan
+escanear la tabla completa de facturas en cada consulta.
+"""
+
+from typing import Dict, Iterable
+
+import numpy as np
+import pandas as pd
+
+from .store import DataStore, data_store
+
+
+class IndiceEstudiantes:
+    """
+    Índice id_estudiante -> rango de filas de sus facturas.
+
+    Las facturas se ordenan una vez por estudiante (orden estable, conserva
+    el orden original dentro de cada estudiante) y se guardan los offsets.
+    Incluye los totales pagado/pendiente/vencido ya agregados.
+    """
+
+    def __init__(self, facturas: pd.DataFrame):
+        codigos, ids = pd.factorize(facturas["id_estudiante"])
+        validos = codigos >= 0
+        orden = np.argsort(codigos[validos], kind="stable")
+        self.facturas = facturas[validos].iloc[orden].reset_index(drop=True)
+
+        cuentas = np.bincount(codigos[validos], minlength=len(ids))
+        fines = np.cumsum(cuentas)
+        self._posicion: Dict[str, int] = {id_est: i for i, id_est in enumerate(ids)}
+        self._inicios = fines - cuentas
+        self._fines = fines
+
+        importe = facturas["importe"].to_numpy(dtype=float)
+        estado = facturas["estado"].astype(str).to_numpy()
+        self._totales = {
+            clave: np.bincount(codigos[validos], weights=np.where(estado == valor, importe, 0.0)[validos],
+                               minlength=len(ids))
+            for clave, valor in (("pagado", "pagada"), ("pendiente", "pendiente"), ("vencido", "vencida"))
+        }
+
+    def __contains__(self, id_estudiante: str) -> bool:
+        return id_estudiante in self._posicion
+
+    def facturas_de(self, id_estudiante: str) -> pd.DataFrame:
+        """Facturas de un estudiante (vacío si no tiene)."""
+        i = self._posicion.get(id_estudiante)
+        if i is None:
+            return self.facturas.iloc[0:0]
+        return self.facturas.iloc[self._inicios[i]:self._fines[i]]
+
+    def totales(self, id_estudiante: str) -> Dict[str, float]:
+        """Importes pagado, pendiente y vencido de un estudiante."""
+        i = self._posicion.get(id_estudiante)
+        return {clave: (float(valores[i]) if i is not None else 0.0) for clave, valores in self._totales.items()}
+
+
+class ParticionEstados:
+    """
+    Partición de las facturas por estado.
+
+    Guarda, para cada estado, las posiciones de sus filas (en orden original),
+    de modo que los filtros por estado solo tocan las filas afectadas. Los
+    totales por estado se sirven desde el cubo de facturación (cubo.py).
+    """
+
+    def __init__(self, facturas: pd.DataFrame):
+        self.facturas = facturas
+        codigos, estados = pd.factorize(facturas["estado"].astype(str).where(facturas["estado"].notna()))
+        validos = codigos >= 0
+        orden = np.flatnonzero(validos)[np.argsort(codigos[validos], kind="stable")]
+        cuentas = np.bincount(codigos[validos], minlength=len(estados))
+        fines = np.cumsum(cuentas)
+        self._filas: Dict[str, np.ndarray] = {
+            estado: orden[fin - n:fin] for estado, n, fin in zip(estados, cuentas, fines)
+        }
+
+    def posiciones(self, *estados: str) -> np.ndarray:
+        """Posiciones de fila de las facturas en alguno de los estados (orden original)."""
+        partes = [self._filas[e] for e in estados if e in self._filas]
+        if not partes:
+            return np.empty(0, dtype=np.intp)
+        return partes[0] if len(partes) == 1 else np.sort(np.concatenate(partes))
+
+    def filas(self, *estados: str) -> pd.DataFrame:
+        """Facturas en alguno de los estados indicados."""
+        return self.facturas.iloc[self.posiciones(*estados)]
+
+
+def indice_estudiantes(store: DataStore = data_store) -> IndiceEstudiantes:
+    """Índice de facturas por estudiante para la versión actual de los datos."""
+    return store.derivado(
+        "indice_estudiantes", ["facturas_emitidas"],
+        lambda: IndiceEstudiantes(store.get("facturas_emitidas"))
+    )
+
+
+def particion_estados(store: DataStore = data_store) -> ParticionEstados:
+    """Partición de facturas por estado para la versión actual de los datos."""
+    return store.derivado(
+        "particion_estados", ["facturas_emitidas"],
+        lambda: ParticionEstados(store.get("facturas_emitidas"))
+    )
+
+
+def _posiciones_estudiantes(store: DataStore) -> Dict[str, int]:
+    """id_estudiante -> fila en estudiantes (una vez por versión)."""
+    return store.derivado(
+        "posicion_estudiantes", ["estudiantes"],
+        lambda: {id_est: i for i, id_est in enumerate(store.get("estudiantes")["id_estudiante"])}
+    )
+
+
+def fila_estudiante(id_estudiante: str, store: DataStore = data_store) -> pd.DataFrame:
+    """Ficha de un estudiante como DataFrame de una fila (vacío si no existe)."""
+    estudiantes = store.get("estudiantes")
+    i = _posiciones_estudiantes(store).get(id_estudiante)
+    return estudiantes.iloc[0:0] if i is None else estudiantes.iloc[[i]]
+
+
+def filas_estudiantes(ids: Iterable[str], store: DataStore = data_store) -> pd.DataFrame:
+    """Fichas de varios estudiantes (los que existan), sin recorrer toda la tabla."""
+    estudiantes = store.get("estudiantes")
+    posiciones = _posiciones_estudiantes(store)
+    filas = [posiciones[i] for i in ids if i in posiciones]
+    return estudiantes.iloc[filas]
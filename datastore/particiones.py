@@ -0,0 +1,208 @@
+"""
+Facturas particionadas por mes de emisión.
+
+La tabla de facturas se guarda en data/.particiones/facturas_emitidas/, un
+directorio por mes (YYYY-MM) con uno o varios ficheros, más un manifiesto con
+estadísticas por partición (filas, facturas abiertas, importe). Las consultas
+por rango de fechas, por fecha de corte (as_of) o solo de facturas abiertas
+leen únicamente las particiones necesarias, así que un histórico de varios
+años no encarece las consultas del mes en curso.
+
+Las particiones se construyen leyendo el CSV por bloques y se regeneran solas
+cuando cambia la versión del CSV (hash del contenido) o su esquema.
+"""
+
+import json
+import os
+import shutil
+import sys
+import threading
+from datetime import date
+from typing import Dict, Iterator, List, Optional, Union
+
+import pandas as pd
+
+from .schemas import huella_esquema, leer_con_esquema_por_bloques
+from .snapshots import SNAPSHOTS_AVAILABLE
+from .store import DataStore, data_store
+
+FORMATO_PARTICIONES = 1
+FILAS_BLOQUE_PARTICION = 200_000
+SIN_FECHA = "sin_fecha"
+ESTADOS_ABIERTOS = ["pendiente", "vencida"]
+
+Mes = Union[str, date, pd.Timestamp, None]
+
+
+def _periodo(valor: Mes) -> Optional[pd.Period]:
+    return None if valor is None else pd.Period(valor, freq="M")
+
+
+class ParticionesMensuales:
+    """
+    Particiones mensuales de un dataset por una columna de fecha.
+
+    La posición de cada fila en el CSV se conserva como índice al leer, de
+    modo que los resultados pueden reordenarse como en la tabla original.
+    """
+
+    def __init__(self, directorio: str, dataset: str = "facturas_emitidas",
+                 columna_fecha: str = "fecha_emision", store: DataStore = data_store):
+        self.dataset = store.nombre(dataset)
+        self.directorio = os.path.join(directorio, self.dataset)
+        self.columna_fecha = columna_fecha
+        self.store = store
+        self.extension = "feather" if SNAPSHOTS_AVAILABLE else "pkl"
+        self._manifiesto: Optional[dict] = None
+        self._version: Optional[int] = None
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Construcción
+    # ------------------------------------------------------------------
+
+    def _firma_csv(self) -> dict:
+        return {
+            "hash": self.store.versiones.hash(self.dataset),
+            "esquema": huella_esquema(self.dataset),
+            "formato": FORMATO_PARTICIONES,
+            "extension": self.extension
+        }
+
+    def _leer_manifiesto(self) -> Optional[dict]:
+        try:
+            with open(os.path.join(self.directorio, "_manifiesto.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _escribir(self, df: pd.DataFrame, ruta: str) -> None:
+        if self.extension == "feather":
+            df.to_feather(ruta)
+        else:
+            df.to_pickle(ruta)
+
+    def _cargar(self, ruta: str) -> pd.DataFrame:
+        df = pd.read_feather(ruta) if self.extension == "feather" else pd.read_pickle(ruta)
+        return df.set_index("_fila").rename_axis(None)
+
+    def construir(self, forzar: bool = False) -> bool:
+        """
+        Genera las particiones si faltan o si el CSV ha cambiado.
+        Se escriben en un directorio temporal que sustituye al anterior.
+        Devuelve True si se regeneraron.
+        """
+        version = self.store.version(self.dataset)[0]
+        if not forzar and self._manifiesto is not None and self._version == version:
+            return False
+
+        with self._lock:
+            firma = self._firma_csv()
+            manifiesto = self._leer_manifiesto()
+            if not forzar and manifiesto is not None and manifiesto.get("firma") == firma:
+                self._manifiesto, self._version = manifiesto, version
+                return False
+
+            temporal = f"{self.directorio}.tmp-{os.getpid()}"
+            shutil.rmtree(temporal, ignore_errors=True)
+            os.makedirs(temporal)
+
+            particiones: Dict[str, dict] = {}
+            inicio = 0
+            for n, bloque in enumerate(leer_con_esquema_por_bloques(
+                    self.dataset, self.store.ruta(self.dataset), FILAS_BLOQUE_PARTICION)):
+                bloque.insert(0, "_fila", range(inicio, inicio + len(bloque)))
+                inicio += len(bloque)
+                meses = bloque[self.columna_fecha].dt.strftime("%Y-%m").fillna(SIN_FECHA)
+                for mes, parte in bloque.groupby(meses.to_numpy(), sort=False):
+                    os.makedirs(os.path.join(temporal, mes), exist_ok=True)
+                    fichero = os.path.join(mes, f"{n:05d}.{self.extension}")
+                    self._escribir(parte.reset_index(drop=True), os.path.join(temporal, fichero))
+
+                    abiertas = parte[parte["estado"].astype(str).isin(ESTADOS_ABIERTOS)]
+                    stats = particiones.setdefault(mes, {"filas": 0, "abiertas": 0, "importe": 0.0, "ficheros": []})
+                    stats["filas"] += len(parte)
+                    stats["abiertas"] += len(abiertas)
+                    stats["importe"] += float(parte["importe"].sum())
+                    stats["ficheros"].append(fichero)
+
+            manifiesto = {"firma": firma, "filas": inicio, "particiones": dict(sorted(particiones.items()))}
+            with open(os.path.join(temporal, "_manifiesto.json"), "w", encoding="utf-8") as f:
+                json.dump(manifiesto, f, indent=2)
+
+            antiguo = f"{self.directorio}.old-{os.getpid()}"
+            if os.path.exists(self.directorio):
+                os.replace(self.directorio, antiguo)
+            os.replace(temporal, self.directorio)
+            shutil.rmtree(antiguo, ignore_errors=True)
+
+            self._manifiesto, self._version = manifiesto, version
+            # stderr: los servidores MCP usan stdout como canal del protocolo
+            print(f"🗂️ {self.dataset}: {len(particiones)} particiones mensuales generadas", file=sys.stderr)
+            return True
+
+    def manifiesto(self) -> dict:
+        """Manifiesto vigente (regenera las particiones si el CSV ha cambiado)."""
+        self.construir()
+        return self._manifiesto
+
+    # ------------------------------------------------------------------
+    # Consulta con poda de particiones
+    # ------------------------------------------------------------------
+
+    def meses(self, desde: Mes = None, hasta: Mes = None, as_of: Mes = None,
+              solo_abiertas: bool = False) -> List[str]:
+        """
+        Particiones que pueden contener filas para los filtros dados.
+
+        Args:
+            desde / hasta: Rango de meses de emisión (incluidos)
+            as_of: Fecha de corte; descarta meses emitidos después
+            solo_abiertas: Descarta meses sin facturas pendientes o vencidas
+        """
+        inicio = _periodo(desde)
+        fin = min((p for p in (_periodo(hasta), _periodo(as_of)) if p is not None), default=None)
+        seleccion = []
+        for mes, stats in self.manifiesto()["particiones"].items():
+            if solo_abiertas and stats["abiertas"] == 0:
+                continue
+            if mes == SIN_FECHA:
+                # Sin fecha de emisión: solo entra en consultas sin rango
+                if inicio is None and fin is None:
+                    seleccion.append(mes)
+                continue
+            periodo = pd.Period(mes, freq="M")
+            if (inicio is None or periodo >= inicio) and (fin is None or periodo <= fin):
+                seleccion.append(mes)
+        return seleccion
+
+    def leer(self, desde: Mes = None, hasta: Mes = None, as_of: Mes = None,
+             solo_abiertas: bool = False) -> Iterator[pd.DataFrame]:
+        """Lee por bloques las particiones seleccionadas (ver meses)."""
+        particiones = self.manifiesto()["particiones"]
+        for mes in self.meses(desde, hasta, as_of, solo_abiertas):
+            for fichero in particiones[mes]["ficheros"]:
+                yield self._cargar(os.path.join(self.directorio, fichero))
+
+    def resumen(self) -> pd.DataFrame:
+        """Estadísticas por partición (filas, facturas abiertas, importe)."""
+        particiones = self.manifiesto()["particiones"]
+        return pd.DataFrame(
+            [{"mes": mes, "filas": s["filas"], "abiertas": s["abiertas"], "importe": s["importe"]}
+             for mes, s in particiones.items()],
+            columns=["mes", "filas", "abiertas", "importe"]
+        )
+
+
+_particiones: Dict[str, ParticionesMensuales] = {}
+_particiones_lock = threading.Lock()
+
+
+def particiones_facturas(store: DataStore = data_store) -> ParticionesMensuales:
+    """Particiones mensuales (por fecha de emisión) de las facturas del DataStore."""
+    directorio = os.path.join(store.data_path, ".particiones")
+    with _particiones_lock:
+        particiones = _particiones.get(directorio)
+        if particiones is None:
+            particiones = _particiones[directorio] = ParticionesMensuales(directorio, store=store)
+    return particiones
@@ -0,0 +1,79 @@
+"""
+Reloj inyectable del sistema.
+
+Todas las fechas "de hoy" (as_of por defecto de los motores, cabeceras de
+las herramientas, servidores MCP y dashboard) se obtienen de ahora(). Por
+defecto es el reloj del sistema, pero se puede fijar:
+
+- Globalmente: variable de entorno FECHA_AS_OF (YYYY-MM-DD) o fijar_reloj()
+- Para un bloque de código: with reloj_fijo("2025-10-01"): ... (por hilo y
+  por tarea asyncio, vía contextvars)
+
+Con el reloj fijado, el resultado de una herramienta depende solo de la
+versión de datos, sus argumentos y as_of: es reproducible y cacheable, y
+permite repetir consultas históricas y benchmarks.
+"""
+
+import contextvars
+import os
+from contextlib import contextmanager
+from datetime import date, datetime
+from typing import Iterator, Optional, Union
+
+import pandas as pd
+
+FechaEntrada = Union[None, str, date, datetime, pd.Timestamp]
+
+VARIABLE_ENTORNO = "FECHA_AS_OF"
+
+
+def parsear_fecha(valor: FechaEntrada) -> Optional[datetime]:
+    """Convierte una fecha (texto ISO, date, datetime o Timestamp) a datetime; None o "" -> None."""
+    if valor is None or (isinstance(valor, str) and not valor.strip()):
+        return None
+    try:
+        fecha = pd.Timestamp(valor.strip() if isinstance(valor, str) else valor)
+    except (ValueError, TypeError):
+        raise ValueError(f"Fecha no válida: '{valor}'. Formato esperado: YYYY-MM-DD")
+    if pd.isna(fecha):
+        raise ValueError(f"Fecha no válida: '{valor}'. Formato esperado: YYYY-MM-DD")
+    return fecha.tz_localize(None).to_pydatetime() if fecha.tzinfo else fecha.to_pydatetime()
+
+
+_fecha_global: Optional[datetime] = parsear_fecha(os.environ.get(VARIABLE_ENTORNO))
+_fecha_contexto: contextvars.ContextVar = contextvars.ContextVar("fecha_as_of", default=None)
+
+
+def ahora() -> datetime:
+    """Fecha y hora actuales según el reloj vigente (contexto, global o sistema)."""
+    return _fecha_contexto.get() or _fecha_global or datetime.now()
+
+
+def resolver_as_of(as_of: FechaEntrada = None) -> datetime:
+    """Fecha de análisis: la indicada o, si no hay, la del reloj vigente."""
+    return parsear_fecha(as_of) or ahora()
+
+
+def fijar_reloj(as_of: FechaEntrada = None) -> None:
+    """Fija el reloj de todo el proceso (None vuelve al reloj del sistema o a FECHA_AS_OF)."""
+    global _fecha_global
+    _fecha_global = parsear_fecha(as_of) or parsear_fecha(os.environ.get(VARIABLE_ENTORNO))
+
+
+def reloj_fijado() -> bool:
+    """Indica si el reloj vigente es una fecha fija (y por tanto los resultados son reproducibles)."""
+    return _fecha_contexto.get() is not None or _fecha_global is not None
+
+
+@contextmanager
+def reloj_fijo(as_of: FechaEntrada) -> Iterator[datetime]:
+    """Fija el reloj dentro del bloque (sin fecha, deja el reloj vigente)."""
+    fecha = parsear_fecha(as_of)
+    if fecha is None:
+        yield ahora()
+        return
+    token = _fecha_contexto.set(fecha)
+    try:
+        yield fecha
+    finally:
+        _fecha_contexto.reset(token)
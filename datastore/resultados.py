@@ -0,0 +1,267 @@
+"""
+Cache de resultados de herramientas.
+
+Las herramientas de los agentes y del cliente MCP son funciones puras de
+(versión de datos, argumentos, as_of): la clave de cada resultado es
+(herramienta, argumentos normalizados, huella de data/, día de análisis).
+Los argumentos se completan con sus valores por defecto, así que
+consultar_morosos() y consultar_morosos(dias_minimo=1) comparten entrada, y
+un cambio en cualquier CSV cambia la huella y deja fuera todo lo anterior
+(sin vigilante de data/, en un máximo de versiones.INTERVALO_HUELLA segundos).
+
+Dos niveles:
+
+- Memoria: LRU con caducidad (CONFIG_CACHE), común a todo el proceso. Se
+  vacía cuando cambia la versión de los datos.
+- SQLite opcional: si existe data/.cache/resultados.db (se crea con
+  `python -m datastore cache`), los resultados sobreviven a reinicios y se
+  comparten entre procesos (Streamlit y servidores MCP). Para desactivarlo
+  basta con borrar el fichero.
+
+Los errores no se guardan. estadisticas() devuelve aciertos y fallos por nivel.
+"""
+
+import functools
+import hashlib
+import inspect
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from .reloj import ahora, parsear_fecha
+from .store import DataStore, data_store
+
+CONFIG_CACHE = {
+    "activa": True,
+    "max_entradas": 512,     # Resultados en memoria (LRU)
+    "ttl_segundos": 900,     # Caducidad en ambos niveles
+}
+
+# Salidas que son errores (no se cachean): excepciones, errores JSON de MCP y
+# avisos ❌ de las herramientas (estudiante no encontrado, página inexistente...)
+PREFIJOS_ERROR = ("Error", '{"error"', "❌")
+
+# Argumentos que, sin informar, hacen aleatorio el resultado (esas llamadas no se cachean)
+ARGUMENTOS_ALEATORIOS = ("semilla",)
+
+
+def ruta_cache(store: DataStore = data_store) -> str:
+    """Ruta de la base de datos SQLite de resultados asociada a un DataStore."""
+    return os.path.join(store.data_path, ".cache", "resultados.db")
+
+
+def normalizar_argumentos(funcion: Callable, args: tuple, kwargs: dict) -> Tuple[str, str]:
+    """
+    Argumentos de una llamada en forma canónica (JSON con todos los
+    parámetros, por defecto incluidos) y día de análisis: el de as_of si la
+    herramienta lo recibe informado y, si no, el del reloj vigente.
+    Lanza ValueError si as_of no es una fecha válida o si la llamada es
+    aleatoria (un argumento de ARGUMENTOS_ALEATORIOS sin informar).
+    """
+    ligados = inspect.signature(funcion).bind(*args, **kwargs)
+    ligados.apply_defaults()
+    valores = dict(ligados.arguments)
+    aleatorios = [a for a in ARGUMENTOS_ALEATORIOS if a in valores and valores[a] is None]
+    if aleatorios:
+        raise ValueError(f"Llamada aleatoria (sin {', '.join(aleatorios)})")
+    as_of = parsear_fecha(valores.get("as_of"))
+    dia = (as_of or ahora()).date().isoformat()
+    if "as_of" in valores:
+        valores["as_of"] = dia
+    return json.dumps(valores, sort_keys=True, default=str, ensure_ascii=False), dia
+
+
+class CacheResultados:
+    """
+    Resultados de herramientas en memoria (LRU + TTL) y, opcionalmente, en SQLite.
+
+    Attributes:
+        contadores: Aciertos en memoria y en SQLite, fallos, caducados y desalojos
+    """
+
+    def __init__(self, max_entradas: int = CONFIG_CACHE["max_entradas"],
+                 ttl_segundos: float = CONFIG_CACHE["ttl_segundos"], store: DataStore = data_store):
+        self.max_entradas = max_entradas
+        self.ttl_segundos = ttl_segundos
+        self.store = store
+        self.ruta = ruta_cache(store)
+        self._memoria: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.contadores = {"aciertos_memoria": 0, "aciertos_sqlite": 0, "fallos": 0,
+                           "caducados": 0, "desalojos": 0}
+        store.versiones.suscribir(lambda version, nombres: self.vaciar_memoria())
+
+    # ------------------------------------------------------------------
+    # Nivel SQLite
+    # ------------------------------------------------------------------
+
+    def conexion(self, crear: bool = False) -> Optional[sqlite3.Connection]:
+        """Conexión propia de cada hilo, o None si la base de datos no existe (y no se pide crearla)."""
+        con = getattr(self._local, "con", None)
+        if con is None:
+            if not crear and not os.path.exists(self.ruta):
+                return None
+            os.makedirs(os.path.dirname(self.ruta), exist_ok=True)
+            con = sqlite3.connect(self.ruta, timeout=5)
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS resultados "
+                "(clave TEXT PRIMARY KEY, herramienta TEXT, valor TEXT, caduca REAL)"
+            )
+            self._local.con = con
+        return con
+
+    def _leer_sqlite(self, clave: str) -> Optional[str]:
+        con = self.conexion()
+        if con is None:
+            return None
+        fila = con.execute("SELECT valor, caduca FROM resultados WHERE clave = ?", (clave,)).fetchone()
+        if fila is None:
+            return None
+        if fila[1] < time.time():
+            with con:
+                con.execute("DELETE FROM resultados WHERE clave = ?", (clave,))
+            return None
+        return fila[0]
+
+    def _guardar_sqlite(self, clave: str, herramienta: str, valor: Any) -> None:
+        con = self.conexion()
+        if con is None or not isinstance(valor, str):
+            return
+        with con:
+            con.execute("INSERT OR REPLACE INTO resultados VALUES (?, ?, ?, ?)",
+                        (clave, herramienta, valor, time.time() + self.ttl_segundos))
+
+    def purgar(self) -> int:
+        """Borra de SQLite los resultados caducados. Devuelve cuántos."""
+        con = self.conexion()
+        if con is None:
+            return 0
+        with con:
+            return con.execute("DELETE FROM resultados WHERE caduca < ?", (time.time(),)).rowcount
+
+    # ------------------------------------------------------------------
+    # Consulta
+    # ------------------------------------------------------------------
+
+    def clave(self, herramienta: str, funcion: Callable, args: tuple, kwargs: dict) -> str:
+        """Clave del resultado: herramienta, argumentos normalizados, huella de los datos y día."""
+        argumentos, dia = normalizar_argumentos(funcion, args, kwargs)
+        contenido = f"{herramienta}|{argumentos}|{self.store.versiones.huella()}|{dia}"
+        return hashlib.sha256(contenido.encode()).hexdigest()
+
+    def obtener(self, clave: str) -> Tuple[bool, Any]:
+        """(encontrado, valor) buscando en memoria y después en SQLite."""
+        with self._lock:
+            entrada = self._memoria.get(clave)
+            if entrada is not None:
+                if entrada[0] >= time.monotonic():
+                    self._memoria.move_to_end(clave)
+                    self.contadores["aciertos_memoria"] += 1
+                    return True, entrada[1]
+                del self._memoria[clave]
+                self.contadores["caducados"] += 1
+
+        valor = self._leer_sqlite(clave)
+        if valor is not None:
+            self._guardar_memoria(clave, valor)
+            with self._lock:
+                self.contadores["aciertos_sqlite"] += 1
+            return True, valor
+
+        with self._lock:
+            self.contadores["fallos"] += 1
+        return False, None
+
+    def _guardar_memoria(self, clave: str, valor: Any) -> None:
+        with self._lock:
+            self._memoria[clave] = (time.monotonic() + self.ttl_segundos, valor)
+            self._memoria.move_to_end(clave)
+            while len(self._memoria) > self.max_entradas:
+                self._memoria.popitem(last=False)
+                self.contadores["desalojos"] += 1
+
+    def guardar(self, clave: str, herramienta: str, valor: Any) -> None:
+        """Guarda un resultado en memoria y, si está activo, en SQLite (los errores no se guardan)."""
+        if isinstance(valor, str) and valor.startswith(PREFIJOS_ERROR):
+            return
+        self._guardar_memoria(clave, valor)
+        self._guardar_sqlite(clave, herramienta, valor)
+
+    def llamar(self, herramienta: str, funcion: Callable, args: tuple, kwargs: dict) -> Any:
+        """Resultado de funcion(*args, **kwargs), desde la cache si está."""
+        if not CONFIG_CACHE["activa"]:
+            return funcion(*args, **kwargs)
+        try:
+            clave = self.clave(herramienta, funcion, args, kwargs)
+        except (TypeError, ValueError):
+            # Argumentos que no encajan, fecha no válida o llamada aleatoria: se ejecuta sin cache
+            return funcion(*args, **kwargs)
+        encontrado, valor = self.obtener(clave)
+        if encontrado:
+            return valor
+        valor = funcion(*args, **kwargs)
+        self.guardar(clave, herramienta, valor)
+        return valor
+
+    # ------------------------------------------------------------------
+    # Mantenimiento
+    # ------------------------------------------------------------------
+
+    def vaciar_memoria(self) -> None:
+        """Vacía el nivel de memoria (los datos han cambiado)."""
+        with self._lock:
+            self._memoria.clear()
+
+    def limpiar(self) -> None:
+        """Vacía ambos niveles y pone los contadores a cero."""
+        self.vaciar_memoria()
+        con = self.conexion()
+        if con is not None:
+            with con:
+                con.execute("DELETE FROM resultados")
+        with self._lock:
+            for nombre in self.contadores:
+                self.contadores[nombre] = 0
+
+    def estadisticas(self) -> Dict[str, Any]:
+        """Contadores, tamaño de cada nivel y tasa de aciertos (%)."""
+        con = self.conexion()
+        with self._lock:
+            stats = dict(self.contadores)
+            stats["entradas_memoria"] = len(self._memoria)
+        stats["entradas_sqlite"] = con.execute("SELECT COUNT(*) FROM resultados").fetchone()[0] if con else None
+        consultas = stats["aciertos_memoria"] + stats["aciertos_sqlite"] + stats["fallos"]
+        stats["tasa_aciertos"] = round((consultas - stats["fallos"]) / consultas * 100, 1) if consultas else 0.0
+        return stats
+
+
+# Instancia global compartida por todo el proceso
+cache_resultados = CacheResultados()
+
+
+def cachear(herramienta: str, funcion: Callable, cache: CacheResultados = cache_resultados) -> Callable:
+    """Envuelve una función para que sus resultados pasen por la cache."""
+    @functools.wraps(funcion)
+    def envoltorio(*args, **kwargs):
+        return cache.llamar(herramienta, funcion, args, kwargs)
+    envoltorio._cacheada = True
+    return envoltorio
+
+
+def cachear_herramientas(herramientas: Iterable, cache: CacheResultados = cache_resultados) -> list:
+    """
+    Hace que las herramientas LangChain (con atributo func) usen la cache.
+    Modifica las herramientas en su sitio y es idempotente, así que una misma
+    herramienta presente en varias listas solo se envuelve una vez.
+    """
+    herramientas = list(herramientas)
+    for h in herramientas:
+        funcion = getattr(h, "func", None)
+        if funcion is not None and not getattr(funcion, "_cacheada", False):
+            h.func = cachear(h.name, funcion, cache)
+    return herramientas
@@ -0,0 +1,145 @@
+"""
+Registro central de esquemas de los datasets de data/.
+Define por CSV los tipos explícitos, las columnas categóricas (baja
+cardinalidad), las fechas a parsear y las columnas normalizadas derivadas.
+Se aplica una única vez al cargar, antes de generar el snapshot.
+"""
+
+import hashlib
+import json
+from typing import Dict, Iterator, List
+
+import pandas as pd
+
+
+def normalizar_tipo(tipo_val):
+    """Normaliza los valores de tipo (activo/pasivo/patrimonio/ingreso/gasto)."""
+    tipo_lower = str(tipo_val).lower().strip()
+    if tipo_lower in ['act', 'activo', 'a']:
+        return 'activo'
+    elif tipo_lower in ['pas', 'pasivo', 'p']:
+        return 'pasivo'
+    elif tipo_lower in ['pat', 'patrimonio', 'pn', 'neto']:
+        return 'patrimonio'
+    elif tipo_lower in ['ing', 'ingreso', 'ingresos', 'i']:
+        return 'ingreso'
+    elif tipo_lower in ['gas', 'gasto', 'gastos', 'g']:
+        return 'gasto'
+    return tipo_lower
+
+
+# Esquema por dataset:
+#   tipos:       dtype explícito por columna (str para identificadores y texto)
+#   categorias:  columnas de baja cardinalidad codificadas como category
+#   fechas:      columnas parseadas a datetime64 (valores inválidos -> NaT)
+#   derivadas:   columna_nueva -> (columna_origen, función de normalización)
+ESQUEMAS: Dict[str, dict] = {
+    "facturas_emitidas": {
+        "tipos": {"id_factura": str, "id_estudiante": str, "importe": "float64"},
+        "categorias": ["residencia", "concepto", "estado"],
+        "fechas": ["fecha_emision", "fecha_vencimiento", "fecha_pago_real"],
+    },
+    "estudiantes": {
+        "tipos": {"id_estudiante": str, "cuota_mensual": "float64"},
+        "categorias": ["residencia"],
+        "fechas": ["fecha_entrada"],
+    },
+    "ocupacion": {
+        "tipos": {"precio_medio": "float64"},
+    },
+    "activos_fijos": {
+        "tipos": {"valor_adquisicion": "float64", "amortizacion_acumulada": "float64", "valor_neto": "float64"},
+        "fechas": ["fecha_adquisicion", "fecha_baja"],
+    },
+    "deuda_bancaria": {
+        "tipos": {"capital_pendiente": "float64", "cuota_mensual": "float64", "tipo_interes": "float64"},
+        "fechas": ["fecha_vencimiento"],
+    },
+    "pagos_pendientes": {
+        "tipos": {"importe": "float64"},
+        "fechas": ["fecha_vencimiento"],
+    },
+    "mantenimientos": {
+        "tipos": {"coste_estimado": "float64"},
+        "fechas": ["proximo_mantenimiento"],
+    },
+    "obligaciones_fiscales": {
+        "tipos": {"modelo": str, "importe_estimado": "float64"},
+        "fechas": ["fecha_limite"],
+    },
+    "balance": {
+        "tipos": {"importe": "float64"},
+        "derivadas": {"tipo_norm": ("tipo", normalizar_tipo)},
+    },
+    "cuenta_resultados": {
+        "tipos": {"importe": "float64"},
+        "derivadas": {"tipo_norm": ("tipo", normalizar_tipo)},
+    },
+    "presupuesto": {
+        "tipos": {"mes": str, "plazas": "float64", "precio": "float64", "gastos": "float64"},
+        "categorias": ["residencia"],
+    },
+}
+
+
+def huella_esquema(nombre: str) -> str:
+    """Huella estable del esquema de un dataset (invalida snapshots si cambia)."""
+    esquema = ESQUEMAS.get(nombre, {})
+    texto = json.dumps(esquema, sort_keys=True, default=lambda f: getattr(f, "__name__", str(f)))
+    return hashlib.sha1(texto.encode("utf-8")).hexdigest()[:12]
+
+
+def _tipos_lectura(nombre: str, ruta: str) -> Dict[str, str]:
+    """dtype de read_csv según el esquema, limitado a las columnas presentes."""
+    esquema = ESQUEMAS.get(nombre, {})
+    columnas = set(pd.read_csv(ruta, nrows=0).columns)
+
+    dtype = {c: t for c, t in esquema.get("tipos", {}).items() if c in columnas}
+    dtype.update({c: "category" for c in esquema.get("categorias", []) if c in columnas})
+    return dtype
+
+
+def _aplicar_esquema(nombre: str, df: pd.DataFrame) -> pd.DataFrame:
+    """Convierte fechas y calcula las columnas derivadas del esquema."""
+    esquema = ESQUEMAS.get(nombre, {})
+
+    for col in esquema.get("fechas", []):
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], errors="coerce", format="ISO8601")
+
+    for nueva, (origen, funcion) in esquema.get("derivadas", {}).items():
+        if origen in df.columns:
+            # La normalización se evalúa una vez por valor distinto, no por fila
+            mapa = {v: funcion(v) for v in df[origen].dropna().unique()}
+            df[nueva] = df[origen].map(mapa).astype("category")
+
+    return df
+
+
+def leer_con_esquema(nombre: str, ruta: str) -> pd.DataFrame:
+    """Lee un CSV aplicando su esquema. Las columnas ausentes se ignoran."""
+    dtype = _tipos_lectura(nombre, ruta)
+    return _aplicar_esquema(nombre, pd.read_csv(ruta, dtype=dtype or None))
+
+
+def leer_con_esquema_por_bloques(nombre: str, ruta: str, filas_bloque: int) -> Iterator[pd.DataFrame]:
+    """
+    Lee un CSV por bloques de filas_bloque filas aplicando el esquema a cada
+    bloque. La memoria usada no depende del tamaño del fichero.
+    """
+    dtype = _tipos_lectura(nombre, ruta)
+    with pd.read_csv(ruta, dtype=dtype or None, chunksize=filas_bloque) as lector:
+        for bloque in lector:
+            yield _aplicar_esquema(nombre, bloque)
+
+
+def a_registros(df: pd.DataFrame, formato: str = "%Y-%m-%d") -> List[dict]:
+    """
+    Convierte un DataFrame a lista de dicts serializable en JSON.
+    Las fechas se emiten como texto y los NaT como None.
+    """
+    out = df.copy(deep=False)
+    for col in out.columns:
+        if pd.api.types.is_datetime64_any_dtype(out[col]):
+            out[col] = out[col].dt.strftime(formato).astype(object).where(out[col].notna(), None)
+    return out.to_dict(orient="records")
@@ -0,0 +1,103 @@
+"""
+Snapshots binarios columnares de data/*.csv.
+La primera lectura de un CSV lo convierte a Feather (Arrow) y las siguientes
+leen el snapshot. Se reconstruye automáticamente cuando cambia el hash del CSV.
+Requiere pyarrow; sin él se lee siempre el CSV.
+"""
+
+import hashlib
+import json
+import os
+import sys
+from typing import Callable, Optional
+
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    SNAPSHOTS_AVAILABLE = True
+except ImportError:
+    SNAPSHOTS_AVAILABLE = False
+
+# Se incrementa cuando cambia la forma de generar snapshots (invalida los existentes)
+FORMATO_SNAPSHOT = 1
+
+
+def hash_fichero(ruta: str, bloque: int = 1 << 20) -> str:
+    """Hash SHA-256 del contenido de un fichero, leído por bloques."""
+    h = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for trozo in iter(lambda: f.read(bloque), b""):
+            h.update(trozo)
+    return h.hexdigest()
+
+
+class SnapshotCache:
+    """Cache en disco de DataFrames en formato Feather, indexada por hash de CSV."""
+
+    def __init__(self, directorio: str):
+        self.directorio = directorio
+
+    def _rutas(self, nombre: str):
+        base = os.path.join(self.directorio, nombre)
+        return f"{base}.feather", f"{base}.json"
+
+    def _meta(self, ruta_meta: str) -> Optional[dict]:
+        try:
+            with open(ruta_meta, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def vigente(self, nombre: str, hash_csv: str, esquema: str = "") -> bool:
+        """Indica si existe un snapshot válido para el contenido y esquema actuales."""
+        ruta_snap, ruta_meta = self._rutas(nombre)
+        meta = self._meta(ruta_meta)
+        return (
+            meta is not None
+            and meta.get("hash") == hash_csv
+            and meta.get("esquema", "") == esquema
+            and meta.get("formato") == FORMATO_SNAPSHOT
+            and os.path.exists(ruta_snap)
+        )
+
+    def guardar(self, nombre: str, df: pd.DataFrame, hash_csv: str, esquema: str = "") -> None:
+        """
+        Escribe el snapshot y sus metadatos de forma atómica (fichero temporal
+        + rename): un lector concurrente nunca ve un JSON a medio escribir.
+        """
+        os.makedirs(self.directorio, exist_ok=True)
+        ruta_snap, ruta_meta = self._rutas(nombre)
+        tmp = f"{ruta_snap}.{os.getpid()}.tmp"
+        df.reset_index(drop=True).to_feather(tmp)
+        os.replace(tmp, ruta_snap)
+        tmp = f"{ruta_meta}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"hash": hash_csv, "esquema": esquema, "formato": FORMATO_SNAPSHOT, "filas": len(df)}, f)
+        os.replace(tmp, ruta_meta)
+
+    def cargar(self, nombre: str, ruta_csv: str, lector: Callable[[], pd.DataFrame],
+               esquema: str = "", hash_csv: Optional[str] = None) -> pd.DataFrame:
+        """
+        Devuelve el dataset desde el snapshot si está vigente.
+        Si no, lo lee con `lector` y regenera el snapshot.
+        hash_csv evita recalcular el hash si ya se conoce.
+        """
+        if not SNAPSHOTS_AVAILABLE:
+            return lector()
+
+        hash_csv = hash_csv or hash_fichero(ruta_csv)
+        if self.vigente(nombre, hash_csv, esquema):
+            try:
+                return pd.read_feather(self._rutas(nombre)[0])
+            except Exception as e:
+                print(f"⚠️ Snapshot de {nombre} ilegible, se regenera: {e}", file=sys.stderr)
+
+        df = lector()
+        try:
+            self.guardar(nombre, df, hash_csv, esquema)
+        except Exception as e:
+            # Directorio de solo lectura, disco lleno... seguimos con el CSV
+            # (stderr: los servidores MCP usan stdout como canal del protocolo)
+            print(f"⚠️ No se pudo guardar el snapshot de {nombre}: {e}", file=sys.stderr)
+        return df
@@ -0,0 +1,297 @@
+"""
+Backend SQL embebido (SQLite) opcional.
+
+Si existe la base de datos data/.sql/financiero.db (se crea con
+`python -m datastore sql`), las consultas de facturas, morosos y aging se
+resuelven en SQLite con consultas indexadas: filtros, agrupaciones y top-N
+se ejecutan en la base de datos sin materializar la tabla completa en
+pandas. Cada tabla se recarga sola cuando cambia la versión de su CSV (ver
+versiones.py); la base guarda el hash del contenido cargado en cada tabla.
+"""
+
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from functools import cached_property
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from .reloj import resolver_as_of
+from .schemas import ESQUEMAS, huella_esquema, leer_con_esquema_por_bloques
+from .store import DataStore, data_store
+from .streaming import COLUMNAS_COBROS_AGREGADOS, COLUMNAS_VENCIMIENTOS, ESTADOS_ABIERTOS
+
+FILAS_BLOQUE_SQL = 100_000
+
+# Índices por tabla (columnas en orden)
+INDICES_SQL: Dict[str, List[Tuple[str, ...]]] = {
+    "facturas_emitidas": [
+        ("estado", "residencia"),
+        ("estado", "fecha_vencimiento"),
+        ("id_estudiante",),
+    ],
+    "estudiantes": [("id_estudiante",)],
+}
+
+# Días de retraso redondeados hacia abajo, igual que Timedelta.days en pandas
+_DIFERENCIA = "(julianday(:ahora) - julianday(fecha_vencimiento))"
+DIAS_SQL = f"(CAST({_DIFERENCIA} AS INTEGER) - ({_DIFERENCIA} < CAST({_DIFERENCIA} AS INTEGER)))"
+
+
+def _fecha_sql(fecha: datetime) -> str:
+    return fecha.strftime("%Y-%m-%d %H:%M:%S.%f")
+
+
+def _tipar_facturas(df: pd.DataFrame) -> pd.DataFrame:
+    """Las fechas vuelven de SQLite como texto: se convierten a datetime."""
+    for col in ESQUEMAS["facturas_emitidas"]["fechas"]:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], errors="coerce", format="ISO8601")
+    return df
+
+
+class BackendSQL:
+    """Base de datos SQLite con una tabla por dataset de data/."""
+
+    def __init__(self, ruta: str, store: DataStore = data_store):
+        self.ruta = ruta
+        self.store = store
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._vigentes: Dict[str, int] = {}
+
+    def conexion(self) -> sqlite3.Connection:
+        """Conexión propia de cada hilo."""
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.ruta)
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS _meta "
+                "(dataset TEXT PRIMARY KEY, hash TEXT, esquema TEXT)"
+            )
+            self._local.con = con
+        return con
+
+    def cargar(self, dataset: str, forzar: bool = False) -> bool:
+        """
+        Carga la tabla de un dataset si no existe o si su CSV ha cambiado.
+        El CSV se lee por bloques en una tabla temporal que sustituye a la
+        anterior en una sola transacción. Devuelve True si se recargó.
+        """
+        nombre = self.store.nombre(dataset)
+        ruta_csv = self.store.ruta(nombre)
+        version = self.store.version(nombre)[0]
+        if not forzar and self._vigentes.get(nombre) == version:
+            return False
+
+        firma = (self.store.versiones.hash(nombre), huella_esquema(nombre))
+        with self._lock:
+            con = self.conexion()
+            meta = con.execute("SELECT hash, esquema FROM _meta WHERE dataset = ?", (nombre,)).fetchone()
+            recargada = forzar or meta != firma
+            if recargada:
+                temporal = f"_{nombre}_{os.getpid()}"
+                con.execute(f'DROP TABLE IF EXISTS "{temporal}"')
+                for bloque in leer_con_esquema_por_bloques(nombre, ruta_csv, FILAS_BLOQUE_SQL):
+                    bloque.to_sql(temporal, con, if_exists="append", index=False)
+
+                con.execute("BEGIN IMMEDIATE")
+                try:
+                    con.execute(f'DROP TABLE IF EXISTS "{nombre}"')
+                    con.execute(f'ALTER TABLE "{temporal}" RENAME TO "{nombre}"')
+                    for columnas in INDICES_SQL.get(nombre, []):
+                        con.execute(
+                            f'CREATE INDEX "idx_{nombre}_{"_".join(columnas)}" '
+                            f'ON "{nombre}" ({", ".join(columnas)})'
+                        )
+                    con.execute("INSERT OR REPLACE INTO _meta VALUES (?, ?, ?)", (nombre, *firma))
+                    con.execute("COMMIT")
+                except Exception:
+                    con.execute("ROLLBACK")
+                    con.execute(f'DROP TABLE IF EXISTS "{temporal}"')
+                    raise
+            self._vigentes[nombre] = version
+        return recargada
+
+    def consultar(self, sql: str, parametros: Optional[dict] = None, *datasets: str) -> pd.DataFrame:
+        """Ejecuta una consulta tras asegurar que las tablas implicadas están al día."""
+        for dataset in datasets:
+            self.cargar(dataset)
+        return pd.read_sql_query(sql, self.conexion(), params=parametros or {})
+
+    @staticmethod
+    def _filtros(estado=None, residencia: Optional[str] = None) -> Tuple[str, dict]:
+        """Cláusula WHERE para filtros de estado (uno o varios) y residencia (coincidencia parcial)."""
+        condiciones, parametros = [], {}
+        if estado is not None and estado != "todas":
+            estados = [estado] if isinstance(estado, str) else list(estado)
+            marcas = []
+            for i, valor in enumerate(estados):
+                parametros[f"estado{i}"] = valor
+                marcas.append(f":estado{i}")
+            condiciones.append(f"estado IN ({', '.join(marcas)})")
+        if residencia is not None and residencia != "todas":
+            patron = residencia.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            parametros["residencia"] = f"%{patron}%"
+            condiciones.append("residencia LIKE :residencia ESCAPE '\\'")
+        return (" WHERE " + " AND ".join(condiciones)) if condiciones else "", parametros
+
+    def facturas(self, estado="todas", residencia: Optional[str] = "todas",
+                 limite: Optional[int] = None) -> Tuple[int, float, pd.DataFrame]:
+        """Número, importe total y filas (hasta limite, en orden original) de las facturas filtradas."""
+        where, parametros = self._filtros(estado, residencia)
+        totales = self.consultar(
+            f"SELECT COUNT(*) AS n, COALESCE(SUM(importe), 0) AS total FROM facturas_emitidas{where}",
+            parametros, "facturas_emitidas"
+        )
+        sql = f"SELECT * FROM facturas_emitidas{where} ORDER BY rowid"
+        if limite is not None:
+            sql += f" LIMIT {int(limite)}"
+        filas = _tipar_facturas(self.consultar(sql, parametros))
+        return int(totales["n"].iloc[0]), float(totales["total"].iloc[0]), filas
+
+    def vencimientos_abiertos(self) -> pd.DataFrame:
+        """Importe y nº de facturas abiertas por fecha de vencimiento (base del aging)."""
+        where, parametros = self._filtros(ESTADOS_ABIERTOS)
+        df = self.consultar(
+            "SELECT fecha_vencimiento, SUM(importe) AS importe, COUNT(*) AS num_facturas "
+            f"FROM facturas_emitidas{where} GROUP BY fecha_vencimiento",
+            parametros, "facturas_emitidas"
+        )
+        df = _tipar_facturas(df).sort_values("fecha_vencimiento", na_position="last").reset_index(drop=True)
+        return df[COLUMNAS_VENCIMIENTOS]
+
+
+class ResumenCobrosSQL:
+    """
+    Vencimientos abiertos, morosos y previsión de cobros resueltos en SQLite.
+    Misma interfaz que streaming.AgregadorCobros; cada parte se consulta
+    solo cuando se pide.
+    """
+
+    def __init__(self, backend: BackendSQL, ahora: Optional[datetime] = None, dias_minimo: int = 1,
+                 horizonte_dias: Optional[int] = None, max_cobros: Optional[int] = None):
+        self.backend = backend
+        self.ahora = resolver_as_of(ahora)
+        self.dias_minimo = dias_minimo
+        self.limite = self.ahora + timedelta(days=horizonte_dias) if horizonte_dias is not None else None
+        self.max_cobros = max_cobros
+
+    @cached_property
+    def _vencimientos(self) -> pd.DataFrame:
+        return self.backend.vencimientos_abiertos()
+
+    def vencimientos(self) -> pd.DataFrame:
+        """Importe y número de facturas abiertas por fecha de vencimiento."""
+        return self._vencimientos.copy()
+
+    @property
+    def importe_abierto(self) -> float:
+        return float(self._vencimientos["importe"].sum())
+
+    @property
+    def num_abiertas(self) -> int:
+        return int(self._vencimientos["num_facturas"].sum())
+
+    @cached_property
+    def num_vencidas(self) -> int:
+        where, parametros = BackendSQL._filtros("vencida")
+        return int(self.backend.consultar(
+            f"SELECT COUNT(*) AS n FROM facturas_emitidas{where}", parametros, "facturas_emitidas"
+        )["n"].iloc[0])
+
+    def morosos(self) -> pd.DataFrame:
+        """Deuda vencida agregada por estudiante (id_estudiante, deuda_total, num_facturas, max_dias_retraso)."""
+        return self.backend.consultar(
+            "SELECT id_estudiante, SUM(importe) AS deuda_total, COUNT(id_factura) AS num_facturas, "
+            "MAX(dias) AS max_dias_retraso "
+            f"FROM (SELECT id_estudiante, id_factura, importe, {DIAS_SQL} AS dias "
+            "      FROM facturas_emitidas WHERE estado = 'vencida') "
+            "WHERE dias >= :minimo AND id_estudiante IS NOT NULL "
+            "GROUP BY id_estudiante ORDER BY id_estudiante",
+            {"ahora": _fecha_sql(self.ahora), "minimo": self.dias_minimo}, "facturas_emitidas"
+        )
+
+    def _previstos(self) -> Tuple[str, dict]:
+        where, parametros = BackendSQL._filtros("pendiente")
+        if self.limite is not None:
+            where += " AND julianday(fecha_vencimiento) <= julianday(:limite)"
+            parametros["limite"] = _fecha_sql(self.limite)
+        return where, parametros
+
+    @cached_property
+    def _totales_previstos(self) -> Tuple[float, int]:
+        where, parametros = self._previstos()
+        totales = self.backend.consultar(
+            f"SELECT COUNT(*) AS n, COALESCE(SUM(importe), 0) AS total FROM facturas_emitidas{where}",
+            parametros, "facturas_emitidas"
+        )
+        return float(totales["total"].iloc[0]), int(totales["n"].iloc[0])
+
+    @property
+    def importe_previsto(self) -> float:
+        return self._totales_previstos[0]
+
+    @property
+    def num_previstos(self) -> int:
+        return self._totales_previstos[1]
+
+    @property
+    def con_detalle(self) -> bool:
+        """Indica si se pueden pedir las facturas previstas (acotadas por max_cobros o el horizonte)."""
+        return self.max_cobros is not None or self.limite is not None
+
+    def cobros_agregados(self) -> pd.DataFrame:
+        """Importe y nº de facturas pendientes previstas por fecha de vencimiento y estudiante."""
+        where, parametros = self._previstos()
+        df = self.backend.consultar(
+            "SELECT fecha_vencimiento, id_estudiante, SUM(importe) AS importe, COUNT(*) AS num_facturas "
+            f"FROM facturas_emitidas{where} GROUP BY fecha_vencimiento, id_estudiante",
+            parametros, "facturas_emitidas"
+        )
+        df = _tipar_facturas(df).sort_values(["fecha_vencimiento", "id_estudiante"], na_position="last")
+        return df[COLUMNAS_COBROS_AGREGADOS].reset_index(drop=True)
+
+    def cobros(self) -> pd.DataFrame:
+        """
+        Facturas pendientes previstas (ordenadas por vencimiento si hay max_cobros).
+        Lanza ValueError si no se acotaron con max_cobros ni con el horizonte.
+        """
+        if not self.con_detalle:
+            raise ValueError("El detalle de cobros requiere max_cobros u horizonte_dias; usa cobros_agregados()")
+        where, parametros = self._previstos()
+        sql = f"SELECT * FROM facturas_emitidas{where}"
+        if self.max_cobros is not None:
+            sql += f" ORDER BY fecha_vencimiento, rowid LIMIT {int(self.max_cobros)}"
+        else:
+            sql += " ORDER BY rowid"
+        return _tipar_facturas(self.backend.consultar(sql, parametros, "facturas_emitidas"))
+
+
+_backends: Dict[str, BackendSQL] = {}
+_backends_lock = threading.Lock()
+
+
+def ruta_sql(store: DataStore = data_store) -> str:
+    """Ruta de la base de datos SQLite asociada a un DataStore."""
+    return os.path.join(store.data_path, ".sql", "financiero.db")
+
+
+def backend_sql(store: DataStore = data_store, crear: bool = False) -> Optional[BackendSQL]:
+    """
+    Backend SQL del DataStore, o None si la base de datos no se ha creado.
+    Con crear=True se crea el fichero si no existe.
+    """
+    ruta = ruta_sql(store)
+    if not crear and not os.path.exists(ruta):
+        return None
+    with _backends_lock:
+        backend = _backends.get(ruta)
+        if backend is None:
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+            backend = _backends[ruta] = BackendSQL(ruta, store)
+    if crear:
+        backend.conexion()
+    return backend
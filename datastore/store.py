@@ -0,0 +1,168 @@
+"""
+Almacén de datos compartido (DataStore).
+Carga cada CSV de data/ una sola vez por proceso y lo recarga únicamente
+cuando cambia su contenido, según el servicio de versión de datos (ver
+versiones.py). Las lecturas pasan por la cache de snapshots columnares (ver
+snapshots.py) y se tipan según el registro de esquemas (ver schemas.py).
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Tuple, Union
+
+import pandas as pd
+
+from .schemas import huella_esquema, leer_con_esquema
+from .snapshots import SnapshotCache
+from .versiones import VersionDatos
+
+# Configuración
+DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+# Días de análisis (as_of) que se memoizan por resultado derivado
+MAX_DIAS_MEMO = 4
+
+
+class MemoAcotada:
+    """
+    Memo LRU de tamaño fijo para resultados derivados con parámetros libres
+    (fechas, ejes...). Se usa dentro de DataStore.derivado, de modo que además
+    se descarta entera cuando cambian los datos.
+    """
+
+    def __init__(self, max_entradas: int):
+        self.max_entradas = max_entradas
+        self._valores: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, clave: Hashable, constructor: Callable[[], Any]) -> Any:
+        """Valor de la clave, construyéndolo si no está (desaloja el menos usado si se llena)."""
+        with self._lock:
+            if clave in self._valores:
+                self._valores.move_to_end(clave)
+                return self._valores[clave]
+        valor = constructor()
+        with self._lock:
+            valor = self._valores.setdefault(clave, valor)
+            self._valores.move_to_end(clave)
+            while len(self._valores) > self.max_entradas:
+                self._valores.popitem(last=False)
+        return valor
+
+    def __len__(self) -> int:
+        return len(self._valores)
+
+
+class DataStore:
+    """Caché en memoria de los datasets CSV indexada por versión de datos."""
+
+    def __init__(self, data_path: str = DATA_PATH):
+        self.data_path = data_path
+        self.snapshots = SnapshotCache(os.path.join(data_path, ".snapshots"))
+        self.versiones = VersionDatos(data_path)
+        self._frames: Dict[str, pd.DataFrame] = {}
+        self._cargadas: Dict[str, int] = {}
+        self._derivados: Dict[Any, Tuple[tuple, Any]] = {}
+        self._lock = threading.RLock()
+        # Un lock por dataset y por derivado: las cargas y construcciones de
+        # claves distintas no se esperan entre sí
+        self._locks: Dict[tuple, threading.RLock] = {}
+
+    @staticmethod
+    def nombre(dataset: str) -> str:
+        """Normaliza 'facturas_emitidas.csv' y 'facturas_emitidas' al mismo nombre."""
+        return dataset[:-4] if dataset.endswith(".csv") else dataset
+
+    def ruta(self, dataset: str) -> str:
+        """Ruta absoluta del CSV de un dataset."""
+        return os.path.join(self.data_path, f"{self.nombre(dataset)}.csv")
+
+    def datasets(self) -> List[str]:
+        """Nombres de todos los datasets disponibles en data/."""
+        return sorted(self.nombre(f) for f in os.listdir(self.data_path) if f.endswith(".csv"))
+
+    def leer_csv(self, dataset: str) -> pd.DataFrame:
+        """
+        Parsea el CSV de un dataset aplicando su esquema (ver schemas.py).
+        Punto único de parseo de todo el proceso.
+        """
+        nombre = self.nombre(dataset)
+        return leer_con_esquema(nombre, self.ruta(nombre))
+
+    def _leer(self, nombre: str, ruta: str) -> pd.DataFrame:
+        """Lee un dataset, desde su snapshot si está vigente."""
+        return self.snapshots.cargar(nombre, ruta, lambda: self.leer_csv(nombre), huella_esquema(nombre),
+                                     hash_csv=self.versiones.hash(nombre))
+
+    def _lock_de(self, *clave) -> threading.RLock:
+        """Lock propio de un dataset o de un derivado."""
+        with self._lock:
+            lock = self._locks.get(clave)
+            if lock is None:
+                lock = self._locks[clave] = threading.RLock()
+            return lock
+
+    def _refrescar(self, nombre: str) -> int:
+        """Carga el dataset si no está en memoria o si su versión ha cambiado. Devuelve la versión."""
+        version = self.versiones.comprobar(nombre)
+        if self._cargadas.get(nombre) == version:
+            return version
+        with self._lock_de("dataset", nombre):
+            if self._cargadas.get(nombre) != version:
+                self._frames[nombre] = self._leer(nombre, self.ruta(nombre))
+                self._cargadas[nombre] = version
+        return version
+
+    def get(self, dataset: str) -> pd.DataFrame:
+        """
+        Devuelve el DataFrame de un dataset.
+
+        El resultado es una copia superficial del frame compartido: se pueden
+        añadir o reasignar columnas, pero no modificar valores in situ.
+        """
+        nombre = self.nombre(dataset)
+        self._refrescar(nombre)
+        return self._frames[nombre].copy(deep=False)
+
+    def version(self, *datasets: str) -> Union[int, tuple]:
+        """
+        Versión de datos. Sin argumentos, la versión global de data/; con
+        datasets, una tupla con la versión en la que cambió cada uno.
+        """
+        if not datasets:
+            return self.versiones.actual()
+        return tuple(self.versiones.comprobar(self.nombre(d)) for d in datasets)
+
+    def derivado(self, clave: Any, datasets: Iterable[str], constructor: Callable[[], Any]) -> Any:
+        """
+        Memoiza una estructura calculada a partir de uno o varios datasets.
+
+        Se reconstruye solo cuando cambia la versión de alguno de ellos. Cada
+        clave se construye con su propio lock: dos hilos que piden la misma
+        clave la construyen una vez, y claves distintas se construyen a la vez.
+        """
+        datasets = tuple(datasets)
+        version = self.version(*datasets)
+        cacheado = self._derivados.get(clave)
+        if cacheado is not None and cacheado[0] == version:
+            return cacheado[1]
+        with self._lock_de("derivado", clave):
+            cacheado = self._derivados.get(clave)
+            if cacheado is not None and cacheado[0] == version:
+                return cacheado[1]
+            valor = constructor()
+            with self._lock:
+                # Las versiones solo crecen: no se pisa una construcción más reciente
+                cacheado = self._derivados.get(clave)
+                if cacheado is None or cacheado[0] <= version:
+                    self._derivados[clave] = (version, valor)
+            return valor
+
+    def invalidar(self, dataset: str = None) -> None:
+        """Fuerza la recarga de un dataset (o de todos) publicando una nueva versión."""
+        self.versiones.invalidar(self.nombre(dataset) if dataset is not None else None)
+
+
+# Instancia global compartida por todo el proceso
+data_store = DataStore()
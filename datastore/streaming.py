@@ -0,0 +1,242 @@
+"""
+Agregados de cobros con memoria acotada.
+
+La distribución de facturas abiertas por fecha de vencimiento (base del
+aging, ver engines/aging.py), la deuda vencida por estudiante y los cobros
+pendientes por fecha de vencimiento y estudiante (base de la proyección de
+caja y del estrés de liquidez) se calculan con un único agregador que acepta las facturas por bloques. Con ficheros pequeños se
+le pasa la tabla en memoria de una vez; cuando facturas_emitidas.csv supera
+UMBRAL_STREAMING se leen por bloques solo las particiones mensuales con
+facturas abiertas (ver particiones.py), sin cargar la tabla entera. Ambos
+modos comparten el mismo código y dan el mismo resultado.
+Si el backend SQL está creado (ver sql.py), las agregaciones se resuelven
+directamente en SQLite.
+"""
+
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from .indices import particion_estados
+from .particiones import ESTADOS_ABIERTOS, particiones_facturas
+from .reloj import resolver_as_of
+from .schemas import ESQUEMAS
+from .store import DataStore, data_store
+
+# Tamaño de fichero a partir del cual se agrega en streaming
+UMBRAL_STREAMING = 256 * 1024 * 1024
+
+COLUMNAS_VENCIMIENTOS = ["fecha_vencimiento", "importe", "num_facturas"]
+COLUMNAS_COBROS_AGREGADOS = ["fecha_vencimiento", "id_estudiante", "importe", "num_facturas"]
+
+# Columnas de facturas_emitidas (las de una previsión de cobros sin facturas)
+COLUMNAS_FACTURAS = ["id_factura", "id_estudiante", "residencia", "concepto", "importe",
+                     "fecha_emision", "fecha_vencimiento", "estado", "fecha_pago_real"]
+
+
+def facturas_vacias() -> pd.DataFrame:
+    """Tabla de facturas sin filas con las columnas y tipos del esquema."""
+    esquema = ESQUEMAS["facturas_emitidas"]
+    columnas = {}
+    for col in COLUMNAS_FACTURAS:
+        tipo = "datetime64[ns]" if col in esquema["fechas"] else esquema["tipos"].get(col, object)
+        columnas[col] = pd.Series(dtype=object if tipo is str else tipo)
+    return pd.DataFrame(columnas)
+
+
+def agrupar_vencimientos(facturas: pd.DataFrame) -> pd.DataFrame:
+    """Importe y nº de facturas por fecha de vencimiento (NaT incluido), indexado por fecha."""
+    return facturas.groupby("fecha_vencimiento", dropna=False)["importe"].agg(importe="sum", num_facturas="size")
+
+
+def agrupar_cobros(facturas: pd.DataFrame) -> pd.DataFrame:
+    """Importe y nº de facturas por fecha de vencimiento y estudiante (nulos incluidos)."""
+    return facturas.groupby(["fecha_vencimiento", "id_estudiante"], dropna=False)["importe"].agg(
+        importe="sum", num_facturas="size"
+    )
+
+
+def _combinar_vencimientos(*partes: pd.DataFrame) -> pd.DataFrame:
+    return pd.concat(partes).groupby(level=0, dropna=False).sum()
+
+
+def _combinar_cobros(*partes: pd.DataFrame) -> pd.DataFrame:
+    return pd.concat(partes).groupby(level=[0, 1], dropna=False).sum()
+
+
+class AgregadorCobros:
+    """
+    Acumula vencimientos abiertos, morosos y previsión de cobros bloque a bloque.
+
+    La memoria depende del número de estudiantes con deuda y de fechas de
+    vencimiento, no del número de facturas: los cobros pendientes se reducen
+    a sumas por fecha de vencimiento y estudiante. El detalle factura a
+    factura solo se guarda si se acota con max_cobros o con el horizonte.
+
+    Args:
+        ahora: Fecha de referencia para calcular antigüedades
+        dias_minimo: Días mínimos de retraso para contar una factura como morosa
+        horizonte_dias: Si se indica, la previsión solo incluye vencimientos hasta ahora + horizonte
+        max_cobros: Si se indica, guarda solo los primeros cobros por fecha de vencimiento
+    """
+
+    def __init__(self, ahora: Optional[datetime] = None, dias_minimo: int = 1,
+                 horizonte_dias: Optional[int] = None, max_cobros: Optional[int] = None):
+        self.ahora = resolver_as_of(ahora)
+        self.dias_minimo = dias_minimo
+        self.limite = self.ahora + timedelta(days=horizonte_dias) if horizonte_dias is not None else None
+        self.max_cobros = max_cobros
+
+        self._vencimientos: Optional[pd.DataFrame] = None
+        self.importe_abierto = 0.0
+        self.num_abiertas = 0
+        self.num_vencidas = 0
+        self.importe_previsto = 0.0
+        self.num_previstos = 0
+        self._morosos: Optional[pd.DataFrame] = None
+        self._cobros_agregados: Optional[pd.DataFrame] = None
+        self._cobros: Optional[pd.DataFrame] = None
+
+    @property
+    def con_detalle(self) -> bool:
+        """Indica si se guardan las facturas previstas (acotadas por max_cobros o el horizonte)."""
+        return self.max_cobros is not None or self.limite is not None
+
+    def acumular(self, facturas: pd.DataFrame) -> None:
+        """Incorpora un bloque de facturas (puede contener cualquier estado)."""
+        estado = facturas["estado"].astype(str).to_numpy()
+        es_abierta = np.isin(estado, ESTADOS_ABIERTOS)
+        abiertas = facturas[es_abierta]
+        if abiertas.empty:
+            return
+        estado = estado[es_abierta]
+        dias = (self.ahora - abiertas["fecha_vencimiento"]).dt.days
+
+        # Pendientes + vencidas por fecha de vencimiento (el aging se calcula sobre esto)
+        parcial = agrupar_vencimientos(abiertas)
+        self._vencimientos = parcial if self._vencimientos is None else _combinar_vencimientos(self._vencimientos, parcial)
+        self.importe_abierto += abiertas["importe"].sum()
+        self.num_abiertas += len(abiertas)
+
+        # Deuda vencida por estudiante
+        es_vencida = estado == "vencida"
+        self.num_vencidas += int(es_vencida.sum())
+        vencidas = abiertas[es_vencida].assign(dias_retraso=dias[es_vencida])
+        vencidas = vencidas[vencidas["dias_retraso"] >= self.dias_minimo]
+        if not vencidas.empty:
+            parcial = vencidas.groupby("id_estudiante").agg(
+                deuda_total=("importe", "sum"),
+                num_facturas=("id_factura", "count"),
+                max_dias_retraso=("dias_retraso", "max")
+            )
+            if self._morosos is not None:
+                parcial = pd.concat([self._morosos, parcial]).groupby(level=0).agg(
+                    {"deuda_total": "sum", "num_facturas": "sum", "max_dias_retraso": "max"}
+                )
+            self._morosos = parcial
+
+        # Previsión de cobros (solo pendientes)
+        previstos = abiertas[estado == "pendiente"]
+        if self.limite is not None:
+            previstos = previstos[previstos["fecha_vencimiento"] <= self.limite]
+        if not previstos.empty:
+            self.importe_previsto += previstos["importe"].sum()
+            self.num_previstos += len(previstos)
+            parcial = agrupar_cobros(previstos)
+            self._cobros_agregados = parcial if self._cobros_agregados is None \
+                else _combinar_cobros(self._cobros_agregados, parcial)
+            if self.con_detalle:
+                cobros = previstos if self._cobros is None else pd.concat([self._cobros, previstos])
+                if self.max_cobros is not None:
+                    # El índice es la posición en la tabla: desempata como el orden original
+                    cobros = cobros.sort_index().sort_values("fecha_vencimiento", kind="stable").head(self.max_cobros)
+                self._cobros = cobros
+
+    def vencimientos(self) -> pd.DataFrame:
+        """Importe y número de facturas abiertas por fecha de vencimiento."""
+        if self._vencimientos is None:
+            return pd.DataFrame(columns=COLUMNAS_VENCIMIENTOS)
+        return self._vencimientos.sort_index().reset_index()
+
+    def morosos(self) -> pd.DataFrame:
+        """Deuda vencida agregada por estudiante (id_estudiante, deuda_total, num_facturas, max_dias_retraso)."""
+        if self._morosos is None:
+            return pd.DataFrame(columns=["id_estudiante", "deuda_total", "num_facturas", "max_dias_retraso"])
+        return self._morosos.rename_axis("id_estudiante").reset_index()
+
+    def cobros_agregados(self) -> pd.DataFrame:
+        """Importe y nº de facturas pendientes previstas por fecha de vencimiento y estudiante."""
+        if self._cobros_agregados is None:
+            return pd.DataFrame(columns=COLUMNAS_COBROS_AGREGADOS).astype({"fecha_vencimiento": "datetime64[ns]",
+                                                                          "importe": float, "num_facturas": int})
+        return self._cobros_agregados.sort_index().reset_index()
+
+    def cobros(self) -> pd.DataFrame:
+        """
+        Facturas pendientes previstas (ordenadas por vencimiento si hay max_cobros).
+        Lanza ValueError si no se acotaron con max_cobros ni con el horizonte.
+        """
+        if not self.con_detalle:
+            raise ValueError("El detalle de cobros requiere max_cobros u horizonte_dias; usa cobros_agregados()")
+        if self._cobros is None:
+            return facturas_vacias()
+        return self._cobros if self.max_cobros is not None else self._cobros.sort_index(kind="stable")
+
+
+def usar_streaming(store: DataStore = data_store, umbral: int = UMBRAL_STREAMING) -> bool:
+    """Indica si facturas_emitidas.csv es lo bastante grande para agregarse en streaming."""
+    ruta = store.ruta("facturas_emitidas")
+    return os.path.exists(ruta) and os.path.getsize(ruta) >= umbral
+
+
+def vencimientos_abiertos(store: DataStore = data_store) -> pd.DataFrame:
+    """
+    Facturas abiertas (pendientes y vencidas) agregadas por fecha de vencimiento.
+
+    No depende de la fecha de referencia, así que en memoria se calcula una
+    vez por versión de datos; con backend SQL o en streaming se delega.
+    """
+    from .sql import backend_sql
+    backend = backend_sql(store)
+    if backend is not None:
+        return backend.vencimientos_abiertos()
+    if usar_streaming(store):
+        return resumen_cobros(streaming=True, store=store).vencimientos()
+    return store.derivado(
+        "vencimientos_abiertos", ["facturas_emitidas"],
+        lambda: agrupar_vencimientos(particion_estados(store).filas(*ESTADOS_ABIERTOS)).sort_index().reset_index()
+    )
+
+
+def resumen_cobros(dias_minimo: int = 1, horizonte_dias: Optional[int] = None,
+                   max_cobros: Optional[int] = None, ahora: Optional[datetime] = None,
+                   streaming: Optional[bool] = None, store: DataStore = data_store):
+    """
+    Calcula vencimientos abiertos, morosos y previsión de cobros en un solo pase.
+
+    Args:
+        streaming: Forzar (True) o evitar (False) el modo por bloques; por defecto
+            se usa el backend SQL si existe y, si no, se decide según el tamaño del fichero
+
+    Returns:
+        AgregadorCobros (o ResumenCobrosSQL, con la misma interfaz)
+    """
+    if streaming is None:
+        from .sql import ResumenCobrosSQL, backend_sql
+        backend = backend_sql(store)
+        if backend is not None:
+            return ResumenCobrosSQL(backend, ahora, dias_minimo, horizonte_dias, max_cobros)
+        streaming = usar_streaming(store)
+
+    agregador = AgregadorCobros(ahora, dias_minimo, horizonte_dias, max_cobros)
+
+    if streaming:
+        # Solo los meses con facturas abiertas; el resto de particiones se poda
+        for bloque in particiones_facturas(store).leer(solo_abiertas=True):
+            agregador.acumular(bloque)
+    else:
+        agregador.acumular(particion_estados(store).filas(*ESTADOS_ABIERTOS))
+    return agregador
@@ -0,0 +1,225 @@
+"""
+Servicio de versión de datos.
+
+Mantiene la huella (mtime, tamaño y hash SHA-256 del contenido) de cada CSV
+de data/ y publica un número de versión global que solo crece. La versión
+sube exactamente cuando cambia el contenido de algún CSV (un `touch` sin
+cambios no cuenta), y todas las caches (DataStore, derivados, backend SQL,
+particiones, resultados de herramientas) se indexan por ella.
+
+Los cambios se detectan con watchdog (inotify/FSEvents) si está instalado y,
+si no, con un hilo de sondeo. Sin vigilante activo, cada consulta revisa el
+fichero con un stat y solo recalcula el hash si el stat ha cambiado.
+"""
+
+import hashlib
+import os
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .snapshots import hash_fichero
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+    WATCHDOG_AVAILABLE = True
+except ImportError:
+    WATCHDOG_AVAILABLE = False
+
+# Segundos entre revisiones cuando no hay watchdog
+INTERVALO_SONDEO = 2.0
+
+# Sin vigilante, segundos mínimos entre reescaneos de data/ al pedir la huella
+INTERVALO_HUELLA = 2.0
+
+
+class VersionDatos:
+    """Huellas y versión monótona de los CSV de un directorio."""
+
+    def __init__(self, data_path: str):
+        self.data_path = data_path
+        self.version = 0
+        self._huellas: Dict[str, Tuple[int, int, str]] = {}
+        self._versiones: Dict[str, int] = {}
+        self._suscriptores: List[Callable[[int, List[str]], None]] = []
+        self._lock = threading.RLock()
+        self._observer = None
+        self._parar: Optional[threading.Event] = None
+        self._huella_global: Optional[Tuple[int, str]] = None
+        self._ultimo_escaneo: Optional[float] = None
+
+    def _ruta(self, nombre: str) -> str:
+        return os.path.join(self.data_path, f"{nombre}.csv")
+
+    @property
+    def vigilando(self) -> bool:
+        """Hay un vigilante (watchdog o sondeo) manteniendo las versiones al día."""
+        return self._observer is not None or self._parar is not None
+
+    # ------------------------------------------------------------------
+    # Detección de cambios
+    # ------------------------------------------------------------------
+
+    def _publicar(self, nombres: List[str]) -> None:
+        """Sube la versión global y la asigna a los datasets cambiados (con el lock tomado)."""
+        self.version += 1
+        for nombre in nombres:
+            self._versiones[nombre] = self.version
+        for callback in list(self._suscriptores):
+            try:
+                callback(self.version, nombres)
+            except Exception as e:
+                print(f"⚠️ Error notificando cambio de datos: {e}", file=sys.stderr)
+
+    def revisar(self, nombre: str) -> bool:
+        """
+        Revisa un CSV y publica una nueva versión si su contenido ha cambiado.
+        Devuelve True si cambió. Lanza FileNotFoundError si nunca ha existido.
+        """
+        ruta = self._ruta(nombre)
+        try:
+            st = os.stat(ruta)
+        except FileNotFoundError:
+            with self._lock:
+                if nombre not in self._huellas:
+                    raise
+                # Fichero borrado: cuenta como cambio
+                del self._huellas[nombre]
+                self._publicar([nombre])
+                return True
+
+        huella = self._huellas.get(nombre)
+        if huella is not None and huella[:2] == (st.st_mtime_ns, st.st_size):
+            return False
+
+        hash_csv = hash_fichero(ruta)
+        with self._lock:
+            huella = self._huellas.get(nombre)
+            self._huellas[nombre] = (st.st_mtime_ns, st.st_size, hash_csv)
+            if huella is not None and huella[2] == hash_csv:
+                return False
+            self._publicar([nombre])
+            return True
+
+    def escanear(self) -> List[str]:
+        """Revisa todos los CSV (incluidos los nuevos y los borrados). Devuelve los cambiados."""
+        nombres = {f[:-4] for f in os.listdir(self.data_path) if f.endswith(".csv")}
+        with self._lock:
+            nombres |= set(self._huellas)
+        return [n for n in sorted(nombres) if self.revisar(n)]
+
+    # ------------------------------------------------------------------
+    # Consulta
+    # ------------------------------------------------------------------
+
+    def comprobar(self, nombre: str) -> int:
+        """Versión del dataset. Sin vigilante activo, revisa antes el fichero."""
+        if not self.vigilando or nombre not in self._versiones:
+            self.revisar(nombre)
+        return self._versiones[nombre]
+
+    def hash(self, nombre: str) -> str:
+        """Hash SHA-256 del contenido actual del CSV. Lanza FileNotFoundError si se ha borrado."""
+        self.comprobar(nombre)
+        huella = self._huellas.get(nombre)
+        if huella is None:
+            raise FileNotFoundError(f"No existe el fichero del dataset {nombre}: {self._ruta(nombre)}")
+        return huella[2]
+
+    def actual(self) -> int:
+        """Versión global (sube con cualquier cambio de contenido en data/)."""
+        if not self.vigilando:
+            self.escanear()
+        return self.version
+
+    def huella(self) -> str:
+        """
+        Huella del contenido de todos los CSV. A diferencia de la versión,
+        no depende del proceso: sirve de clave para caches persistentes.
+        Se pide en cada consulta a la cache de resultados, así que sin
+        vigilante data/ se reescanea como mucho cada INTERVALO_HUELLA
+        segundos (un cambio tarda a lo sumo eso en reflejarse).
+        """
+        if not self.vigilando:
+            instante = time.monotonic()
+            if self._ultimo_escaneo is None or instante - self._ultimo_escaneo >= INTERVALO_HUELLA:
+                self.escanear()
+                self._ultimo_escaneo = instante
+        version = self.version
+        with self._lock:
+            if self._huella_global is None or self._huella_global[0] != version:
+                contenido = "|".join(f"{n}:{h[2]}" for n, h in sorted(self._huellas.items()))
+                self._huella_global = (version, hashlib.sha256(contenido.encode()).hexdigest()[:16])
+            return self._huella_global[1]
+
+    def invalidar(self, nombre: Optional[str] = None) -> None:
+        """Publica una nueva versión aunque el contenido no haya cambiado (fuerza recargas)."""
+        with self._lock:
+            self._publicar([nombre] if nombre is not None else list(self._versiones))
+
+    def suscribir(self, callback: Callable[[int, List[str]], None]) -> None:
+        """Registra callback(version, datasets_cambiados), llamado en cada cambio."""
+        with self._lock:
+            self._suscriptores.append(callback)
+
+    # ------------------------------------------------------------------
+    # Vigilancia
+    # ------------------------------------------------------------------
+
+    @property
+    def modo(self) -> Optional[str]:
+        """Mecanismo de vigilancia activo: "watchdog", "sondeo" o None."""
+        return "watchdog" if self._observer is not None else "sondeo" if self._parar is not None else None
+
+    def vigilar(self, intervalo: float = INTERVALO_SONDEO) -> str:
+        """
+        Arranca la vigilancia de data/ (idempotente) y devuelve el modo.
+        Usa watchdog si está disponible y, si no, un hilo de sondeo.
+        No escribe en stdout: los servidores MCP lo usan como canal.
+        """
+        with self._lock:
+            if self.vigilando:
+                return self.modo
+            self.escanear()
+
+            if WATCHDOG_AVAILABLE:
+                servicio = self
+
+                class _Manejador(FileSystemEventHandler):
+                    def on_any_event(self, event):
+                        for ruta in (getattr(event, "src_path", ""), getattr(event, "dest_path", "")):
+                            if ruta and str(ruta).endswith(".csv"):
+                                try:
+                                    servicio.revisar(os.path.basename(str(ruta))[:-4])
+                                except OSError:
+                                    pass
+
+                self._observer = Observer()
+                self._observer.schedule(_Manejador(), self.data_path, recursive=False)
+                self._observer.daemon = True
+                self._observer.start()
+            else:
+                self._parar = threading.Event()
+                parar = self._parar
+
+                def _sondeo():
+                    while not parar.wait(intervalo):
+                        try:
+                            self.escanear()
+                        except OSError:
+                            pass
+
+                threading.Thread(target=_sondeo, name="sondeo-datos", daemon=True).start()
+            return self.modo
+
+    def detener(self) -> None:
+        """Detiene la vigilancia; las consultas vuelven a revisar el fichero."""
+        with self._lock:
+            if self._observer is not None:
+                self._observer.stop()
+                self._observer = None
+            if self._parar is not None:
+                self._parar.set()
+                self._parar = None
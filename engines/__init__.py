@@ -0,0 +1,124 @@
+"""
+Motores de cálculo financiero sobre la capa de datos (datastore).
+"""
+
+from .aging import (
+    LIMITES_AGING,
+    InformeAging,
+    nombres_tramos,
+    clasificar_tramos,
+    aging_de,
+    calcular_aging
+)
+
+from .morosos import (
+    RankingMorosos,
+    ranking_morosos
+)
+
+from .kpis import (
+    ESTADOS_MOROSOS,
+    KPIS,
+    CuboKPIs,
+    cubo_kpis,
+    NOTA_GASTOS_ESTIMADOS,
+    ratios_cobro,
+    gastos_estimados,
+    gastos_anuales,
+    calcular_kpis
+)
+
+from .tesoreria import (
+    ProyeccionCaja,
+    proyectar_caja
+)
+
+from .estres import (
+    PARAMETROS_ESTRES,
+    DistribucionRetrasos,
+    ResultadoEstres,
+    distribucion_retrasos,
+    simular_estres_liquidez
+)
+
+from .deuda import (
+    CHOQUES_EURIBOR_PB,
+    CuadroAmortizacion,
+    cuadro_amortizacion,
+    rejilla_euribor
+)
+
+from .activos import (
+    METODOS_AMORTIZACION,
+    CalendarioAmortizacion,
+    calendario_amortizacion
+)
+
+from .scoring import (
+    PESOS_RIESGO,
+    ScoringPagos,
+    caracteristicas_pago,
+    scoring_pagos
+)
+
+from .desviaciones import (
+    NIVELES_DESVIACION,
+    CuboDesviaciones,
+    cubo_desviaciones,
+    calcular_desviaciones,
+    semaforo
+)
+
+from .escenarios import (
+    SUPUESTOS_ESCENARIOS,
+    RejillaEscenarios,
+    rango,
+    escenarios_fpa
+)
+
+__all__ = [
+    "LIMITES_AGING",
+    "InformeAging",
+    "nombres_tramos",
+    "clasificar_tramos",
+    "aging_de",
+    "calcular_aging",
+    "RankingMorosos",
+    "ranking_morosos",
+    "ESTADOS_MOROSOS",
+    "KPIS",
+    "CuboKPIs",
+    "cubo_kpis",
+    "NOTA_GASTOS_ESTIMADOS",
+    "ratios_cobro",
+    "gastos_estimados",
+    "gastos_anuales",
+    "calcular_kpis",
+    "ProyeccionCaja",
+    "proyectar_caja",
+    "PARAMETROS_ESTRES",
+    "DistribucionRetrasos",
+    "ResultadoEstres",
+    "distribucion_retrasos",
+    "simular_estres_liquidez",
+    "CHOQUES_EURIBOR_PB",
+    "CuadroAmortizacion",
+    "cuadro_amortizacion",
+    "rejilla_euribor",
+    "METODOS_AMORTIZACION",
+    "CalendarioAmortizacion",
+    "calendario_amortizacion",
+    "PESOS_RIESGO",
+    "ScoringPagos",
+    "caracteristicas_pago",
+    "scoring_pagos",
+    "NIVELES_DESVIACION",
+    "CuboDesviaciones",
+    "cubo_desviaciones",
+    "calcular_desviaciones",
+    "semaforo",
+    "SUPUESTOS_ESCENARIOS",
+    "RejillaEscenarios",
+    "rango",
+    "escenarios_fpa"
+]
@@ -0,0 +1,322 @@
+"""
+Motor de amortización de activos fijos (calendario de toda la vida útil).
+
+Cada activo se describe por su base amortizable, su vida útil en meses, el
+mes de alta (con la fracción del primer mes en servicio), la baja opcional y
+el método. La amortización acumulada de un activo tras t meses en servicio
+tiene forma cerrada para cada método, así que dotación, acumulada y valor
+neto de miles de activos se evalúan como matrices activos × meses sin
+recorrer los activos en Python.
+
+Los totales mensuales y anuales (por categoría) se materializan una vez por
+versión de datos: las dotaciones se calculan por bloques de activos y la
+acumulada y el coste en servicio se reconstruyen con sumas acumuladas de
+altas, bajas y dotaciones.
+"""
+
+from datetime import datetime
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from datastore import DataStore, data_store, resolver_as_of
+
+# Métodos admitidos (columna opcional "metodo"; por defecto, lineal)
+METODOS_AMORTIZACION: Dict[str, dict] = {
+    "lineal": {"codigo": 0, "nombre": "Lineal"},
+    "degresivo": {"codigo": 1, "nombre": "Degresivo (porcentaje constante)"},
+    "suma_digitos": {"codigo": 2, "nombre": "Suma de dígitos"},
+}
+ALIAS_METODOS = {"digitos": "suma_digitos", "suma de digitos": "suma_digitos", "suma de dígitos": "suma_digitos",
+                 "porcentaje constante": "degresivo", "decreciente": "degresivo", "lineal": "lineal"}
+
+# Coeficientes del método degresivo según la vida útil (art. 12.1.b LIS)
+COEFICIENTES_DEGRESIVO = ((5, 1.5), (8, 2.0), (float("inf"), 2.5))
+
+# Celdas (activos × meses) evaluadas por bloque al materializar los totales (bloques
+# pequeños caben en caché y son más rápidos que una matriz completa)
+CELDAS_POR_BLOQUE = 250_000
+
+
+def indice_mes(fechas) -> np.ndarray:
+    """Número absoluto de mes (año * 12 + mes - 1) de cada fecha."""
+    fechas = pd.DatetimeIndex(fechas)
+    return np.asarray(fechas.year * 12 + fechas.month - 1, dtype=float)
+
+
+def _fraccion_restante(fechas) -> np.ndarray:
+    """Fracción del mes desde la fecha (incluida) hasta fin de mes."""
+    fechas = pd.DatetimeIndex(fechas)
+    dias_mes = np.asarray(fechas.days_in_month, dtype=float)
+    return (dias_mes - np.asarray(fechas.day, dtype=float) + 1) / dias_mes
+
+
+def _fraccion_transcurrida(fechas) -> np.ndarray:
+    """Fracción del mes desde su inicio hasta la fecha (incluida)."""
+    fechas = pd.DatetimeIndex(fechas)
+    return np.asarray(fechas.day, dtype=float) / np.asarray(fechas.days_in_month, dtype=float)
+
+
+def normalizar_metodo(valor) -> str:
+    """Nombre canónico del método de amortización (lineal si no se reconoce)."""
+    texto = str(valor).lower().strip()
+    if texto in METODOS_AMORTIZACION:
+        return texto
+    return ALIAS_METODOS.get(texto, "lineal")
+
+
+def coeficiente_degresivo(vida_anos) -> np.ndarray:
+    """Coeficiente del método degresivo para cada vida útil en años."""
+    vida = np.asarray(vida_anos, dtype=float)
+    limites = np.array([limite for limite, _ in COEFICIENTES_DEGRESIVO])
+    coeficientes = np.array([coef for _, coef in COEFICIENTES_DEGRESIVO])
+    return coeficientes[np.searchsorted(limites, vida, side="right").clip(max=len(limites) - 1)]
+
+
+def acumulada_tras(base, meses_vida, metodo, coeficiente, t) -> np.ndarray:
+    """
+    Amortización acumulada tras t meses en servicio (t fraccionario, con
+    broadcasting). El degresivo pasa a lineal sobre el valor pendiente cuando
+    la cuota lineal lo supera, de modo que todos terminan en la base.
+    """
+    base, vida, metodo, coef, t = np.broadcast_arrays(
+        np.asarray(base, dtype=float), np.asarray(meses_vida, dtype=float), np.asarray(metodo),
+        np.asarray(coeficiente, dtype=float), np.asarray(t, dtype=float))
+    vida_valida = vida > 0
+    vida_segura = np.where(vida_valida, vida, 1.0)
+    t = np.clip(t, 0, vida_segura)
+
+    proporcion = t / vida_segura
+
+    # Los métodos no lineales solo se evalúan si aparecen
+    digitos = metodo == 2
+    if digitos.any():
+        suma_digitos = t * (2 * vida_segura - t + 1) / (vida_segura * (vida_segura + 1))
+        proporcion = np.where(digitos, suma_digitos, proporcion)
+
+    degresivo = metodo == 1
+    if degresivo.any():
+        tasa = np.clip(coef / vida_segura, 0, 1)
+        t_cambio = np.clip(vida_segura - 1 / np.where(tasa > 0, tasa, np.inf), 0, vida_segura)
+        pendiente_cambio = (1 - tasa) ** t_cambio
+        decreciente = np.where(
+            t <= t_cambio, 1 - (1 - tasa) ** t,
+            1 - pendiente_cambio * (vida_segura - t) / np.maximum(vida_segura - t_cambio, 1e-12))
+        proporcion = np.where(degresivo, decreciente, proporcion)
+
+    return np.where(vida_valida, base * proporcion, 0.0)
+
+
+class CalendarioAmortizacion:
+    """
+    Calendario de amortización de todos los activos fijos.
+
+    Attributes:
+        parametros: Un registro por activo con base, meses_vida, alta y baja
+            (meses absolutos), fracciones de mes y método
+        mensual: Totales por categoría y mes (dotacion, acumulada, valor_neto,
+            coste, bajas) desde el primer alta hasta el fin de la última vida útil
+    """
+
+    def __init__(self, activos: pd.DataFrame):
+        self.activos = activos.reset_index(drop=True)
+        n = len(self.activos)
+        valor = self.activos["valor_adquisicion"].to_numpy(dtype=float)
+        residual = self.activos["valor_residual"].to_numpy(dtype=float) if "valor_residual" in self.activos \
+            else np.zeros(n)
+        vida_anos = np.nan_to_num(self.activos["vida_util_anos"].to_numpy(dtype=float))
+        if "metodo" in self.activos:
+            # Normalizado una vez por valor distinto, no por fila
+            texto = self.activos["metodo"].astype(str)
+            metodo = texto.map({v: normalizar_metodo(v) for v in texto.unique()})
+        else:
+            metodo = pd.Series("lineal", index=self.activos.index)
+        coeficiente = self.activos["coeficiente"].to_numpy(dtype=float) if "coeficiente" in self.activos \
+            else np.full(n, np.nan)
+
+        alta = pd.to_datetime(self.activos["fecha_adquisicion"])
+        baja = pd.to_datetime(self.activos["fecha_baja"]) if "fecha_baja" in self.activos \
+            else pd.Series(pd.NaT, index=self.activos.index)
+        con_baja = baja.notna().to_numpy()
+        fecha_baja = baja.fillna(alta.min())
+
+        self.parametros = pd.DataFrame({
+            "id_activo": self.activos["id_activo"],
+            "categoria": self.activos["categoria"].astype(str),
+            "valor_adquisicion": valor,
+            "base": np.clip(valor - np.nan_to_num(residual), 0, None),
+            "meses_vida": vida_anos * 12,
+            "alta": indice_mes(alta),
+            "fraccion_alta": _fraccion_restante(alta),
+            "baja": np.where(con_baja, indice_mes(fecha_baja), np.inf),
+            "fraccion_baja": np.where(con_baja, _fraccion_transcurrida(fecha_baja), 0.0),
+            "metodo": metodo.to_numpy(),
+            "codigo_metodo": metodo.map({m: d["codigo"] for m, d in METODOS_AMORTIZACION.items()}).to_numpy(dtype=int),
+            "coeficiente": np.where(np.isnan(coeficiente), coeficiente_degresivo(vida_anos), coeficiente),
+        })
+        # Meses en servicio al darse de baja (inf si sigue en servicio)
+        p = self.parametros
+        self._t_baja = np.where(con_baja, p["baja"].to_numpy() - p["alta"].to_numpy() - 1 +
+                                p["fraccion_alta"].to_numpy() + p["fraccion_baja"].to_numpy(), np.inf)
+        self.mensual = self._materializar()
+
+    # --- Evaluación vectorizada --------------------------------------------
+
+    def _meses_en_servicio(self, filas, meses: np.ndarray) -> np.ndarray:
+        """t (meses en servicio al cierre de cada mes) para filas × meses, limitado por la baja."""
+        p = self.parametros
+        alta = p["alta"].to_numpy()[filas][:, None]
+        t = meses[None, :] - alta + p["fraccion_alta"].to_numpy()[filas][:, None]
+        return np.clip(np.minimum(t, self._t_baja[filas][:, None]), 0, None)
+
+    def _acumulada(self, filas, meses: np.ndarray) -> np.ndarray:
+        p = self.parametros
+        columna = lambda c: p[c].to_numpy()[filas][:, None]
+        return acumulada_tras(columna("base"), columna("meses_vida"), columna("codigo_metodo"),
+                              columna("coeficiente"), self._meses_en_servicio(filas, meses))
+
+    def _fin(self) -> np.ndarray:
+        """Último mes con dotación de cada activo."""
+        p = self.parametros
+        fin_vida = p["alta"].to_numpy() + np.ceil(p["meses_vida"].to_numpy() - p["fraccion_alta"].to_numpy())
+        return np.minimum(fin_vida, p["baja"].to_numpy())
+
+    def _materializar(self) -> pd.DataFrame:
+        p = self.parametros
+        if p.empty:
+            return pd.DataFrame(columns=["mes", "categoria", "dotacion", "acumulada", "valor_neto", "coste", "bajas"])
+
+        categorias, codigos = np.unique(p["categoria"].to_numpy(), return_inverse=True)
+        inicio = int(p["alta"].min())
+        fin = int(max(self._fin().max(), p["alta"].max(), np.nanmax(np.where(np.isinf(p["baja"]), -1, p["baja"]))))
+        num_meses = fin - inicio + 1
+        num_cat = len(categorias)
+
+        # Dotaciones por bloques de activos ordenados por método, vida y alta: cada
+        # bloque es homogéneo y su ventana de meses, estrecha
+        dotacion = np.zeros((num_cat, num_meses))
+        orden = np.lexsort((p["alta"].to_numpy(), p["meses_vida"].to_numpy(), p["codigo_metodo"].to_numpy()))
+        fin_activo = self._fin()
+        filas_bloque = max(1, CELDAS_POR_BLOQUE // max(num_meses, 1))
+        for desde in range(0, len(orden), filas_bloque):
+            filas = orden[desde:desde + filas_bloque]
+            m0 = int(p["alta"].to_numpy()[filas].min())
+            m1 = int(fin_activo[filas].max())
+            meses = np.arange(m0 - 1, m1 + 1, dtype=float)
+            dotaciones = np.diff(self._acumulada(filas, meses), axis=1)
+            por_categoria = np.zeros((num_cat, len(filas)))
+            por_categoria[codigos[filas], np.arange(len(filas))] = 1.0
+            dotacion[:, m0 - inicio:m1 - inicio + 1] += por_categoria @ dotaciones
+
+        # Altas, bajas y acumulada retirada en cada baja
+        def por_mes_categoria(meses, pesos, mascara):
+            indices = codigos[mascara] * num_meses + (meses[mascara] - inicio).astype(int)
+            return np.bincount(indices, weights=pesos[mascara], minlength=num_cat * num_meses).reshape(num_cat, num_meses)
+
+        alta = p["alta"].to_numpy()
+        baja = p["baja"].to_numpy()
+        con_baja = np.isfinite(baja)
+        todos = np.ones(len(p), dtype=bool)
+        valor = p["valor_adquisicion"].to_numpy()
+        filas_baja = np.flatnonzero(con_baja)
+        acumulada_baja = np.zeros(len(p))
+        if len(filas_baja):
+            acumulada_baja[filas_baja] = self._acumulada(filas_baja, np.array([np.inf]))[:, 0]
+
+        altas = por_mes_categoria(alta, valor, todos)
+        bajas = por_mes_categoria(baja, valor, con_baja)
+        retirada = por_mes_categoria(baja, acumulada_baja, con_baja)
+
+        acumulada = np.cumsum(dotacion - retirada, axis=1)
+        coste = np.cumsum(altas - bajas, axis=1)
+        meses = pd.period_range(pd.Period(year=inicio // 12, month=inicio % 12 + 1, freq="M"), periods=num_meses)
+
+        return pd.DataFrame({
+            "mes": meses[np.tile(np.arange(num_meses), num_cat)],
+            "categoria": np.repeat(categorias, num_meses),
+            "dotacion": dotacion.ravel(),
+            "acumulada": acumulada.ravel(),
+            "valor_neto": (coste - acumulada).ravel(),
+            "coste": coste.ravel(),
+            "bajas": bajas.ravel().astype(float),
+        })
+
+    # --- Consultas ---------------------------------------------------------
+
+    def situacion(self, as_of: Optional[datetime] = None) -> pd.DataFrame:
+        """
+        Situación de cada activo al cierre del mes de as_of: dotación del mes,
+        amortización acumulada y valor neto calculados, y si sigue en servicio.
+        """
+        mes = indice_mes([pd.Timestamp(resolver_as_of(as_of))])
+        filas = np.arange(len(self.parametros))
+        acumuladas = self._acumulada(filas, np.concatenate([mes - 1, mes]))
+        p = self.parametros
+        en_servicio = (p["alta"].to_numpy() <= mes[0]) & (p["baja"].to_numpy() > mes[0])
+        return pd.DataFrame({
+            "id_activo": p["id_activo"],
+            "categoria": p["categoria"],
+            "metodo": p["metodo"],
+            "valor_adquisicion": p["valor_adquisicion"],
+            "dotacion_mes": acumuladas[:, 1] - acumuladas[:, 0],
+            "acumulada_calculada": acumuladas[:, 1],
+            "valor_neto_calculado": np.where(en_servicio, p["valor_adquisicion"] - acumuladas[:, 1], 0.0),
+            "en_servicio": en_servicio,
+            "amortizado": acumuladas[:, 1] >= p["base"].to_numpy() - 0.005,
+        })
+
+    def cuadro(self, ids: Sequence[str]) -> pd.DataFrame:
+        """Cuadro mes a mes de toda la vida útil de los activos indicados (formato largo)."""
+        p = self.parametros
+        filas = np.flatnonzero(p["id_activo"].isin(list(ids)).to_numpy())
+        if not len(filas):
+            return pd.DataFrame(columns=["id_activo", "mes", "dotacion", "acumulada", "valor_neto"])
+        m0 = int(p["alta"].to_numpy()[filas].min())
+        m1 = int(self._fin()[filas].max())
+        meses = np.arange(m0 - 1, m1 + 1, dtype=float)
+        acumuladas = self._acumulada(filas, meses)
+        alta = p["alta"].to_numpy()[filas][:, None]
+        baja = p["baja"].to_numpy()[filas][:, None]
+        fin = self._fin()[filas][:, None]
+        visibles = (meses[None, 1:] >= alta) & (meses[None, 1:] <= fin)
+        filas_rep, columnas = np.nonzero(visibles)
+        en_servicio = meses[1:][columnas] < baja[filas_rep, 0]
+        acumulada = acumuladas[:, 1:][filas_rep, columnas]
+        return pd.DataFrame({
+            "id_activo": p["id_activo"].to_numpy()[filas][filas_rep],
+            "mes": pd.PeriodIndex.from_ordinals((meses[1:][columnas] - 1970 * 12).astype(int), freq="M"),
+            "dotacion": np.diff(acumuladas, axis=1)[filas_rep, columnas],
+            "acumulada": acumulada,
+            "valor_neto": np.where(en_servicio, p["valor_adquisicion"].to_numpy()[filas][filas_rep] - acumulada, 0.0),
+        })
+
+    def por_mes(self, categoria: Optional[str] = None, desde: Optional[str] = None,
+                hasta: Optional[str] = None) -> pd.DataFrame:
+        """Totales mensuales (de todas las categorías o de las que contienen el texto)."""
+        tabla = self.mensual
+        if categoria is not None and categoria != "todos":
+            tabla = tabla[tabla["categoria"].str.contains(categoria, case=False, regex=False)]
+        if desde is not None:
+            tabla = tabla[tabla["mes"] >= pd.Period(desde, freq="M")]
+        if hasta is not None:
+            tabla = tabla[tabla["mes"] <= pd.Period(hasta, freq="M")]
+        return tabla.groupby("mes", sort=True)[["dotacion", "acumulada", "valor_neto", "coste", "bajas"]].sum() \
+            .reset_index()
+
+    def por_anio(self, categoria: Optional[str] = None) -> pd.DataFrame:
+        """Dotación y bajas del año, y acumulada, valor neto y coste al cierre de cada año."""
+        mensual = self.por_mes(categoria)
+        anio = mensual["mes"].dt.year.rename("anio")
+        agrupado = mensual.groupby(anio)
+        tabla = agrupado[["dotacion", "bajas"]].sum()
+        tabla[["acumulada", "valor_neto", "coste"]] = agrupado[["acumulada", "valor_neto", "coste"]].last()
+        return tabla.reset_index()
+
+
+def calendario_amortizacion(store: DataStore = data_store) -> CalendarioAmortizacion:
+    """Calendario de amortización de activos_fijos para la versión actual de los datos."""
+    return store.derivado(
+        "calendario_amortizacion", ["activos_fijos"],
+        lambda: CalendarioAmortizacion(store.get("activos_fijos"))
+    )
@@ -0,0 +1,110 @@
+"""
+Motor de aging de cuentas por cobrar.
+
+Clasifica las facturas abiertas (pendientes y vencidas) en tramos de
+antigüedad con np.searchsorted sobre los días desde el vencimiento. Trabaja
+sobre la distribución de importes por fecha de vencimiento que mantiene la
+capa de datos (una fila por fecha, no por factura), así que el coste no
+depende del número de facturas y cualquier fecha de corte o juego de tramos
+se calcula al momento.
+"""
+
+from datetime import datetime
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from datastore import DataStore, data_store, resolver_as_of, vencimientos_abiertos
+
+# Límites superiores (en días) de cada tramo salvo el último: <=0, 1-30, 31-60, 61-90, >90
+LIMITES_AGING: Tuple[int, ...] = (0, 30, 60, 90)
+
+
+def nombres_tramos(limites: Sequence[int] = LIMITES_AGING) -> Tuple[List[str], List[str]]:
+    """
+    Claves y etiquetas de los tramos definidos por unos límites.
+    Con los límites por defecto: no_vencido / 1-30_dias / ... / mas_90_dias
+    y No vencido / 1-30 días / ... / >90 días.
+    """
+    primero = limites[0]
+    claves = ["no_vencido" if primero == 0 else f"hasta_{primero}_dias"]
+    etiquetas = ["No vencido" if primero == 0 else f"≤{primero} días"]
+    for inferior, superior in zip(limites, limites[1:]):
+        claves.append(f"{inferior + 1}-{superior}_dias")
+        etiquetas.append(f"{inferior + 1}-{superior} días")
+    claves.append(f"mas_{limites[-1]}_dias")
+    etiquetas.append(f">{limites[-1]} días")
+    return claves, etiquetas
+
+
+def dias_desde(fechas, as_of: datetime) -> np.ndarray:
+    """Días completos transcurridos desde cada fecha hasta as_of (NaN si no hay fecha)."""
+    dias = (pd.Timestamp(as_of) - pd.DatetimeIndex(fechas)).days
+    return np.asarray(dias, dtype=float)
+
+
+def clasificar_tramos(dias: np.ndarray, limites: Sequence[int] = LIMITES_AGING) -> np.ndarray:
+    """
+    Índice de tramo de cada antigüedad: 0 si dias <= limites[0], i si
+    limites[i-1] < dias <= limites[i], len(limites) por encima del último.
+    Los NaN (sin fecha de vencimiento) caen en el último tramo.
+    """
+    return np.searchsorted(np.asarray(limites, dtype=float), np.asarray(dias, dtype=float), side="left")
+
+
+class InformeAging:
+    """
+    Resultado del aging: una fila por tramo (en orden) con importe y número
+    de facturas, más los totales.
+
+    Attributes:
+        tabla: DataFrame con tramo, etiqueta, importe y num_facturas
+        as_of: Fecha de referencia usada
+        limites: Límites de los tramos
+    """
+
+    def __init__(self, tabla: pd.DataFrame, as_of: datetime, limites: Sequence[int]):
+        self.tabla = tabla
+        self.as_of = as_of
+        self.limites = tuple(limites)
+        self.total_importe = float(tabla["importe"].sum())
+        self.total_facturas = int(tabla["num_facturas"].sum())
+
+    def presentes(self) -> pd.DataFrame:
+        """Solo los tramos con alguna factura."""
+        return self.tabla[self.tabla["num_facturas"] > 0].reset_index(drop=True)
+
+
+def aging_de(vencimientos: pd.DataFrame, as_of: Optional[datetime] = None,
+             limites: Sequence[int] = LIMITES_AGING) -> InformeAging:
+    """
+    Aging a partir de una distribución por vencimiento (fecha_vencimiento,
+    importe y, opcionalmente, num_facturas por fila).
+    """
+    as_of = resolver_as_of(as_of)
+    claves, etiquetas = nombres_tramos(limites)
+    tramos = clasificar_tramos(dias_desde(vencimientos["fecha_vencimiento"], as_of), limites)
+    cuentas = vencimientos["num_facturas"] if "num_facturas" in vencimientos else np.ones(len(vencimientos))
+
+    tabla = pd.DataFrame({
+        "tramo": claves,
+        "etiqueta": etiquetas,
+        "importe": np.bincount(tramos, weights=vencimientos["importe"].to_numpy(dtype=float), minlength=len(claves)),
+        "num_facturas": np.bincount(tramos, weights=np.asarray(cuentas, dtype=float), minlength=len(claves)).astype(int)
+    })
+    return InformeAging(tabla, as_of, limites)
+
+
+def calcular_aging(as_of: Optional[datetime] = None, limites: Sequence[int] = LIMITES_AGING,
+                   store: DataStore = data_store) -> InformeAging:
+    """
+    Aging de las facturas abiertas a fecha as_of (por defecto, ahora).
+
+    Args:
+        as_of: Fecha de referencia para la antigüedad
+        limites: Límites superiores de los tramos, en días, crecientes
+    """
+    if not limites or list(limites) != sorted(limites):
+        raise ValueError(f"Los límites de aging deben ser crecientes: {limites}")
+    return aging_de(vencimientos_abiertos(store), as_of, limites)
@@ -0,0 +1,191 @@
+"""
+Motor de desviaciones presupuestarias (precio / volumen / mix).
+
+Los reales se construyen por residencia × mes: ingresos y número de
+facturas desde el cubo de KPIs (las facturas ya reducidas una vez por
+versión de datos) y gastos fijos repartidos por capacidad. Se cruzan con
+presupuesto.csv (plazas, precio y gastos por residencia y mes) en una tabla
+de celdas memoizada, y cualquier nivel de agregación, del total a una sola
+residencia-mes, sale de una única suma agrupada sobre esas celdas.
+
+Descomposición de la desviación de ingresos de un grupo de celdas
+(q = facturas, p = precio medio, _r real, _p presupuesto, P = precio medio
+presupuestado del grupo):
+
+- Precio:  Σ q_r · (p_r − p_p)
+- Mix:     Σ q_r · p_p − Q_r · P
+- Volumen: (Q_r − Q_p) · P
+
+y precio + mix + volumen = ingresos reales − ingresos presupuestados.
+"""
+
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from datastore import DataStore, MemoAcotada, data_store
+
+from .kpis import cubo_kpis
+from .tesoreria import MESES_PERIODICIDAD
+
+NIVELES_DESVIACION = ("total", "residencia", "mes", "celda")
+
+# Agregados memoizados por cubo (nivel, residencias y meses son argumentos libres)
+MAX_AGREGADOS = 32
+
+# Umbrales (%) del semáforo de desviaciones: verde, amarillo y rojo a partir del segundo
+UMBRALES_DESVIACION = (5.0, 10.0)
+
+COLUMNAS_DESVIACION = [
+    "facturas_real", "facturas_ppto", "ingresos_real", "ingresos_ppto",
+    "desv_precio", "desv_volumen", "desv_mix", "desv_ingresos",
+    "gastos_real", "gastos_ppto", "desv_gastos", "desv_resultado",
+]
+
+
+def gastos_por_mes(gastos: pd.DataFrame, meses: pd.PeriodIndex) -> np.ndarray:
+    """Gastos fijos devengados en cada mes según la periodicidad de cada gasto."""
+    if gastos.empty or len(meses) == 0:
+        return np.zeros(len(meses))
+    periodicidad = gastos["periodicidad"].astype(str).str.lower().str.strip() if "periodicidad" in gastos \
+        else pd.Series("mensual", index=gastos.index)
+    numero_mes = np.asarray(meses.month)
+    total = np.zeros(len(meses))
+    for importe, p in zip(gastos["importe_mensual"].to_numpy(dtype=float), periodicidad):
+        total += np.where(np.isin(numero_mes, MESES_PERIODICIDAD.get(p, MESES_PERIODICIDAD["mensual"])), importe, 0.0)
+    return total
+
+
+def semaforo(pct: float) -> str:
+    """Icono del semáforo según el valor absoluto de la desviación (%)."""
+    verde, amarillo = UMBRALES_DESVIACION
+    return "🟢" if abs(pct) < verde else "🟡" if abs(pct) < amarillo else "🔴"
+
+
+class CuboDesviaciones:
+    """
+    Reales y presupuesto por (residencia, mes).
+
+    Attributes:
+        celdas: Una fila por residencia-mes con facturas, ingresos y gastos
+            reales y presupuestados e ingresos estándar (facturas reales a
+            precio presupuestado)
+        residencias: Nombres de las residencias presentes
+    """
+
+    def __init__(self, celdas_kpis: pd.DataFrame, ocupacion: pd.DataFrame, gastos: pd.DataFrame,
+                 presupuesto: pd.DataFrame):
+        real = celdas_kpis[["num_facturas", "facturado"]].rename(
+            columns={"num_facturas": "facturas_real", "facturado": "ingresos_real"})
+        real.index = real.index.set_levels(real.index.levels[0].astype(str), level=0)
+
+        ppto = pd.DataFrame({
+            "facturas_ppto": presupuesto["plazas"].to_numpy(dtype=float),
+            "precio_ppto": presupuesto["precio"].to_numpy(dtype=float),
+            "gastos_ppto": presupuesto["gastos"].to_numpy(dtype=float) if "gastos" in presupuesto else 0.0,
+        }, index=pd.MultiIndex.from_arrays([presupuesto["residencia"].astype(str).to_numpy(),
+                                            pd.PeriodIndex(presupuesto["mes"].astype(str), freq="M")],
+                                           names=["residencia", "mes"]))
+        ppto = ppto.groupby(level=["residencia", "mes"]).agg(
+            {"facturas_ppto": "sum", "precio_ppto": "mean", "gastos_ppto": "sum"})
+
+        celdas = real.join(ppto, how="outer").fillna(0.0)
+        celdas["ingresos_ppto"] = celdas["facturas_ppto"] * celdas["precio_ppto"]
+        celdas["ingresos_estandar"] = celdas["facturas_real"] * celdas["precio_ppto"]
+
+        # Gastos reales: gastos fijos del mes repartidos por capacidad
+        residencia = celdas.index.get_level_values("residencia")
+        mes = pd.PeriodIndex(celdas.index.get_level_values("mes"), freq="M")
+        capacidad = ocupacion.assign(residencia=ocupacion["residencia"].astype(str)).set_index("residencia")["capacidad"]
+        capacidad = capacidad.reindex(residencia).fillna(0).to_numpy(dtype=float)
+        total_capacidad = float(ocupacion["capacidad"].sum())
+        reparto = capacidad / total_capacidad if total_capacidad > 0 else np.zeros(len(capacidad))
+        celdas["gastos_real"] = gastos_por_mes(gastos, mes) * reparto
+
+        self.celdas = celdas
+        self._residencia = np.asarray(residencia, dtype=object)
+        self._mes = mes
+        self.residencias = sorted(pd.unique(self._residencia))
+        self._agregados = MemoAcotada(MAX_AGREGADOS)
+
+    def residencias_coincidentes(self, patron: str):
+        """Residencias cuyo nombre contiene el patrón (sin distinguir mayúsculas)."""
+        patron = patron.lower()
+        return [r for r in self.residencias if patron in r.lower()]
+
+    def _mascara(self, residencias: Optional[Sequence[str]] = None, desde: Optional[str] = None,
+                 hasta: Optional[str] = None) -> np.ndarray:
+        mascara = np.ones(len(self.celdas), dtype=bool)
+        if residencias is not None:
+            mascara &= np.isin(self._residencia, list(residencias))
+        if desde:
+            mascara &= np.asarray(self._mes >= pd.Period(desde, freq="M"))
+        if hasta:
+            mascara &= np.asarray(self._mes <= pd.Period(hasta, freq="M"))
+        return mascara
+
+    def desviaciones(self, nivel: str = "total", residencia: Optional[str] = None, desde: Optional[str] = None,
+                     hasta: Optional[str] = None) -> pd.DataFrame:
+        """
+        Desviaciones de ingresos (precio, volumen, mix), gastos y resultado.
+
+        Args:
+            nivel: total, residencia, mes o celda (residencia-mes)
+            residencia: Nombre (o parte) de la residencia
+            desde / hasta: Meses incluidos (YYYY-MM)
+
+        Returns:
+            Una fila por grupo del nivel con COLUMNAS_DESVIACION (copia
+            superficial de la tabla memoizada)
+        """
+        if nivel not in NIVELES_DESVIACION:
+            raise ValueError(f"Nivel no válido: {nivel}. Opciones: {', '.join(NIVELES_DESVIACION)}")
+        # La clave usa las residencias y meses resueltos, no el texto recibido
+        residencias = None if residencia is None or residencia == "todas" \
+            else tuple(self.residencias_coincidentes(residencia))
+        desde = str(pd.Period(desde, freq="M")) if desde else None
+        hasta = str(pd.Period(hasta, freq="M")) if hasta else None
+        clave = (nivel, residencias, desde, hasta)
+        tabla = self._agregados.obtener(clave, lambda: self._agregar(nivel, residencias, desde, hasta))
+        return tabla.copy(deep=False)
+
+    def _agregar(self, nivel: str, residencias: Optional[Sequence[str]], desde: Optional[str],
+                 hasta: Optional[str]) -> pd.DataFrame:
+        celdas = self.celdas[self._mascara(residencias, desde, hasta)]
+        if nivel == "total":
+            sumas = celdas.sum().to_frame("total").T
+            sumas.index.name = "nivel"
+        elif nivel == "celda":
+            sumas = celdas
+        else:
+            sumas = celdas.groupby(level=nivel).sum()
+
+        precio_medio_ppto = np.divide(sumas["ingresos_ppto"], sumas["facturas_ppto"],
+                                      out=np.zeros(len(sumas)), where=sumas["facturas_ppto"].to_numpy() != 0)
+        tabla = sumas[["facturas_real", "facturas_ppto", "ingresos_real", "ingresos_ppto"]].assign(
+            desv_precio=sumas["ingresos_real"] - sumas["ingresos_estandar"],
+            desv_volumen=(sumas["facturas_real"] - sumas["facturas_ppto"]) * precio_medio_ppto,
+            desv_mix=sumas["ingresos_estandar"] - sumas["facturas_real"] * precio_medio_ppto,
+            desv_ingresos=sumas["ingresos_real"] - sumas["ingresos_ppto"],
+            gastos_real=sumas["gastos_real"],
+            gastos_ppto=sumas["gastos_ppto"],
+            desv_gastos=sumas["gastos_real"] - sumas["gastos_ppto"],
+        )
+        tabla["desv_resultado"] = tabla["desv_ingresos"] - tabla["desv_gastos"]
+        return tabla[COLUMNAS_DESVIACION]
+
+
+def cubo_desviaciones(store: DataStore = data_store) -> CuboDesviaciones:
+    """Cubo de reales y presupuesto para la versión actual de los datos."""
+    return store.derivado(
+        "cubo_desviaciones", ["facturas_emitidas", "ocupacion", "gastos_fijos", "presupuesto"],
+        lambda: CuboDesviaciones(cubo_kpis(store).celdas, store.get("ocupacion"), store.get("gastos_fijos"),
+                                 store.get("presupuesto"))
+    )
+
+
+def calcular_desviaciones(nivel: str = "total", residencia: Optional[str] = None, desde: Optional[str] = None,
+                          hasta: Optional[str] = None, store: DataStore = data_store) -> pd.DataFrame:
+    """Desviaciones presupuestarias (ver CuboDesviaciones.desviaciones)."""
+    return cubo_desviaciones(store).desviaciones(nivel, residencia, desde, hasta)
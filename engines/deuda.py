@@ -0,0 +1,183 @@
+"""
+Motor de deuda bancaria: cuadros de amortización y sensibilidad al Euribor.
+
+Construye de una vez los cuadros de amortización (sistema francés) de todos
+los préstamos como matrices préstamos × meses a partir del capital, el tipo
+y el vencimiento, y reprecia los préstamos variables bajo una rejilla de
+shocks del Euribor con fórmulas cerradas vectorizadas (sin bucles por
+préstamo). Los resultados se memoizan por versión de datos.
+
+La curva del Euribor la aporta quien llama (web_tools.DATOS_MERCADO en las
+herramientas), para no acoplar el motor a la capa de agentes.
+"""
+
+from datetime import datetime
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from datastore import MAX_DIAS_MEMO, DataStore, MemoAcotada, data_store, resolver_as_of
+
+# Plazo del Euribor al que se referencian los préstamos variables
+INDICE_REFERENCIA = "12_meses"
+CHOQUES_EURIBOR_PB: Tuple[int, ...] = (-100, -50, 0, 50, 100, 200, 300)
+
+# Rejillas de Euribor memoizadas por cuadro (los choques los elige quien llama)
+MAX_REJILLAS_EURIBOR = 8
+
+
+def meses_restantes(vencimientos: pd.Series, as_of: datetime) -> np.ndarray:
+    """Meses de cuota que quedan hasta cada vencimiento (0 si ya venció)."""
+    hoy = pd.Timestamp(as_of)
+    fechas = pd.DatetimeIndex(vencimientos)
+    meses = (fechas.year - hoy.year) * 12 + (fechas.month - hoy.month) + (fechas.day > hoy.day)
+    return np.clip(np.asarray(meses.fillna(0), dtype=int), 0, None)
+
+
+def cuota_francesa(capital, tipo_anual, meses) -> np.ndarray:
+    """Cuota mensual constante (sistema francés); admite arrays con broadcasting."""
+    capital, r, n = np.broadcast_arrays(np.asarray(capital, dtype=float),
+                                        np.asarray(tipo_anual, dtype=float) / 1200, np.asarray(meses, dtype=float))
+    cuota = np.divide(capital, n, out=np.zeros_like(capital), where=n > 0)
+    con_interes = (r != 0) & (n > 0)
+    factor = np.power(1 + r, -n, where=con_interes, out=np.ones_like(r))
+    np.divide(capital * r, 1 - factor, out=cuota, where=con_interes)
+    return cuota
+
+
+def saldo_tras(capital, tipo_anual, meses, k) -> np.ndarray:
+    """Capital pendiente tras pagar k cuotas francesas (k se recorta a [0, meses])."""
+    capital, r, n, k = np.broadcast_arrays(np.asarray(capital, dtype=float), np.asarray(tipo_anual, dtype=float) / 1200,
+                                           np.asarray(meses, dtype=float), np.asarray(k, dtype=float))
+    k = np.clip(k, 0, n)
+    lineal = capital * np.divide(n - k, n, out=np.zeros_like(capital), where=n > 0)
+    con_interes = (r != 0) & (n > 0)
+    crece_n = np.power(1 + r, n, where=con_interes, out=np.ones_like(r))
+    crece_k = np.power(1 + r, k, where=con_interes, out=np.ones_like(r))
+    return np.where(con_interes, capital * np.divide(crece_n - crece_k, crece_n - 1, out=np.zeros_like(capital),
+                                                     where=con_interes), lineal)
+
+
+class CuadroAmortizacion:
+    """
+    Cuadros de amortización de todos los préstamos (matrices préstamos × meses).
+
+    Attributes:
+        prestamos: deuda_bancaria con meses_restantes, cuota_calculada,
+            intereses_pendientes y variable
+        modalidad_informada: Si deuda_bancaria trae la columna modalidad; si
+            no, la clasificación fijo/variable es un supuesto (ver prestamos_variables)
+        saldo / intereses / amortizacion / cuota: Matrices préstamos × meses
+        fechas: Fecha de cada columna (mes de pago)
+    """
+
+    def __init__(self, deuda: pd.DataFrame, as_of: datetime):
+        self.as_of = pd.Timestamp(as_of).normalize()
+        capital = deuda["capital_pendiente"].to_numpy(dtype=float)
+        tipo = deuda["tipo_interes"].to_numpy(dtype=float)
+        n = meses_restantes(deuda["fecha_vencimiento"], self.as_of)
+        cuota = cuota_francesa(capital, tipo, n)
+
+        k = np.arange(int(n.max()) + 1 if len(n) else 1)
+        saldos = saldo_tras(capital[:, None], tipo[:, None], n[:, None], k[None, :])
+        vivo = k[None, 1:] <= n[:, None]
+        self.saldo = saldos[:, 1:]
+        self.intereses = np.where(vivo, saldos[:, :-1] * tipo[:, None] / 1200, 0.0)
+        self.amortizacion = saldos[:, :-1] - saldos[:, 1:]
+        self.cuota = self.intereses + self.amortizacion
+        self.fechas = pd.date_range(self.as_of + pd.offsets.MonthBegin(1), periods=len(k) - 1, freq="MS")
+
+        self.prestamos = deuda.assign(
+            meses_restantes=n,
+            cuota_calculada=cuota,
+            intereses_pendientes=self.intereses.sum(axis=1),
+            variable=prestamos_variables(deuda)
+        )
+        self.modalidad_informada = "modalidad" in deuda
+        self._capital, self._tipo, self._n = capital, tipo, n
+        self._rejillas = MemoAcotada(MAX_REJILLAS_EURIBOR)
+
+    def por_mes(self) -> pd.DataFrame:
+        """Cuota, intereses, amortización y saldo agregados de todos los préstamos por mes."""
+        return pd.DataFrame({
+            "fecha": self.fechas,
+            "cuota": self.cuota.sum(axis=0),
+            "intereses": self.intereses.sum(axis=0),
+            "amortizacion": self.amortizacion.sum(axis=0),
+            "saldo": self.saldo.sum(axis=0),
+        })
+
+    def conciliacion_cuota(self) -> Dict[str, float]:
+        """
+        Cuota mensual contractual (deuda_bancaria.csv) frente a la recalculada
+        con el sistema francés (capital pendiente, tipo y meses hasta el
+        vencimiento), que es la base de la rejilla del Euribor.
+        """
+        contractual = float(self.prestamos["cuota_mensual"].sum())
+        calculada = float(self.prestamos["cuota_calculada"].sum())
+        return {"cuota_contractual": contractual, "cuota_calculada": calculada,
+                "diferencia": calculada - contractual}
+
+    def rejilla_euribor(self, curva: Dict[str, float], choques_pb: Sequence[int] = CHOQUES_EURIBOR_PB,
+                        indice: str = INDICE_REFERENCIA, meses_anuales: int = 12) -> pd.DataFrame:
+        """
+        Reprecia los préstamos variables bajo cada shock del Euribor (puntos
+        básicos). El diferencial de cada préstamo se mantiene: tipo nuevo =
+        max(tipo actual + shock, 0). Los fijos no cambian. Se memoizan las
+        MAX_REJILLAS_EURIBOR últimas combinaciones de argumentos.
+
+        Returns:
+            Una fila por shock con euribor, cuota mensual total, variación frente
+            a la cuota recalculada actual e intereses de los próximos 12 meses y hasta el vencimiento
+        """
+        clave = (tuple(sorted(curva.items(), key=str)), tuple(int(c) for c in choques_pb), indice, meses_anuales)
+        return self._rejillas.obtener(clave, lambda: self._rejilla(curva, clave[1], indice, meses_anuales))
+
+    def _rejilla(self, curva: Dict[str, float], choques_pb: Sequence[int], indice: str,
+                 meses_anuales: int) -> pd.DataFrame:
+        choques = np.asarray(choques_pb, dtype=float)
+        variable = self.prestamos["variable"].to_numpy()
+        tipos = np.where(variable[None, :], np.maximum(self._tipo[None, :] + choques[:, None] / 100, 0.0),
+                         self._tipo[None, :])
+
+        cuotas = cuota_francesa(self._capital[None, :], tipos, self._n[None, :])
+        pagadas = np.minimum(meses_anuales, self._n)[None, :]
+        intereses_anio = cuotas * pagadas - (self._capital[None, :] -
+                                             saldo_tras(self._capital[None, :], tipos, self._n[None, :], pagadas))
+        intereses_total = cuotas * self._n[None, :] - self._capital[None, :]
+        base = self.prestamos["cuota_calculada"].to_numpy()
+
+        return pd.DataFrame({
+            "choque_pb": choques.astype(int),
+            "euribor": curva[indice] + choques / 100,
+            "cuota_mensual": cuotas.sum(axis=1),
+            "variacion_cuota": (cuotas - base[None, :]).sum(axis=1),
+            "intereses_12m": intereses_anio.sum(axis=1),
+            "intereses_hasta_vencimiento": intereses_total.sum(axis=1),
+        })
+
+
+def prestamos_variables(deuda: pd.DataFrame) -> np.ndarray:
+    """
+    Préstamos referenciados al Euribor. Se usa la columna modalidad si existe
+    (fijo/variable); si no, se supone que todos son variables salvo que el
+    tipo diga "fijo" (con los datos de ejemplo, todos: es el caso más prudente
+    para la sensibilidad a tipos).
+    """
+    if "modalidad" in deuda:
+        return ~deuda["modalidad"].astype(str).str.lower().str.contains("fij").to_numpy()
+    return ~deuda["tipo"].astype(str).str.lower().str.contains("fij").to_numpy()
+
+
+def cuadro_amortizacion(as_of: Optional[datetime] = None, store: DataStore = data_store) -> CuadroAmortizacion:
+    """Cuadros de amortización a fecha as_of (memoizados por versión de datos y día, los MAX_DIAS_MEMO últimos)."""
+    as_of = pd.Timestamp(resolver_as_of(as_of)).normalize()
+    cuadros = store.derivado("cuadros_amortizacion", ["deuda_bancaria"], lambda: MemoAcotada(MAX_DIAS_MEMO))
+    return cuadros.obtener(as_of, lambda: CuadroAmortizacion(store.get("deuda_bancaria"), as_of))
+
+
+def rejilla_euribor(curva: Dict[str, float], choques_pb: Sequence[int] = CHOQUES_EURIBOR_PB,
+                    as_of: Optional[datetime] = None, store: DataStore = data_store) -> pd.DataFrame:
+    """Rejilla de shocks del Euribor sobre los cuadros vigentes (ver CuadroAmortizacion.rejilla_euribor)."""
+    return cuadro_amortizacion(as_of, store).rejilla_euribor(curva, choques_pb)
@@ -0,0 +1,212 @@
+"""
+Motor de escenarios what-if para FP&A (precio × ocupación × morosidad).
+
+Evalúa una rejilla de variaciones de precio, tasas de ocupación y supuestos
+de morosidad sobre cada residencia (capacidad y precio_medio de
+ocupacion.csv) y devuelve ingresos, EBITDA y caja anuales de cada celda. Los
+ingresos son separables (capacidad × ocupación × precio × (1 + variación)),
+así que la rejilla completa es un producto exterior de NumPy: decenas de
+miles de celdas se calculan en milisegundos.
+"""
+
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from datastore import DataStore, MemoAcotada, data_store
+
+from .kpis import calcular_kpis
+from .tesoreria import gastos_fijos_anuales
+
+# Supuestos del modelo
+SUPUESTOS_ESCENARIOS: Dict[str, float] = {
+    "meses": 12,                    # Horizonte anual
+    "coste_variable_plaza": 0.0,    # € por plaza ocupada y mes (suministros, limpieza...)
+}
+
+# Ejes por defecto (21 × 21 × 21 = 9.261 celdas)
+VARIACIONES_PRECIO = tuple(np.arange(-10, 11, 1.0))      # % sobre precio_medio
+OCUPACIONES = tuple(np.arange(80, 101, 1.0))             # % de plazas ocupadas
+MOROSIDADES = tuple(np.arange(0, 10.5, 0.5))             # % de ingresos no cobrados
+
+# Rejillas memoizadas por versión de datos (cada combinación de ejes es una entrada)
+MAX_REJILLAS = 4
+
+COLUMNAS_CELDA = ["variacion_precio", "ocupacion", "morosidad", "ingresos", "ebitda", "caja",
+                  "delta_ingresos", "delta_ebitda", "delta_caja"]
+
+
+def rango(desde: float, hasta: float, paso: float) -> tuple:
+    """Valores de desde a hasta (incluido) con el paso dado."""
+    if paso <= 0:
+        raise ValueError(f"El paso debe ser positivo: {paso}")
+    return tuple(np.round(np.arange(desde, hasta + paso / 2, paso), 6))
+
+
+class BaseEscenarios:
+    """
+    Datos de partida de los escenarios: capacidad, ocupación actual y precio
+    por residencia, gastos fijos repartidos por capacidad, servicio de la
+    deuda y morosidad actual.
+    """
+
+    def __init__(self, ocupacion: pd.DataFrame, gastos: pd.DataFrame, deuda: pd.DataFrame,
+                 morosidad_actual: float):
+        self.residencias = ocupacion["residencia"].astype(str).to_numpy()
+        self.capacidad = ocupacion["capacidad"].to_numpy(dtype=float)
+        self.ocupacion_actual = ocupacion["ocupacion_actual"].to_numpy(dtype=float)
+        self.precio = ocupacion["precio_medio"].to_numpy(dtype=float)
+        total_capacidad = self.capacidad.sum()
+        reparto = self.capacidad / total_capacidad if total_capacidad > 0 else np.zeros(len(self.capacidad))
+        self.gastos_fijos = gastos_fijos_anuales(gastos) * reparto
+        self.servicio_deuda = float(deuda["cuota_mensual"].sum()) * 12 if not deuda.empty else 0.0
+        self.morosidad_actual = morosidad_actual
+
+    def seleccion(self, residencia: Optional[str]) -> np.ndarray:
+        """Máscara de las residencias cuyo nombre contiene el texto (todas si no se indica)."""
+        if residencia is None or residencia == "todas":
+            return np.ones(len(self.residencias), dtype=bool)
+        return np.char.find(np.char.lower(self.residencias.astype(str)), residencia.lower()) >= 0
+
+
+def base_escenarios(store: DataStore = data_store) -> BaseEscenarios:
+    """Datos de partida para la versión actual de los datos."""
+    def construir():
+        kpis = calcular_kpis(store=store).set_index("kpi")
+        return BaseEscenarios(store.get("ocupacion"), store.get("gastos_fijos"), store.get("deuda_bancaria"),
+                              float(kpis.loc["morosidad", "valor"]))
+    return store.derivado(
+        "base_escenarios", ["ocupacion", "gastos_fijos", "deuda_bancaria", "facturas_emitidas", "cuenta_resultados"],
+        construir
+    )
+
+
+class RejillaEscenarios:
+    """
+    Rejilla de escenarios (residencias × precio × ocupación × morosidad).
+
+    Attributes:
+        ingresos / ebitda / caja: Totales de las residencias seleccionadas,
+            arrays precio × ocupación × morosidad
+        actual: Ingresos, EBITDA y caja con la ocupación, precios y morosidad actuales
+    """
+
+    def __init__(self, base: BaseEscenarios, variaciones_precio: Sequence[float] = VARIACIONES_PRECIO,
+                 ocupaciones: Sequence[float] = OCUPACIONES, morosidades: Sequence[float] = MOROSIDADES,
+                 residencia: Optional[str] = None, supuestos: Optional[Dict[str, float]] = None):
+        self.supuestos = {**SUPUESTOS_ESCENARIOS, **(supuestos or {})}
+        # Ejes ordenados y sin repetidos
+        self.variaciones_precio = np.unique(np.asarray(variaciones_precio, dtype=float))
+        self.ocupaciones = np.unique(np.asarray(ocupaciones, dtype=float))
+        self.morosidades = np.unique(np.asarray(morosidades, dtype=float))
+        seleccion = base.seleccion(residencia)
+        if not seleccion.any():
+            raise ValueError(f"No hay residencias que coincidan con '{residencia}'")
+        self.residencias = base.residencias[seleccion]
+
+        meses = self.supuestos["meses"]
+        self._capacidad = base.capacidad[seleccion]
+        self._ingreso_pleno = self._capacidad * base.precio[seleccion] * meses
+        self._gastos = base.gastos_fijos[seleccion]
+        self._coste_plaza = self.supuestos["coste_variable_plaza"] * meses
+        # El servicio de la deuda se asigna en la misma proporción que los gastos fijos
+        proporcion = self._gastos.sum() / base.gastos_fijos.sum() if base.gastos_fijos.sum() > 0 \
+            else seleccion.mean()
+        self._servicio_deuda = base.servicio_deuda * proporcion
+
+        precio = 1 + self.variaciones_precio / 100
+        ocupacion = self.ocupaciones / 100
+        cobrado = 1 - self.morosidades / 100
+        ingresos_po = self._ingreso_pleno.sum() * np.outer(precio, ocupacion)
+        costes_o = self._gastos.sum() + self._coste_plaza * self._capacidad.sum() * ocupacion
+
+        # Los ingresos no dependen de la morosidad: vista de solo lectura, sin copiar el eje
+        self.ingresos = np.broadcast_to(ingresos_po[:, :, None], self.forma)
+        self.ebitda = ingresos_po[:, :, None] * cobrado[None, None, :] - costes_o[None, :, None]
+        self.caja = self.ebitda - self._servicio_deuda
+
+        ocupadas = base.ocupacion_actual[seleccion]
+        ingresos_actuales = float((ocupadas * base.precio[seleccion]).sum() * meses)
+        ebitda_actual = float(ingresos_actuales * (1 - base.morosidad_actual / 100) - self._gastos.sum() -
+                              self._coste_plaza * ocupadas.sum())
+        self.actual = {
+            "ocupacion": float(ocupadas.sum() / self._capacidad.sum() * 100) if self._capacidad.sum() > 0 else 0.0,
+            "morosidad": base.morosidad_actual,
+            "ingresos": ingresos_actuales,
+            "ebitda": ebitda_actual,
+            "caja": ebitda_actual - self._servicio_deuda,
+        }
+
+    @property
+    def forma(self) -> tuple:
+        return len(self.variaciones_precio), len(self.ocupaciones), len(self.morosidades)
+
+    @property
+    def num_celdas(self) -> int:
+        return int(np.prod(self.forma))
+
+    def tabla(self) -> pd.DataFrame:
+        """Una fila por celda con ingresos, EBITDA, caja y su diferencia con la situación actual."""
+        p, o, m = np.meshgrid(self.variaciones_precio, self.ocupaciones, self.morosidades, indexing="ij")
+        tabla = pd.DataFrame({
+            "variacion_precio": p.ravel(), "ocupacion": o.ravel(), "morosidad": m.ravel(),
+            "ingresos": self.ingresos.ravel(), "ebitda": self.ebitda.ravel(), "caja": self.caja.ravel(),
+        })
+        for medida in ("ingresos", "ebitda", "caja"):
+            tabla[f"delta_{medida}"] = tabla[medida] - self.actual[medida]
+        return tabla[COLUMNAS_CELDA]
+
+    def por_residencia(self, variacion_precio: float, ocupacion: float, morosidad: float) -> pd.DataFrame:
+        """Desglose por residencia de un escenario concreto."""
+        ocupadas = self._capacidad * ocupacion / 100
+        ingresos = self._ingreso_pleno * (1 + variacion_precio / 100) * ocupacion / 100
+        ebitda = ingresos * (1 - morosidad / 100) - self._gastos - self._coste_plaza * ocupadas
+        return pd.DataFrame({"residencia": self.residencias, "plazas_ocupadas": ocupadas,
+                             "ingresos": ingresos, "ebitda": ebitda})
+
+    def _indice(self, eje: np.ndarray, valor: float) -> int:
+        return int(np.abs(eje - valor).argmin())
+
+    def celda(self, variacion_precio: float, ocupacion: float, morosidad: float) -> dict:
+        """Resultados de la celda más próxima a los valores dados."""
+        i = self._indice(self.variaciones_precio, variacion_precio)
+        j = self._indice(self.ocupaciones, ocupacion)
+        k = self._indice(self.morosidades, morosidad)
+        valores = {"ingresos": self.ingresos[i, j, k], "ebitda": self.ebitda[i, j, k], "caja": self.caja[i, j, k]}
+        return {
+            "variacion_precio": float(self.variaciones_precio[i]), "ocupacion": float(self.ocupaciones[j]),
+            "morosidad": float(self.morosidades[k]),
+            **{m: float(v) for m, v in valores.items()},
+            **{f"delta_{m}": float(v - self.actual[m]) for m, v in valores.items()},
+        }
+
+    def corte(self, morosidad: float, medida: str = "ebitda") -> pd.DataFrame:
+        """Matriz precio (filas) × ocupación (columnas) de una medida para una morosidad."""
+        k = self._indice(self.morosidades, morosidad)
+        return pd.DataFrame(getattr(self, medida)[:, :, k], index=pd.Index(self.variaciones_precio, name="variacion_precio"),
+                            columns=pd.Index(self.ocupaciones, name="ocupacion"))
+
+    def equilibrio(self, medida: str = "caja") -> pd.DataFrame:
+        """Ocupación mínima de la rejilla con la medida >= 0 por variación de precio y morosidad (NaN si ninguna)."""
+        positiva = getattr(self, medida) >= 0
+        alguna = positiva.any(axis=1)
+        primera = self.ocupaciones[positiva.argmax(axis=1)]
+        return pd.DataFrame(np.where(alguna, primera, np.nan),
+                            index=pd.Index(self.variaciones_precio, name="variacion_precio"),
+                            columns=pd.Index(self.morosidades, name="morosidad"))
+
+
+def escenarios_fpa(variaciones_precio: Sequence[float] = VARIACIONES_PRECIO, ocupaciones: Sequence[float] = OCUPACIONES,
+                   morosidades: Sequence[float] = MOROSIDADES, residencia: Optional[str] = None,
+                   store: DataStore = data_store) -> RejillaEscenarios:
+    """
+    Rejilla de escenarios sobre los datos actuales. Se memoizan las
+    MAX_REJILLAS últimas combinaciones de ejes por versión de datos.
+    """
+    clave = (tuple(variaciones_precio), tuple(ocupaciones), tuple(morosidades), residencia or "todas")
+    rejillas = store.derivado(
+        "rejillas_escenarios", ["ocupacion", "gastos_fijos", "deuda_bancaria", "facturas_emitidas", "cuenta_resultados"],
+        lambda: MemoAcotada(MAX_REJILLAS)
+    )
+    return rejillas.obtener(clave, lambda: RejillaEscenarios(base_escenarios(store), *clave[:3], residencia=residencia))
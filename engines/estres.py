@@ -0,0 +1,306 @@
+"""
+Test de estrés de liquidez por Monte Carlo.
+
+Sobre la proyección diaria de tesorería simula miles de escenarios con:
+- retrasos de pago por estudiante, muestreados de la distribución histórica
+  de fecha_pago_real - fecha_vencimiento,
+- impagos por estudiante (a partir de un mes aleatorio, con la tasa
+  histórica de facturas vencidas o impagadas),
+- caídas de ocupación (menos facturación recurrente),
+- movimientos de tipos de interés sobre el capital de los préstamos
+  variables (ver deuda.prestamos_variables).
+
+Los cobros de cada escenario no se generan factura a factura: se agregan
+las cuotas por (retraso, meses cobrados) y se multiplican por una matriz
+precalculada de días de cobro, de modo que un lote de escenarios es un
+np.bincount y un producto de matrices. Con muchos escenarios
+(ESCENARIOS_POOL) los lotes se reparten en un pool de procesos.
+"""
+
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from datastore import DataStore, data_store, resolver_as_of, resumen_cobros
+from .deuda import prestamos_variables
+from .tesoreria import DIA_CUOTAS_DEUDA, deuda_vigente_por_dia, proyectar_caja
+
+# Parámetros por defecto de los escenarios (fracciones y puntos porcentuales)
+PARAMETROS_ESTRES: Dict[str, float] = {
+    "caida_ocupacion_media": 0.02,       # caída media de ocupación (2%)
+    "caida_ocupacion_desviacion": 0.03,
+    "subida_tipos_media": 0.0,           # movimiento medio de tipos (p.p.)
+    "subida_tipos_desviacion": 0.75,
+    "factor_impago": 1.0,                # multiplica la tasa histórica de impago
+}
+
+# Por debajo de este número de escenarios se simula en el propio proceso
+# (arrancar un pool spawn cuesta más que simularlos)
+ESCENARIOS_POOL = 20_000
+
+ESCENARIOS_POR_LOTE = 500
+DIAS_POR_MES = 30.4375
+PERCENTILES = (5, 25, 50, 75, 95)
+
+
+class DistribucionRetrasos:
+    """
+    Retrasos de pago observados (días entre vencimiento y cobro) y calendario
+    de facturación deducidos de las facturas.
+
+    Attributes:
+        valores / probabilidades: Distribución empírica de retrasos
+        prob_impago: Probabilidad mensual de que una factura acabe vencida o impagada
+        dia_emision / plazo_dias: Día del mes de emisión y días hasta el vencimiento
+    """
+
+    def __init__(self, facturas: pd.DataFrame):
+        estado = facturas["estado"].astype(str)
+        pagadas = facturas[estado == "pagada"]
+        retrasos = (pagadas["fecha_pago_real"] - pagadas["fecha_vencimiento"]).dt.days.dropna()
+        if retrasos.empty:
+            retrasos = pd.Series([0])
+        frecuencias = retrasos.astype(int).value_counts().sort_index()
+        self.valores = frecuencias.index.to_numpy(dtype=int)
+        self.probabilidades = frecuencias.to_numpy(dtype=float) / frecuencias.sum()
+
+        cerradas = int((estado != "pendiente").sum())
+        morosas = int(estado.isin(["vencida", "impagada"]).sum())
+        self.prob_impago = morosas / cerradas if cerradas else 0.0
+
+        emision = facturas["fecha_emision"].dropna()
+        plazo = (facturas["fecha_vencimiento"] - facturas["fecha_emision"]).dt.days.dropna()
+        self.dia_emision = int(emision.dt.day.mode().iloc[0]) if not emision.empty else 1
+        self.plazo_dias = int(plazo.median()) if not plazo.empty else 0
+
+    @property
+    def retraso_medio(self) -> float:
+        return float(np.dot(self.valores, self.probabilidades))
+
+
+def distribucion_retrasos(store: DataStore = data_store) -> DistribucionRetrasos:
+    """Distribución de retrasos ajustada a las facturas (una vez por versión de datos)."""
+    return store.derivado(
+        "distribucion_retrasos", ["facturas_emitidas"],
+        lambda: DistribucionRetrasos(store.get("facturas_emitidas"))
+    )
+
+
+class ModeloEstres:
+    """
+    Datos deterministas de la simulación, comunes a todos los escenarios.
+
+    La facturación futura se modela como una factura mensual por estudiante
+    (cuota_mensual) emitida el día habitual y con el plazo habitual.
+    `cobros_por_celda[d * K + k]` es el vector diario de cobros de una cuota
+    pagada con el retraso d durante los k primeros meses del horizonte.
+    """
+
+    def __init__(self, horizonte_dias: int, as_of: datetime, store: DataStore = data_store):
+        hoy = pd.Timestamp(as_of).normalize()
+        fechas = pd.date_range(hoy, periods=horizonte_dias, freq="D")
+        self.horizonte = horizonte_dias
+        self.distribucion = distribucion_retrasos(store)
+
+        base = proyectar_caja(horizonte_dias, hoy, store).diario
+        self.saldo_inicial = float(store.get("posicion_caja")["saldo"].sum())
+        self.salidas = (base["pagos"] + base["gastos_fijos"] + base["cuotas_deuda"]).to_numpy()
+        # Capital variable vivo en los días de cuota: un movimiento de tipos de x p.p. cambia
+        # la cuota en capital * x / 1200 (los préstamos a tipo fijo no se ven afectados)
+        deuda = store.get("deuda_bancaria")
+        capital = deuda_vigente_por_dia(deuda[prestamos_variables(deuda)], "capital_pendiente", fechas)
+        self.capital_en_cuota = np.where(np.asarray(fechas.day == DIA_CUOTAS_DEUDA), capital, 0.0)
+
+        # Estudiantes y cuotas
+        estudiantes = store.get("estudiantes")
+        self.cuotas = estudiantes["cuota_mensual"].fillna(0).to_numpy(dtype=float)
+        posicion = {id_est: i for i, id_est in enumerate(estudiantes["id_estudiante"])}
+
+        # Facturas pendientes ya emitidas, sumadas por estudiante y vencimiento (el
+        # retraso se sortea por estudiante); las de estudiantes sin ficha no se simulan
+        abiertas = resumen_cobros(store=store).cobros_agregados()
+        if abiertas.empty:
+            self.pendientes_importe = np.zeros(0)
+            self.pendientes_dia = np.zeros(0, dtype=int)
+            self.pendientes_estudiante = np.zeros(0, dtype=int)
+        else:
+            abiertas = abiertas[abiertas["id_estudiante"].isin(posicion.keys())]
+            self.pendientes_importe = abiertas["importe"].to_numpy(dtype=float)
+            self.pendientes_dia = np.asarray((abiertas["fecha_vencimiento"] - hoy).dt.days.fillna(0), dtype=int)
+            self.pendientes_estudiante = abiertas["id_estudiante"].map(posicion).to_numpy(dtype=int)
+
+        # Vencimientos de la facturación futura dentro del horizonte
+        dist = self.distribucion
+        emisiones = fechas[fechas.day == dist.dia_emision]
+        emisiones = emisiones[emisiones > hoy]
+        self.vencimientos = np.asarray((emisiones + pd.Timedelta(days=dist.plazo_dias) - hoy).days, dtype=int)
+        self.meses = len(self.vencimientos)
+
+        # cobros_por_celda: (retraso, meses cobrados) -> vector diario
+        num_retrasos, k = len(dist.valores), self.meses + 1
+        dias_cobro = self.vencimientos[None, :] + dist.valores[:, None]
+        unitario = np.zeros((num_retrasos, self.meses, horizonte_dias))
+        d, m = np.nonzero((dias_cobro >= 0) & (dias_cobro < horizonte_dias))
+        unitario[d, m, dias_cobro[d, m]] = 1.0
+        acumulado = np.zeros((num_retrasos, k, horizonte_dias))
+        acumulado[:, 1:, :] = np.cumsum(unitario, axis=1)
+        self.cobros_por_celda = acumulado.reshape(num_retrasos * k, horizonte_dias)
+
+        # Escenario de referencia: todos pagan el día del vencimiento, sin impagos ni shocks
+        dias = np.concatenate([self.vencimientos, np.clip(self.pendientes_dia, 0, None)])
+        importes = np.concatenate([np.full(self.meses, self.cuotas.sum()), self.pendientes_importe])
+        validos = dias < horizonte_dias
+        cobros = np.bincount(dias[validos], weights=importes[validos], minlength=horizonte_dias)
+        self.saldo_al_vencimiento = self.saldo_inicial + np.cumsum(cobros + self.salidas)
+
+
+def simular_lote(modelo: ModeloEstres, escenarios: int, semilla, parametros: Dict[str, float]) -> np.ndarray:
+    """
+    Simula un lote de escenarios. Devuelve una matriz (escenarios, 3) con
+    saldo mínimo, saldo final y salidas totales de cada escenario.
+    """
+    rng = np.random.default_rng(semilla)
+    dist = modelo.distribucion
+    n_est, horizonte, k = len(modelo.cuotas), modelo.horizonte, modelo.meses + 1
+
+    # Retraso de cada estudiante en cada escenario (muestreo por CDF empírica)
+    retraso = np.minimum(
+        np.searchsorted(np.cumsum(dist.probabilidades), rng.random((escenarios, n_est)), side="right"),
+        len(dist.valores) - 1
+    )
+    # Meses cobrados antes del primer impago (geométrica); sin impago, todos
+    prob_impago = min(dist.prob_impago * parametros["factor_impago"], 1.0)
+    if prob_impago > 0:
+        cobrados = np.minimum(rng.geometric(prob_impago, (escenarios, n_est)) - 1, modelo.meses)
+    else:
+        cobrados = np.full((escenarios, n_est), modelo.meses)
+
+    caida = np.clip(rng.normal(parametros["caida_ocupacion_media"], parametros["caida_ocupacion_desviacion"],
+                               escenarios), 0.0, 1.0)
+    tipos = rng.normal(parametros["subida_tipos_media"], parametros["subida_tipos_desviacion"], escenarios)
+
+    # Cuotas agregadas por (escenario, retraso, meses cobrados) y cobros diarios por producto de matrices
+    celdas = len(dist.valores) * k
+    indices = (np.arange(escenarios)[:, None] * celdas + retraso * k + cobrados).ravel()
+    pesos = (modelo.cuotas[None, :] * (1.0 - caida)[:, None]).ravel()
+    por_celda = np.bincount(indices, weights=pesos, minlength=escenarios * celdas).reshape(escenarios, celdas)
+    entradas = por_celda @ modelo.cobros_por_celda
+
+    # Facturas pendientes: retraso del estudiante, salvo impago desde el primer mes
+    if len(modelo.pendientes_importe):
+        est = modelo.pendientes_estudiante
+        dias = np.clip(modelo.pendientes_dia[None, :] + dist.valores[retraso[:, est]], 0, None)
+        cobra = (cobrados[:, est] > 0) | (modelo.meses == 0)
+        validos = (dias < horizonte) & cobra
+        filas = np.broadcast_to(np.arange(escenarios)[:, None], dias.shape)
+        np.add.at(entradas, (filas[validos], dias[validos]),
+                  np.broadcast_to(modelo.pendientes_importe, dias.shape)[validos])
+
+    salidas = modelo.salidas[None, :] - tipos[:, None] * modelo.capital_en_cuota[None, :] / 1200.0
+    saldo = modelo.saldo_inicial + np.cumsum(entradas + salidas, axis=1)
+    return np.column_stack([saldo.min(axis=1), saldo[:, -1], salidas.sum(axis=1)])
+
+
+# Modelo de cada proceso del pool (se envía una vez, no en cada lote)
+_modelo_proceso: Optional[ModeloEstres] = None
+
+
+def _iniciar_proceso(modelo: ModeloEstres) -> None:
+    global _modelo_proceso
+    _modelo_proceso = modelo
+
+
+def _simular_lote_proceso(escenarios: int, semilla, parametros: Dict[str, float]) -> np.ndarray:
+    return simular_lote(_modelo_proceso, escenarios, semilla, parametros)
+
+
+class ResultadoEstres:
+    """
+    Distribución de resultados de los escenarios.
+
+    Attributes:
+        saldo_minimo / saldo_final: Por escenario
+        cobertura_meses: Saldo mínimo / salidas medias mensuales, por escenario
+        saldo_minimo_al_vencimiento: Saldo mínimo si todos pagan al vencimiento, sin shocks
+    """
+
+    def __init__(self, resultados: np.ndarray, modelo: ModeloEstres, parametros: Dict[str, float]):
+        self.saldo_minimo = resultados[:, 0]
+        self.saldo_final = resultados[:, 1]
+        salidas_mes = -resultados[:, 2] / (modelo.horizonte / DIAS_POR_MES)
+        self.cobertura_meses = np.divide(self.saldo_minimo, salidas_mes, out=np.full(len(salidas_mes), np.inf),
+                                         where=salidas_mes > 0)
+        self.escenarios = len(resultados)
+        self.horizonte_dias = modelo.horizonte
+        self.parametros = parametros
+        self.distribucion = modelo.distribucion
+        self.saldo_inicial = modelo.saldo_inicial
+        self.saldo_minimo_al_vencimiento = float(modelo.saldo_al_vencimiento.min())
+        self.saldo_final_al_vencimiento = float(modelo.saldo_al_vencimiento[-1])
+
+    @property
+    def prob_caja_negativa(self) -> float:
+        """Proporción de escenarios en los que la caja llega a ser negativa."""
+        return float((self.saldo_minimo < 0).mean())
+
+    def percentiles(self, percentiles=PERCENTILES) -> pd.DataFrame:
+        """Percentiles de saldo mínimo, saldo final y meses de cobertura."""
+        return pd.DataFrame({
+            "percentil": list(percentiles),
+            "saldo_minimo": np.percentile(self.saldo_minimo, percentiles),
+            "saldo_final": np.percentile(self.saldo_final, percentiles),
+            "cobertura_meses": np.percentile(self.cobertura_meses, percentiles),
+        })
+
+
+def _lotes(escenarios: int):
+    completos, resto = divmod(escenarios, ESCENARIOS_POR_LOTE)
+    return [ESCENARIOS_POR_LOTE] * completos + ([resto] if resto else [])
+
+
+def simular_estres_liquidez(escenarios: int = 10_000, horizonte_dias: int = 365, as_of: Optional[datetime] = None,
+                         parametros: Optional[Dict[str, float]] = None, semilla: Optional[int] = None,
+                         procesos: Optional[int] = None, store: DataStore = data_store) -> ResultadoEstres:
+    """
+    Simula escenarios de estrés de liquidez.
+
+    Args:
+        escenarios: Número de escenarios
+        horizonte_dias: Días simulados desde as_of
+        parametros: Sobrescribe valores de PARAMETROS_ESTRES
+        semilla: Semilla para resultados reproducibles
+        procesos: Procesos del pool (por defecto, uno por CPU a partir de
+            ESCENARIOS_POOL escenarios y ninguno por debajo; 1 = sin pool)
+    """
+    if escenarios < 1 or horizonte_dias < 1:
+        raise ValueError("Se necesita al menos un escenario y un día de horizonte")
+    parametros = {**PARAMETROS_ESTRES, **(parametros or {})}
+    modelo = ModeloEstres(horizonte_dias, resolver_as_of(as_of), store)
+
+    lotes = _lotes(escenarios)
+    semillas = np.random.SeedSequence(semilla).spawn(len(lotes))
+    if procesos is None:
+        procesos = (os.cpu_count() or 1) if escenarios >= ESCENARIOS_POOL else 1
+    procesos = min(procesos, len(lotes))
+
+    resultados = None
+    if procesos > 1:
+        try:
+            # spawn: los llamantes (Streamlit, servidores MCP, grafo) tienen hilos vivos y fork no es seguro
+            contexto = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(procesos, mp_context=contexto, initializer=_iniciar_proceso,
+                                     initargs=(modelo,)) as pool:
+                resultados = list(pool.map(_simular_lote_proceso, lotes, semillas, [parametros] * len(lotes)))
+        except (OSError, RuntimeError) as e:
+            # Sin procesos disponibles (entornos restringidos): se simula en este proceso
+            print(f"⚠️ Pool de procesos no disponible ({e}); simulando en serie", file=sys.stderr)
+    if resultados is None:
+        resultados = [simular_lote(modelo, n, s, parametros) for n, s in zip(lotes, semillas)]
+
+    return ResultadoEstres(np.vstack(resultados), modelo, parametros)
@@ -0,0 +1,209 @@
+"""
+Motor de KPIs calculados a partir de los datos.
+
+Sustituye a los valores escritos a mano en kpis.csv: DSO, tasa de morosidad,
+eficiencia de cobro, ocupación media y EBITDA se calculan desde las facturas,
+la ocupación y la cuenta de resultados. Las facturas se reducen una vez por
+versión de datos a sumas por residencia × mes de emisión, y cualquier KPI
+por residencia o por mes se obtiene sumando celdas, sin volver a recorrerlas.
+"""
+
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from datastore import DataStore, data_store
+
+from .tesoreria import gastos_fijos_anuales
+
+ESTADOS_MOROSOS = ["vencida", "impagada"]
+
+# Definición de cada KPI: objetivo, unidad y si un valor menor es mejor
+KPIS: Dict[str, dict] = {
+    "ocupacion": {"nombre": "Ocupación media", "objetivo": 95.0, "unidad": "%", "menor_es_mejor": False},
+    "morosidad": {"nombre": "Tasa de morosidad", "objetivo": 2.0, "unidad": "%", "menor_es_mejor": True},
+    "dso": {"nombre": "DSO", "objetivo": 30.0, "unidad": "días", "menor_es_mejor": True},
+    "eficiencia_cobro": {"nombre": "Eficiencia de cobro", "objetivo": 95.0, "unidad": "%", "menor_es_mejor": False},
+    "ebitda": {"nombre": "EBITDA", "objetivo": 3000000.0, "unidad": "€", "menor_es_mejor": False},
+}
+
+# Conceptos de la cuenta de resultados que quedan por debajo del EBITDA
+CONCEPTOS_NO_EBITDA = ("amortiz", "depreciaci", "interes", "interés", "financ", "impuesto")
+
+MEDIDAS = ["facturado", "cobrado", "moroso", "importe_dias_cobro", "importe_con_dias", "num_facturas"]
+
+
+def _ratio(numerador, denominador, escala: float = 1.0):
+    """numerador / denominador * escala, con 0 donde el denominador es 0."""
+    numerador = np.asarray(numerador, dtype=float)
+    denominador = np.asarray(denominador, dtype=float)
+    return np.divide(numerador * escala, denominador, out=np.zeros_like(numerador), where=denominador != 0)
+
+
+def ratios_cobro(sumas: pd.DataFrame) -> pd.DataFrame:
+    """
+    DSO, morosidad y eficiencia de cobro a partir de sumas de medidas
+    (una fila por grupo).
+
+    - DSO: días medios desde la emisión hasta el cobro, ponderados por importe
+    - Morosidad: importe vencido o impagado sobre el facturado (%)
+    - Eficiencia de cobro: cobrado sobre lo ya exigible (cobrado + moroso) (%)
+    """
+    return pd.DataFrame({
+        "dso": _ratio(sumas["importe_dias_cobro"], sumas["importe_con_dias"]),
+        "morosidad": _ratio(sumas["moroso"], sumas["facturado"], 100),
+        "eficiencia_cobro": _ratio(sumas["cobrado"], sumas["cobrado"] + sumas["moroso"], 100),
+    }, index=sumas.index)
+
+
+class CuboKPIs:
+    """
+    Medidas de cobro por (residencia, mes de emisión): facturado, cobrado,
+    moroso e importe × días de cobro de las facturas pagadas.
+    """
+
+    DIMENSIONES = ("residencia", "mes")
+
+    def __init__(self, facturas: pd.DataFrame):
+        importe = facturas["importe"].to_numpy(dtype=float)
+        estado = facturas["estado"].astype(str).to_numpy()
+        pagada = estado == "pagada"
+        dias_cobro = np.asarray((facturas["fecha_pago_real"] - facturas["fecha_emision"]).dt.days, dtype=float)
+        con_dias = pagada & ~np.isnan(dias_cobro)
+
+        medidas = pd.DataFrame({
+            "facturado": importe,
+            "cobrado": np.where(pagada, importe, 0.0),
+            "moroso": np.where(np.isin(estado, ESTADOS_MOROSOS), importe, 0.0),
+            "importe_dias_cobro": np.where(con_dias, importe * np.nan_to_num(dias_cobro), 0.0),
+            "importe_con_dias": np.where(con_dias, importe, 0.0),
+            "num_facturas": np.ones(len(facturas), dtype=int),
+        })
+        mes = facturas["fecha_emision"].dt.to_period("M").rename("mes")
+        self.celdas = medidas.groupby([facturas["residencia"], mes], observed=True, dropna=False).sum()
+        self._residencia = self.celdas.index.get_level_values("residencia").astype(object)
+        self._mes = self.celdas.index.get_level_values("mes")
+        self.residencias: List[str] = sorted(str(r) for r in pd.unique(self._residencia) if pd.notna(r))
+
+    def residencias_coincidentes(self, patron: str) -> List[str]:
+        """Residencias cuyo nombre contiene el patrón (sin distinguir mayúsculas)."""
+        patron = patron.lower()
+        return [r for r in self.residencias if patron in r.lower()]
+
+    def _mascara(self, residencia: Optional[str] = None, desde: Optional[str] = None,
+                 hasta: Optional[str] = None) -> np.ndarray:
+        mascara = np.ones(len(self.celdas), dtype=bool)
+        if residencia is not None and residencia != "todas":
+            mascara &= np.isin(self._residencia, self.residencias_coincidentes(residencia))
+        if desde is not None:
+            mascara &= np.asarray(self._mes >= pd.Period(desde, freq="M"))
+        if hasta is not None:
+            mascara &= np.asarray(self._mes <= pd.Period(hasta, freq="M"))
+        return mascara
+
+    def sumas(self, **filtros) -> pd.Series:
+        """Suma de las medidas de las celdas que cumplen los filtros (residencia, desde, hasta)."""
+        return self.celdas[self._mascara(**filtros)].sum()
+
+    def por(self, dimension: str, **filtros) -> pd.DataFrame:
+        """Medidas agregadas y ratios de cobro por residencia o por mes."""
+        if dimension not in self.DIMENSIONES:
+            raise ValueError(f"Dimensión no válida: {dimension}. Opciones: {', '.join(self.DIMENSIONES)}")
+        sumas = self.celdas[self._mascara(**filtros)].groupby(level=dimension, observed=True).sum()
+        return sumas.join(ratios_cobro(sumas))
+
+
+def cubo_kpis(store: DataStore = data_store) -> CuboKPIs:
+    """Cubo de medidas de cobro para la versión actual de los datos."""
+    return store.derivado(
+        "cubo_kpis", ["facturas_emitidas"],
+        lambda: CuboKPIs(store.get("facturas_emitidas"))
+    )
+
+
+def ocupacion_media(residencia: Optional[str] = None, store: DataStore = data_store) -> float:
+    """Plazas ocupadas sobre capacidad (%), de todas las residencias o de las que coinciden."""
+    ocupacion = store.get("ocupacion")
+    if residencia is not None and residencia != "todas":
+        ocupacion = ocupacion[ocupacion["residencia"].str.contains(residencia, case=False, regex=False)]
+    return float(_ratio(ocupacion["ocupacion_actual"].sum(), ocupacion["capacidad"].sum(), 100))
+
+
+# Aviso para las salidas cuando los gastos salen de gastos_fijos.csv
+NOTA_GASTOS_ESTIMADOS = ("La cuenta de resultados no tiene líneas de gasto: los gastos y el EBITDA se "
+                         "estiman con los gastos fijos anualizados de gastos_fijos.csv.")
+
+
+def gastos_estimados(store: DataStore = data_store) -> bool:
+    """Indica si la cuenta de resultados no tiene gastos y se usan los gastos fijos anualizados."""
+    pyg = store.get("cuenta_resultados")
+    return not (pyg["tipo_norm"] == "gasto").any()
+
+
+def gastos_anuales(store: DataStore = data_store, solo_explotacion: bool = False) -> float:
+    """
+    Gastos del ejercicio: los de la cuenta de resultados o, si no tiene
+    ninguna línea de gasto, los gastos fijos anualizados según su periodicidad.
+
+    Args:
+        solo_explotacion: Excluir amortizaciones, financieros e impuestos
+    """
+    if gastos_estimados(store):
+        return gastos_fijos_anuales(store.get("gastos_fijos"))
+    pyg = store.get("cuenta_resultados")
+    es_gasto = pyg["tipo_norm"] == "gasto"
+    if solo_explotacion:
+        concepto = pyg["concepto"].astype(str).str.lower()
+        es_gasto &= ~concepto.str.contains("|".join(CONCEPTOS_NO_EBITDA), regex=True)
+    return float(pyg.loc[es_gasto, "importe"].sum())
+
+
+def ebitda(store: DataStore = data_store) -> float:
+    """Ingresos menos gastos de explotación (sin amortizaciones, financieros ni impuestos)."""
+    pyg = store.get("cuenta_resultados")
+    ingresos = pyg.loc[pyg["tipo_norm"] == "ingreso", "importe"].sum()
+    return float(ingresos - gastos_anuales(store, solo_explotacion=True))
+
+
+def _tabla_kpis(valores: Dict[str, float]) -> pd.DataFrame:
+    filas = []
+    for clave, valor in valores.items():
+        definicion = KPIS[clave]
+        objetivo = definicion["objetivo"]
+        cumple = valor <= objetivo if definicion["menor_es_mejor"] else valor >= objetivo
+        filas.append({
+            "kpi": clave, "nombre": definicion["nombre"], "valor": valor,
+            "objetivo": objetivo, "unidad": definicion["unidad"], "cumple": bool(cumple)
+        })
+    return pd.DataFrame(filas, columns=["kpi", "nombre", "valor", "objetivo", "unidad", "cumple"])
+
+
+def calcular_kpis(residencia: Optional[str] = None, desde: Optional[str] = None, hasta: Optional[str] = None,
+                  store: DataStore = data_store) -> pd.DataFrame:
+    """
+    KPIs con valor, objetivo, unidad y si se cumple el objetivo.
+
+    Sin filtros el resultado se memoiza por versión de datos. Con residencia
+    o rango de meses (YYYY-MM) se recalcula sumando celdas del cubo; la
+    ocupación es la actual y el EBITDA solo se incluye sin filtros.
+
+    Args:
+        residencia: Nombre (o parte) de la residencia
+        desde / hasta: Meses de emisión incluidos
+    """
+    def construir():
+        ratios = ratios_cobro(cubo_kpis(store).sumas(residencia=residencia, desde=desde, hasta=hasta).to_frame().T)
+        valores = {
+            "ocupacion": ocupacion_media(residencia, store),
+            "morosidad": float(ratios["morosidad"].iloc[0]),
+            "dso": float(ratios["dso"].iloc[0]),
+            "eficiencia_cobro": float(ratios["eficiencia_cobro"].iloc[0]),
+        }
+        if residencia in (None, "todas") and desde is None and hasta is None:
+            valores["ebitda"] = ebitda(store)
+        return _tabla_kpis(valores)
+
+    if residencia in (None, "todas") and desde is None and hasta is None:
+        return store.derivado("kpis", ["facturas_emitidas", "ocupacion", "cuenta_resultados", "gastos_fijos"], construir)
+    return construir()
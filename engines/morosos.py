@@ -0,0 +1,104 @@
+"""
+Motor de morosos (top-K de deuda vencida por estudiante).
+
+La deuda vencida se agrega por estudiante una sola vez por versión de datos
+(y por día de referencia y días mínimos de retraso), con el backend que toque
+(SQL, streaming o memoria). Los rankings no ordenan la tabla entera: eligen
+los K mayores con np.argpartition y solo esas filas se cruzan con la ficha
+del estudiante, de modo que mostrar los 10 primeros de miles de morosos
+cuesta lo mismo que mostrar los 10 primeros de veinte.
+"""
+
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from datastore import (MAX_DIAS_MEMO, DataStore, MemoAcotada, data_store, filas_estudiantes, resolver_as_of,
+                       resumen_cobros)
+
+
+class RankingMorosos:
+    """
+    Deuda vencida por estudiante con acceso paginado por deuda descendente.
+
+    Attributes:
+        morosos: DataFrame id_estudiante, deuda_total, num_facturas, max_dias_retraso
+        total_morosos: Número de estudiantes morosos
+        deuda_total: Suma de la deuda vencida
+        as_of / dias_minimo: Parámetros con los que se calculó (as_of, a medianoche)
+    """
+
+    def __init__(self, morosos: pd.DataFrame, as_of: datetime, dias_minimo: int,
+                 store: DataStore = data_store):
+        self.morosos = morosos.reset_index(drop=True)
+        self.as_of = pd.Timestamp(as_of).normalize()
+        self.dias_minimo = dias_minimo
+        self.store = store
+        self.total_morosos = len(self.morosos)
+        self.deuda_total = float(self.morosos["deuda_total"].sum())
+        self._deuda = self.morosos["deuda_total"].to_numpy(dtype=float)
+
+    def _top(self, k: int) -> np.ndarray:
+        """
+        Posiciones de los k mayores deudores, ordenadas por deuda descendente
+        (a igual deuda, por id_estudiante). Selección O(n) con argpartition.
+        """
+        n = len(self._deuda)
+        k = min(max(k, 0), n)
+        if k == 0:
+            return np.empty(0, dtype=int)
+        if k < n:
+            umbral = self._deuda[np.argpartition(-self._deuda, k - 1)[k - 1]]
+            mayores = np.flatnonzero(self._deuda > umbral)
+            empates = np.flatnonzero(self._deuda == umbral)[:k - len(mayores)]
+            candidatos = np.concatenate([mayores, empates])
+        else:
+            candidatos = np.arange(n)
+        # morosos viene ordenado por id_estudiante: la posición desempata
+        return candidatos[np.lexsort((candidatos, -self._deuda[candidatos]))]
+
+    def pagina(self, limite: int = 10, desplazamiento: int = 0, detalles: bool = True) -> pd.DataFrame:
+        """
+        Morosos en las posiciones [desplazamiento, desplazamiento + limite) del ranking.
+
+        Args:
+            limite: Número de morosos a devolver
+            desplazamiento: Morosos del ranking que se saltan
+            detalles: Añadir la ficha del estudiante (solo para las filas devueltas)
+        """
+        desplazamiento = max(desplazamiento, 0)
+        seleccion = self.morosos.iloc[self._top(desplazamiento + limite)[desplazamiento:]]
+        seleccion = seleccion.reset_index(drop=True)
+        if not detalles:
+            return seleccion
+        fichas = filas_estudiantes(seleccion["id_estudiante"], self.store)
+        return seleccion.merge(fichas, on="id_estudiante", how="left")
+
+    def hay_mas(self, limite: int, desplazamiento: int = 0) -> bool:
+        """Quedan morosos después de la página indicada."""
+        return max(desplazamiento, 0) + limite < self.total_morosos
+
+
+def ranking_morosos(dias_minimo: int = 1, as_of: Optional[datetime] = None,
+                    store: DataStore = data_store) -> RankingMorosos:
+    """
+    Ranking de morosos a fecha as_of (por defecto, ahora).
+
+    Se memoiza por versión de datos, día de referencia y días mínimos
+    (solo los MAX_DIAS_MEMO últimos usados).
+
+    Args:
+        dias_minimo: Días mínimos de retraso para considerar moroso
+        as_of: Fecha de referencia para los días de retraso
+    """
+    # El ranking se comparte por día: se calcula con el día, no con la hora
+    # del primer llamante
+    dia = pd.Timestamp(resolver_as_of(as_of)).normalize()
+    rankings = store.derivado("ranking_morosos", ["facturas_emitidas"], lambda: MemoAcotada(MAX_DIAS_MEMO))
+
+    def construir():
+        morosos = resumen_cobros(dias_minimo=dias_minimo, ahora=dia, store=store).morosos()
+        return RankingMorosos(morosos, dia, dias_minimo, store)
+    return rankings.obtener((dias_minimo, dia), construir)
@@ -0,0 +1,258 @@
+"""
+Motor de scoring del comportamiento de pago de los estudiantes.
+
+A partir del historial de facturas se calculan por estudiante, en un único
+pase vectorizado, el retraso medio y máximo de pago, la proporción de
+facturas vencidas sin pagar y pagadas tarde, y las rachas de impago y de
+retraso. Con ellas se estima una probabilidad de impago (modelo logístico
+con pesos configurables) y un perfil de pagador.
+
+El scoring se memoiza por versión de datos y día. Cuando cambia
+facturas_emitidas se compara con el historial anterior y solo se recalculan
+los estudiantes con facturas nuevas o modificadas (p. ej. un pago).
+"""
+
+import threading
+import weakref
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from datastore import MAX_DIAS_MEMO, DataStore, MemoAcotada, data_store, resolver_as_of
+
+# Pesos del modelo logístico (probabilidad = 1 / (1 + e^-z), z = intercepto + Σ peso × característica)
+PESOS_RIESGO: Dict[str, float] = {
+    "intercepto": -4.0,
+    "ratio_vencidas": 4.0,      # Facturas exigibles sin pagar / exigibles
+    "ratio_tardias": 1.5,       # Facturas pagadas tarde o sin pagar / exigibles
+    "retraso_medio": 0.05,      # Días medios de retraso de las pagadas
+    "racha_impago": 1.0,        # Últimas facturas exigibles seguidas sin pagar
+}
+
+# Nivel de riesgo según la probabilidad de impago (%)
+NIVELES_RIESGO = ((20.0, "bajo"), (50.0, "medio"), (float("inf"), "alto"))
+
+COLUMNAS_HISTORIAL = ["id_factura", "id_estudiante", "fecha_emision", "fecha_vencimiento",
+                      "fecha_pago_real", "importe", "estado"]
+COLUMNAS_COMPARADAS = ["id_estudiante", "fecha_vencimiento", "fecha_pago_real", "importe", "estado"]
+
+
+def _rachas(grupos: np.ndarray, marcas: np.ndarray) -> pd.Series:
+    """Longitud de cada racha de marcas consecutivas por grupo (filas ordenadas por grupo y fecha)."""
+    corte = np.cumsum(~marcas)
+    return pd.Series(marcas.astype(int)).groupby([grupos, corte], sort=False).sum()
+
+
+def caracteristicas_pago(facturas: pd.DataFrame, as_of: datetime) -> pd.DataFrame:
+    """
+    Características de pago por estudiante a fecha as_of.
+
+    Una factura es exigible si ya venció o está pagada; es incumplida si es
+    exigible y no está pagada, y tardía si se pagó después del vencimiento o
+    está incumplida.
+    """
+    hoy = pd.Timestamp(as_of).normalize()
+    f = facturas.sort_values(["id_estudiante", "fecha_emision"], kind="stable")
+    estudiante = f["id_estudiante"].astype(str).to_numpy()
+    estado = f["estado"].astype(str).to_numpy()
+    importe = f["importe"].to_numpy(dtype=float)
+    vencimiento = f["fecha_vencimiento"]
+
+    pagada = (estado == "pagada") & f["fecha_pago_real"].notna().to_numpy()
+    retraso = np.clip(np.nan_to_num(np.asarray((f["fecha_pago_real"] - vencimiento).dt.days, dtype=float)), 0, None)
+    exigible = np.asarray(vencimiento < hoy) | pagada
+    incumplida = exigible & ~pagada
+    tardia = (pagada & (retraso > 0)) | incumplida
+    dias_vencida = np.nan_to_num(np.asarray((hoy - vencimiento).dt.days, dtype=float))
+
+    medidas = pd.DataFrame({
+        "num_facturas": np.ones(len(f), dtype=int),
+        "exigibles": exigible.astype(int),
+        "pagadas": pagada.astype(int),
+        "vencidas": incumplida.astype(int),
+        "tardias": tardia.astype(int),
+        "suma_retraso": np.where(pagada, retraso, 0.0),
+        "importe_vencido": np.where(incumplida, importe, 0.0),
+        "importe_pendiente": np.where(estado == "pendiente", importe, 0.0),
+    })
+    agrupado = medidas.groupby(estudiante)
+    tabla = agrupado.sum()
+    tabla["retraso_max"] = pd.Series(np.where(pagada, retraso, 0.0)).groupby(estudiante).max()
+    tabla["max_dias_vencida"] = pd.Series(np.where(incumplida, dias_vencida, 0.0)).groupby(estudiante).max()
+
+    # Rachas sobre la secuencia de facturas exigibles de cada estudiante
+    rachas_impago = _rachas(estudiante[exigible], incumplida[exigible])
+    rachas_tardias = _rachas(estudiante[exigible], tardia[exigible])
+    tabla["racha_impago"] = rachas_impago.groupby(level=0).last().reindex(tabla.index, fill_value=0)
+    tabla["racha_tardias_max"] = rachas_tardias.groupby(level=0).max().reindex(tabla.index, fill_value=0)
+
+    exigibles = tabla["exigibles"].to_numpy(dtype=float)
+    pagadas = tabla["pagadas"].to_numpy(dtype=float)
+    tabla["retraso_medio"] = np.divide(tabla["suma_retraso"].to_numpy(), pagadas,
+                                       out=np.zeros(len(tabla)), where=pagadas > 0)
+    tabla["ratio_vencidas"] = np.divide(tabla["vencidas"].to_numpy(dtype=float), exigibles,
+                                        out=np.zeros(len(tabla)), where=exigibles > 0)
+    tabla["ratio_tardias"] = np.divide(tabla["tardias"].to_numpy(dtype=float), exigibles,
+                                       out=np.zeros(len(tabla)), where=exigibles > 0)
+    return tabla.drop(columns="suma_retraso").rename_axis("id_estudiante")
+
+
+def puntuar(caracteristicas: pd.DataFrame, pesos: Optional[Dict[str, float]] = None) -> pd.DataFrame:
+    """Añade probabilidad de impago (%), nivel de riesgo y perfil estimado a las características."""
+    pesos = {**PESOS_RIESGO, **(pesos or {})}
+    z = np.full(len(caracteristicas), pesos["intercepto"])
+    for columna, peso in pesos.items():
+        if columna != "intercepto":
+            z += peso * caracteristicas[columna].to_numpy(dtype=float)
+    probabilidad = 100 / (1 + np.exp(-z))
+
+    limites = np.array([limite for limite, _ in NIVELES_RIESGO])
+    nombres = np.array([nombre for _, nombre in NIVELES_RIESGO])
+    perfil = np.select(
+        [caracteristicas["racha_impago"].to_numpy() >= 3,
+         caracteristicas["vencidas"].to_numpy() > 0,
+         caracteristicas["ratio_tardias"].to_numpy() >= 0.5],
+        ["Incobrable", "Intermitente", "Despistado"], "Puntual")
+    return caracteristicas.assign(
+        prob_impago=probabilidad,
+        nivel_riesgo=nombres[np.searchsorted(limites, probabilidad, side="right").clip(max=len(limites) - 1)],
+        perfil=perfil
+    )
+
+
+def _distintos(anteriores: pd.DataFrame, nuevas: pd.DataFrame) -> np.ndarray:
+    """Filas (alineadas por posición) en las que cambia alguna columna comparada."""
+    distinto = np.zeros(len(nuevas), dtype=bool)
+    for columna in COLUMNAS_COMPARADAS:
+        a = anteriores[columna].reset_index(drop=True)
+        b = nuevas[columna].reset_index(drop=True)
+        if isinstance(a.dtype, pd.CategoricalDtype) or isinstance(b.dtype, pd.CategoricalDtype):
+            # Las categorías pueden diferir entre versiones
+            a, b = a.astype(str), b.astype(str)
+        distinto |= (a.ne(b) & ~(a.isna() & b.isna())).to_numpy(dtype=bool)
+    return distinto
+
+
+class ScoringPagos:
+    """
+    Scoring de comportamiento de pago de todos los estudiantes a una fecha.
+
+    Attributes:
+        puntuaciones: Una fila por estudiante (índice id_estudiante) con las
+            características, prob_impago (%), nivel_riesgo y perfil
+        as_of: Fecha de referencia
+    """
+
+    def __init__(self, facturas: pd.DataFrame, as_of: datetime, pesos: Optional[Dict[str, float]] = None):
+        self.as_of = pd.Timestamp(as_of).normalize()
+        self.pesos = pesos
+        self._historial = facturas[COLUMNAS_HISTORIAL].reset_index(drop=True)
+        self.puntuaciones = puntuar(caracteristicas_pago(self._historial, self.as_of), pesos)
+
+    @classmethod
+    def _ensamblar(cls, historial: pd.DataFrame, puntuaciones: pd.DataFrame, as_of: pd.Timestamp,
+                   pesos: Optional[Dict[str, float]]) -> "ScoringPagos":
+        scoring = cls.__new__(cls)
+        scoring.as_of, scoring.pesos = as_of, pesos
+        scoring._historial, scoring.puntuaciones = historial, puntuaciones
+        return scoring
+
+    def _recalcular(self, historial: pd.DataFrame, afectados: set) -> "ScoringPagos":
+        """Scoring con el historial dado, recalculando solo los estudiantes afectados."""
+        if not afectados:
+            return self._ensamblar(historial, self.puntuaciones, self.as_of, self.pesos)
+        filas = historial[historial["id_estudiante"].isin(list(afectados))]
+        nuevas = puntuar(caracteristicas_pago(filas, self.as_of), self.pesos)
+        puntuaciones = pd.concat([self.puntuaciones.drop(index=list(afectados), errors="ignore"), nuevas])
+        return self._ensamblar(historial, puntuaciones.sort_index(), self.as_of, self.pesos)
+
+    def con_cambios(self, cambios: pd.DataFrame) -> "ScoringPagos":
+        """
+        Nuevo scoring con facturas nuevas o modificadas (por id_factura), p. ej.
+        recibidas fuera de los CSV. Solo se recalculan los estudiantes afectados.
+        """
+        if cambios.empty:
+            return self
+        cambios = cambios[COLUMNAS_HISTORIAL]
+        posiciones = pd.Index(self._historial["id_factura"]).get_indexer(cambios["id_factura"])
+        existentes = posiciones >= 0
+        afectados = set(cambios["id_estudiante"].astype(str))
+        afectados.update(self._historial["id_estudiante"].iloc[posiciones[existentes]].astype(str))
+
+        historial = self._historial.copy()
+        historial.iloc[posiciones[existentes]] = cambios[existentes].to_numpy()
+        historial = pd.concat([historial, cambios[~existentes]], ignore_index=True)
+        for columna in COLUMNAS_HISTORIAL:
+            historial[columna] = historial[columna].astype(self._historial[columna].dtype)
+        return self._recalcular(historial, afectados)
+
+    def sincronizar(self, facturas: pd.DataFrame) -> "ScoringPagos":
+        """
+        Scoring para una nueva versión de facturas_emitidas. Si solo se han
+        añadido facturas o cambiado las existentes (mismo orden), se
+        recalculan los estudiantes afectados; si se han eliminado o
+        reordenado, se recalcula todo.
+        """
+        anteriores = self._historial
+        n = len(anteriores)
+        nuevas = facturas[COLUMNAS_HISTORIAL].reset_index(drop=True)
+        if len(nuevas) < n or not nuevas["id_factura"].iloc[:n].equals(anteriores["id_factura"]):
+            return ScoringPagos(facturas, self.as_of, self.pesos)
+
+        distinto = _distintos(anteriores, nuevas.iloc[:n])
+        afectados = set(anteriores["id_estudiante"][distinto].astype(str))
+        afectados.update(nuevas["id_estudiante"].iloc[:n][distinto].astype(str))
+        afectados.update(nuevas["id_estudiante"].iloc[n:].astype(str))
+        return self._recalcular(nuevas, afectados)
+
+    def de(self, ids: Iterable[str]) -> pd.DataFrame:
+        """Puntuaciones de los estudiantes indicados, en el mismo orden (NaN si no tienen facturas)."""
+        return self.puntuaciones.reindex(pd.Index(list(ids), dtype=self.puntuaciones.index.dtype))
+
+    def anotar(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Añade prob_impago, nivel_riesgo y perfil a una tabla con id_estudiante."""
+        riesgo = self.de(df["id_estudiante"].astype(str))[["prob_impago", "nivel_riesgo", "perfil"]]
+        return df.assign(**{c: riesgo[c].to_numpy() for c in riesgo.columns})
+
+    def cobro_esperado(self) -> float:
+        """Importe pendiente ponderado por la probabilidad de cobro de cada estudiante."""
+        p = self.puntuaciones
+        return float((p["importe_pendiente"] * (1 - p["prob_impago"] / 100)).sum())
+
+    def por_perfil(self) -> pd.DataFrame:
+        """Número de estudiantes, probabilidad media de impago e importe vencido por perfil."""
+        return self.puntuaciones.groupby("perfil").agg(
+            num_estudiantes=("prob_impago", "size"),
+            prob_impago_media=("prob_impago", "mean"),
+            importe_vencido=("importe_vencido", "sum")
+        ).sort_values("prob_impago_media", ascending=False).reset_index()
+
+
+# Último scoring de cada DataStore, para actualizarlo de forma incremental
+_ultimos: "weakref.WeakKeyDictionary[DataStore, ScoringPagos]" = weakref.WeakKeyDictionary()
+_lock_ultimos = threading.Lock()
+
+
+def scoring_pagos(as_of: Optional[datetime] = None, store: DataStore = data_store) -> ScoringPagos:
+    """
+    Scoring de pago a fecha as_of (por defecto, hoy), memoizado por versión
+    de datos y día (los MAX_DIAS_MEMO últimos usados). Al cambiar las facturas se parte del scoring anterior del
+    mismo día y solo se recalculan los estudiantes afectados.
+    """
+    dia = pd.Timestamp(resolver_as_of(as_of)).normalize()
+    cacheados = store.derivado("scoring_pagos", ["facturas_emitidas"], lambda: MemoAcotada(MAX_DIAS_MEMO))
+
+    def construir():
+        facturas = store.get("facturas_emitidas")
+        with _lock_ultimos:
+            anterior = _ultimos.get(store)
+        if anterior is not None and anterior.as_of == dia:
+            nuevo = anterior.sincronizar(facturas)
+        else:
+            nuevo = ScoringPagos(facturas, dia)
+        with _lock_ultimos:
+            _ultimos[store] = nuevo
+        return nuevo
+    return cacheados.obtener(dia, construir)
@@ -126,13 +126,6 @@ for _, r in df_residencias.iterrows():
     })
 df_deuda = pd.DataFrame(deudas)
 
-df_kpis = pd.DataFrame([
-    {'nombre': 'Ocupación media', 'valor': 98.5, 'objetivo': 95.0, 'unidad': '%'},
-    {'nombre': 'Tasa de morosidad', 'valor': 5.0, 'objetivo': 2.0, 'unidad': '%'},
-    {'nombre': 'DSO', 'valor': 35.5, 'objetivo': 30.0, 'unidad': 'días'},
-    {'nombre': 'EBITDA', 'valor': 3200000.0, 'objetivo': 3000000.0, 'unidad': '€'}
-])
-
 df_gastos = pd.DataFrame([{'concepto': 'Personal', 'categoria': 'RRHH', 'importe_mensual': 150000.0, 'periodicidad': 'mensual'}])
 df_mant = pd.DataFrame([{'id': 'M-01', 'activo': 'Residencia Sol', 'tipo': 'Prev', 'descripcion': 'Ascensor', 'proximo_mantenimiento': datetime(2025,6,15), 'coste_estimado': 500.0, 'proveedor': 'Otis'}])
 df_pagos = pd.DataFrame([{'id': 'P-01', 'proveedor': 'Iberdrola', 'concepto': 'Luz', 'importe': 4500.0, 'fecha_vencimiento': datetime(2026,1,15), 'prioridad': 'Alta'}])
@@ -142,7 +135,21 @@ df_balance = pd.DataFrame([{'cuenta': 'Activo', 'tipo': 'Act', 'importe': 350000
 df_pnl = pd.DataFrame([{'concepto': 'Ventas', 'tipo': 'Ing', 'importe': 10500000.0}])
 df_iva_r = pd.DataFrame([{'concepto': 'Alquiler', 'base': 10000000.0, 'tipo': 10.0, 'cuota': 1000000.0}])
 df_iva_s = pd.DataFrame([{'concepto': 'Gastos', 'base': 5000000.0, 'tipo': 21.0, 'cuota': 1050000.0}])
-df_desv = pd.DataFrame([{'concepto': 'Ventas', 'presupuesto': 10000000.0, 'real': 10500000.0}])
+
+# E. Presupuesto por residencia y mes (90% de ocupación, +3% de precio desde septiembre)
+OCUPACION_PRESUPUESTO = 0.9
+SUBIDA_PRECIO_CURSO = 0.03
+GASTOS_PRESUPUESTO_MES = 145000.0
+presupuesto = []
+for _, r in df_residencias.iterrows():
+    for mes in range(1, 13):
+        presupuesto.append({
+            'residencia': r['nombre'], 'mes': f'{ANIO_FISCAL}-{mes:02d}',
+            'plazas': float(round(r['capacidad'] * OCUPACION_PRESUPUESTO)),
+            'precio': round(r['precio_base'] * (1 + SUBIDA_PRECIO_CURSO if mes >= 9 else 1), 2),
+            'gastos': round(GASTOS_PRESUPUESTO_MES * r['capacidad'] / df_residencias['capacidad'].sum(), 2)
+        })
+df_presupuesto = pd.DataFrame(presupuesto)
 
 # --- 3. EXPORTACIÓN DOBLE VÍA ---
 
@@ -153,7 +160,6 @@ archivos = {
     'activos_fijos.csv': df_activos,
     'deuda_bancaria.csv': df_deuda,
     'gastos_fijos.csv': df_gastos,
-    'kpis.csv': df_kpis,
     'mantenimientos.csv': df_mant,
     'pagos_pendientes.csv': df_pagos,
     'obligaciones_fiscales.csv': df_fiscal,
@@ -162,7 +168,7 @@ archivos = {
     'cuenta_resultados.csv': df_pnl,
     'iva_repercutido.csv': df_iva_r,
     'iva_soportado.csv': df_iva_s,
-    'desviaciones.csv': df_desv
+    'presupuesto.csv': df_presupuesto
 }
 
 print("\n--- Guardando Archivos ---")
@@ -182,4 +188,5 @@ for nombre, df in archivos.items():
     print(f"✅ {nombre}: Guardado en ambas carpetas.")
 
 print(f"\n🎉 ¡LISTO! \n👉 Usa los archivos de '{DIR_AGENTES}' para tus agentes de IA.")
-print(f"👉 Usa los archivos de '{DIR_EXCEL}' para abrir en tu Excel.")
\ No newline at end of file
+print(f"👉 Usa los archivos de '{DIR_EXCEL}' para abrir en tu Excel.")
+print("👉 Opcional: ejecuta 'python -m datastore snapshots' para precompilar los snapshots columnares.")
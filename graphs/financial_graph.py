@@ -1,17 +1,31 @@
 """
 Grafo LangGraph FINAL - Optimizado para Qwen 2.5 (7b)
 Incluye logs detallados, detección de rutas robusta y protección contra bucles.
+
+El grafo, el LLM base y los LLMs de cada agente (con sus herramientas ya
+vinculadas) se construyen una sola vez al arrancar y se comparten entre
+consultas, hilos y sesiones de Streamlit. Las herramientas de cada agente
+(incluidas las de RAG y MCP) salen de un registro inmutable (TOOL_REGISTRY)
+con los esquemas JSON ya calculados, y las llamadas de un mismo turno se
+ejecutan en paralelo en pools acotados (uno aparte para las herramientas
+lentas), con un máximo de llamadas simultáneas por turno.
 """
 
-from typing import TypedDict, Annotated
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from types import MappingProxyType
+from typing import TypedDict, Annotated, Mapping
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage
+from langchain_core.utils.function_calling import convert_to_openai_tool
 from langchain_ollama import ChatOllama
 from langgraph.graph import StateGraph, END
+import contextvars
 import operator
 import os
 import sys
 import json
 import re
+import threading
+import time
 
 # ============================================
 # 1. CONFIGURACIÓN
@@ -20,6 +34,14 @@ import re
 # Usamos el modelo 7b que es más rápido y estable en local
 MODEL_NAME = "qwen2.5:7b" 
 
+# Ejecución de herramientas: hilos compartidos por todas las consultas y tiempo máximo por llamada (s)
+MAX_TOOL_WORKERS = 8
+MAX_LONG_TOOL_WORKERS = 2                 # Pool aparte para las herramientas de TOOL_TIMEOUTS
+MAX_TOOLS_PER_TURN = 4                    # Llamadas de un mismo turno en curso a la vez
+TOOL_TIMEOUT = 60                         # Desde que la llamada empieza a ejecutarse
+TOOL_TIMEOUTS = {"estres_liquidez": 180}  # Excepciones por herramienta (lentas)
+TOOL_QUEUE_TIMEOUT = 30                   # Espera máxima en cola antes de empezar
+
 print("\n" + "="*50)
 print(f"🚀 INICIANDO SISTEMA FINANCIERO ({MODEL_NAME})")
 print("="*50)
@@ -129,32 +151,162 @@ class AgentState(TypedDict):
     current_agent: str
     next_agent: str | None
 
+# LLM base y grafo compilado compartidos (se crean una sola vez)
+_base_llm = None
+_graph = None
+_build_lock = threading.RLock()
+
 def get_base_llm():
-    """Devuelve un LLM limpio sin herramientas (para pensar rápido)."""
-    return ChatOllama(model=MODEL_NAME, temperature=0)
+    """Devuelve el LLM limpio sin herramientas (para pensar rápido), compartido por todos los agentes."""
+    global _base_llm
+    if _base_llm is None:
+        with _build_lock:
+            if _base_llm is None:
+                _base_llm = ChatOllama(model=MODEL_NAME, temperature=0)
+    return _base_llm
+
+def get_agent_tools(agent_key: str) -> list:
+    """Herramientas del agente más las capacidades extra (RAG/MCP) según su rol."""
+    tools = list(get_tools_for_agent(agent_key))
+    
+    # Inyección de capacidades extra según rol
+    if RAG_AVAILABLE and agent_key in ["fiscalista", "director_financiero", "controller"]:
+        tools += RAG_TOOLS
+    if MCP_AVAILABLE:
+        if agent_key == "tesorero": tools += MCP_FINANCIAL_TOOLS
+        if agent_key == "ar_manager": tools += MCP_COLLECTIONS_TOOLS
+        if agent_key == "director_financiero": 
+            tools += MCP_FINANCIAL_TOOLS + MCP_COLLECTIONS_TOOLS + THIRD_PARTY_MCP_TOOLS
+    return tools
+
+class AgentToolset:
+    """
+    Herramientas de un agente, fijadas al arrancar: sin duplicados (por
+    nombre, se queda la primera), con índice nombre -> herramienta y los
+    esquemas JSON que se envían al LLM ya calculados.
+    """
+    __slots__ = ("agent_key", "tools", "by_name", "schemas")
+
+    def __init__(self, agent_key: str, tools: list):
+        unique = {}
+        for t in tools:
+            unique.setdefault(t.name, t)
+        self.agent_key = agent_key
+        self.tools = tuple(unique.values())
+        self.by_name = MappingProxyType(unique)
+        self.schemas = tuple(convert_to_openai_tool(t) for t in self.tools)
+
+    def get(self, name: str):
+        """Herramienta por nombre (None si el agente no la tiene)."""
+        return self.by_name.get(name)
+
+    def __len__(self) -> int:
+        return len(self.tools)
+
+def build_tool_registry() -> Mapping[str, AgentToolset]:
+    """Registro de solo lectura con el toolset de cada agente."""
+    return MappingProxyType({key: AgentToolset(key, get_agent_tools(key)) for key in AGENT_CONFIG})
+
+TOOL_REGISTRY = build_tool_registry()
+print("✅ [OK] Registro de herramientas: " + ", ".join(f"{k}={len(v)}" for k, v in TOOL_REGISTRY.items()))
+
+# Un hilo que agota su tiempo no se puede interrumpir: las herramientas lentas
+# van a su propio pool para que no dejen sin hilos al resto de sesiones
+_tool_pool = ThreadPoolExecutor(max_workers=MAX_TOOL_WORKERS, thread_name_prefix="herramientas")
+_long_tool_pool = ThreadPoolExecutor(max_workers=MAX_LONG_TOOL_WORKERS, thread_name_prefix="herramientas-lentas")
+
+class ToolCallTimeout(Exception):
+    """La llamada no terminó a tiempo (o no llegó a empezar)."""
+
+class ToolCall:
+    """
+    Llamada a una herramienta en el pool. El tiempo máximo cuenta desde que
+    un hilo la empieza a ejecutar, no desde que se encola.
+    """
+    __slots__ = ("name", "timeout", "future", "started", "started_at")
+
+    def __init__(self, name: str, tool, args: dict):
+        self.name = name
+        self.timeout = TOOL_TIMEOUTS.get(name, TOOL_TIMEOUT)
+        self.started = threading.Event()
+        self.started_at = None
+        pool = _long_tool_pool if name in TOOL_TIMEOUTS else _tool_pool
+        self.future = pool.submit(self._run, contextvars.copy_context(), tool, args)
+
+    def _run(self, context: contextvars.Context, tool, args: dict):
+        self.started_at = time.monotonic()
+        self.started.set()
+        return context.run(tool.invoke, args)
+
+    def result(self):
+        """Resultado de la herramienta; ToolCallTimeout si no empieza o no termina a tiempo."""
+        if not self.started.wait(TOOL_QUEUE_TIMEOUT) and self.future.cancel():
+            raise ToolCallTimeout(f"no se pudo ejecutar, herramientas ocupadas durante {TOOL_QUEUE_TIMEOUT} s")
+        self.started.wait()  # Si no se pudo cancelar es que acaba de empezar
+        try:
+            return self.future.result(timeout=max(self.started_at + self.timeout - time.monotonic(), 0))
+        except FuturesTimeoutError:
+            raise ToolCallTimeout(f"sin respuesta tras {self.timeout} s") from None
+
+def run_tool_calls(toolset: AgentToolset, tool_calls: list) -> str:
+    """
+    Ejecuta a la vez las llamadas a herramientas de un turno (como mucho
+    MAX_TOOLS_PER_TURN en curso) y devuelve sus resultados en el orden en que
+    las pidió el LLM. Cada llamada corre con una copia del contexto del
+    agente (p. ej. el reloj fijado) y tiene su tiempo máximo (TOOL_TIMEOUTS o
+    TOOL_TIMEOUT) desde que empieza; si no llega a empezar en
+    TOOL_QUEUE_TIMEOUT se descarta.
+    """
+    # Buscar la función real
+    pending = []
+    for call in tool_calls:
+        t_name = call.get('name')
+        selected = toolset.get(t_name)
+        if selected:
+            pending.append((t_name, selected, call.get('args', {})))
+    pending.reverse()
+
+    def launch():
+        t_name, selected, t_args = pending.pop()
+        print(f"      > Ejecutando: {t_name}")
+        return ToolCall(t_name, selected, t_args)
+
+    running = [launch() for _ in range(min(MAX_TOOLS_PER_TURN, len(pending)))]
+    tool_results_txt = ""
+    for i in range(len(running) + len(pending)):
+        call = running[i]
+        try:
+            output = call.result()
+            
+            # Limitar tamaño para no saturar al 7b
+            str_out = str(output)
+            if len(str_out) > 3000: 
+                str_out = str_out[:3000] + "...[truncado por longitud]"
+            
+            tool_results_txt += f"\n--- Resultado de {call.name} ---\n{str_out}\n"
+        except ToolCallTimeout as e:
+            print(f"      ⏱️ Tiempo agotado en herramienta: {call.name}")
+            tool_results_txt += f"\nError en {call.name}: {e}\n"
+        except Exception as e:
+            print(f"      ❌ Error en herramienta: {e}")
+            tool_results_txt += f"\nError en {call.name}: {e}\n"
+        # La llamada ya no ocupa hueco en el turno (aunque siga en su hilo si agotó el tiempo)
+        if pending:
+            running.append(launch())
+    return tool_results_txt
 
 def create_agent_node(agent_key: str):
+    # Se prepara una vez al construir el grafo, no en cada consulta
+    config = AGENT_CONFIG[agent_key]
+    base_llm = get_base_llm()
+    
+    # 1. Herramientas del registro y esquemas ya serializados vinculados al LLM
+    toolset = TOOL_REGISTRY[agent_key]
+    llm_with_tools = base_llm.bind_tools(list(toolset.schemas))
+    
     def agent_node(state: AgentState) -> dict:
         print(f"\n🔵 Agente activo: {agent_key}")
         
-        config = AGENT_CONFIG[agent_key]
-        base_llm = get_base_llm()
-        
-        # 1. Preparar herramientas
-        tools = get_tools_for_agent(agent_key)
-        
-        # Inyección de capacidades extra según rol
-        if RAG_AVAILABLE and agent_key in ["fiscalista", "director_financiero", "controller"]:
-            tools += RAG_TOOLS
-        if MCP_AVAILABLE:
-            if agent_key == "tesorero": tools += MCP_FINANCIAL_TOOLS
-            if agent_key == "ar_manager": tools += MCP_COLLECTIONS_TOOLS
-            if agent_key == "director_financiero": 
-                tools += MCP_FINANCIAL_TOOLS + MCP_COLLECTIONS_TOOLS + THIRD_PARTY_MCP_TOOLS
-        
-        # Vincular herramientas al LLM
-        llm_with_tools = base_llm.bind_tools(tools)
-        
         messages = [SystemMessage(content=config["system_prompt"])] + state["messages"]
         
         # 2. INVOCACIÓN AL MODELO (PENSAMIENTO)
@@ -185,26 +337,7 @@ def create_agent_node(agent_key: str):
         tool_results_txt = ""
         if tool_calls:
             print(f"   🛠️ Ejecutando {len(tool_calls)} herramientas...")
-            for call in tool_calls:
-                t_name = call.get('name')
-                t_args = call.get('args', {})
-                
-                # Buscar la función real
-                selected = next((t for t in tools if t.name == t_name), None)
-                if selected:
-                    try:
-                        print(f"      > Ejecutando: {t_name}")
-                        output = selected.invoke(t_args)
-                        
-                        # Limitar tamaño para no saturar al 7b
-                        str_out = str(output)
-                        if len(str_out) > 3000: 
-                            str_out = str_out[:3000] + "...[truncado por longitud]"
-                        
-                        tool_results_txt += f"\n--- Resultado de {t_name} ---\n{str_out}\n"
-                    except Exception as e:
-                        print(f"      ❌ Error en herramienta: {e}")
-                        tool_results_txt += f"\nError en {t_name}: {e}\n"
+            tool_results_txt = run_tool_calls(toolset, tool_calls)
         
         # 5. SÍNTESIS FINAL (RESUMEN)
         if tool_results_txt:
@@ -304,9 +437,18 @@ def build_graph():
     
     return wf.compile()
 
+def get_graph():
+    """Grafo compilado compartido. Sin checkpointer no guarda estado, así que admite invocaciones concurrentes."""
+    global _graph
+    if _graph is None:
+        with _build_lock:
+            if _graph is None:
+                _graph = build_graph()
+    return _graph
+
 def run_agent_query(query: str, forced_agent: str = None):
     try:
-        app = build_graph()
+        app = get_graph()
         inputs = {
             "messages": [HumanMessage(content=query)], 
             "current_agent": "", 
@@ -329,4 +471,12 @@ def run_agent_query(query: str, forced_agent: str = None):
         
     except Exception as e:
         print(f"❌ ERROR CRÍTICO EN GRAFO: {e}")
-        return f"Ocurrió un error en el sistema: {str(e)}", "Error de Sistema", "❌"
\ No newline at end of file
+        return f"Ocurrió un error en el sistema: {str(e)}", "Error de Sistema", "❌"
+
+
+# Compilación al arrancar: las consultas reutilizan el grafo y los LLMs ya preparados
+try:
+    get_graph()
+    print("✅ [OK] Grafo compilado")
+except Exception as e:
+    print(f"⚠️ [WARN] Grafo no compilado al arrancar ({e}); se compilará en la primera consulta")
@@ -5,23 +5,34 @@ Proporciona acceso a datos de facturación, morosos y estudiantes mediante MCP.
 
 import json
 import os
+import sys
 import pandas as pd
-from datetime import datetime
 from typing import Any, Dict, List
 from mcp.server import Server
 from mcp.server.stdio import stdio_server
 from mcp.types import Tool, TextContent
 
-# Configuración
-DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+# Asegurar que la raíz del proyecto está en el path (el servidor se lanza como script)
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from datastore import data_store, a_registros, indice_estudiantes, buscar_facturas, resolver_as_of, resumen_cobros, fila_estudiante
+from engines import calcular_aging, ranking_morosos, scoring_pagos
 
 # Crear servidor MCP
 server = Server("collections-management-server")
 
+# Argumento común de las herramientas que dependen de la fecha
+PROPIEDAD_AS_OF = {
+    "type": "string",
+    "description": "Fecha de análisis YYYY-MM-DD (opcional, por defecto hoy)"
+}
+
 
 def load_csv(filename: str) -> pd.DataFrame:
-    """Carga un archivo CSV."""
-    return pd.read_csv(os.path.join(DATA_PATH, filename))
+    """Obtiene un dataset del DataStore compartido (sin releer el CSV)."""
+    return data_store.get(filename)
 
 
 # ============================================
@@ -60,7 +71,16 @@ async def list_tools() -> List[Tool]:
                     "min_days": {
                         "type": "integer",
                         "description": "Días mínimos de retraso (default: 1)"
-                    }
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": "Máximo de morosos devueltos, de mayor a menor deuda (default: 20)"
+                    },
+                    "offset": {
+                        "type": "integer",
+                        "description": "Morosos que se saltan, para paginar (default: 0)"
+                    },
+                    "as_of": PROPIEDAD_AS_OF
                 },
                 "required": []
             }
@@ -84,7 +104,9 @@ async def list_tools() -> List[Tool]:
             description="Genera el aging report de cuentas por cobrar",
             inputSchema={
                 "type": "object",
-                "properties": {},
+                "properties": {
+                    "as_of": PROPIEDAD_AS_OF
+                },
                 "required": []
             }
         ),
@@ -97,7 +119,8 @@ async def list_tools() -> List[Tool]:
                     "days": {
                         "type": "integer",
                         "description": "Días hacia adelante (default: 30)"
-                    }
+                    },
+                    "as_of": PROPIEDAD_AS_OF
                 },
                 "required": []
             }
@@ -119,107 +142,70 @@ async def call_tool(name: str, arguments: Dict[str, Any]) -> List[TextContent]:
     """Ejecuta una herramienta del servidor MCP."""
     
     try:
+        as_of = resolver_as_of(arguments.get("as_of"))
+        
         if name == "get_invoices":
-            df = load_csv("facturas_emitidas.csv")
             status = arguments.get("status", "todas")
             residence = arguments.get("residence")
             
-            if status != "todas":
-                df = df[df["estado"] == status]
-            if residence:
-                df = df[df["residencia"].str.contains(residence, case=False, na=False)]
+            num_facturas, importe_total, df = buscar_facturas(status, residence)
             
             result = {
-                "total_facturas": len(df),
-                "importe_total": df["importe"].sum(),
-                "facturas": df.to_dict(orient="records")
+                "total_facturas": num_facturas,
+                "importe_total": importe_total,
+                "facturas": a_registros(df)
             }
             
         elif name == "get_defaulters":
             min_days = arguments.get("min_days", 1)
-            facturas = load_csv("facturas_emitidas.csv")
-            estudiantes = load_csv("estudiantes.csv")
+            limit = arguments.get("limit", 20)
+            offset = arguments.get("offset", 0)
+            ranking = ranking_morosos(dias_minimo=min_days, as_of=as_of)
             
-            vencidas = facturas[facturas["estado"] == "vencida"].copy()
-            vencidas["fecha_vencimiento"] = pd.to_datetime(vencidas["fecha_vencimiento"])
-            vencidas["dias_retraso"] = (datetime.now() - vencidas["fecha_vencimiento"]).dt.days
-            vencidas = vencidas[vencidas["dias_retraso"] >= min_days]
-            
-            if vencidas.empty:
-                result = {"total_morosos": 0, "deuda_total": 0, "morosos": []}
-            else:
-                morosos = vencidas.groupby("id_estudiante").agg({
-                    "importe": "sum",
-                    "id_factura": "count",
-                    "dias_retraso": "max"
-                }).reset_index()
-                morosos.columns = ["id_estudiante", "deuda_total", "num_facturas", "max_dias_retraso"]
-                morosos = morosos.merge(estudiantes, on="id_estudiante", how="left")
-                
-                result = {
-                    "total_morosos": len(morosos),
-                    "deuda_total": morosos["deuda_total"].sum(),
-                    "morosos": morosos.to_dict(orient="records")
-                }
+            result = {
+                "as_of": as_of.isoformat(),
+                "total_morosos": ranking.total_morosos,
+                "deuda_total": ranking.deuda_total,
+                "offset": offset,
+                "siguiente_offset": offset + limit if ranking.hay_mas(limit, offset) else None,
+                "morosos": a_registros(scoring_pagos(as_of).anotar(ranking.pagina(limit, offset)))
+            }
             
         elif name == "get_student_info":
             student_id = arguments.get("student_id", "").upper()
-            estudiantes = load_csv("estudiantes.csv")
-            facturas = load_csv("facturas_emitidas.csv")
-            
-            est = estudiantes[estudiantes["id_estudiante"] == student_id]
+            est = fila_estudiante(student_id)
             if est.empty:
                 result = {"error": f"Estudiante {student_id} no encontrado"}
             else:
-                est = est.iloc[0].to_dict()
-                fact_est = facturas[facturas["id_estudiante"] == student_id]
-                est["facturas"] = fact_est.to_dict(orient="records")
-                est["total_pagado"] = fact_est[fact_est["estado"] == "pagada"]["importe"].sum()
-                est["total_pendiente"] = fact_est[fact_est["estado"] == "pendiente"]["importe"].sum()
-                est["total_vencido"] = fact_est[fact_est["estado"] == "vencida"]["importe"].sum()
+                est = a_registros(est)[0]
+                indice = indice_estudiantes()
+                totales = indice.totales(student_id)
+                est["facturas"] = a_registros(indice.facturas_de(student_id))
+                est["total_pagado"] = totales["pagado"]
+                est["total_pendiente"] = totales["pendiente"]
+                est["total_vencido"] = totales["vencido"]
                 result = est
             
         elif name == "get_aging_report":
-            facturas = load_csv("facturas_emitidas.csv")
-            pendientes = facturas[facturas["estado"].isin(["pendiente", "vencida"])].copy()
-            pendientes["fecha_vencimiento"] = pd.to_datetime(pendientes["fecha_vencimiento"])
-            pendientes["dias"] = (datetime.now() - pendientes["fecha_vencimiento"]).dt.days
-            
-            def clasificar(dias):
-                if dias <= 0: return "no_vencido"
-                elif dias <= 30: return "1-30_dias"
-                elif dias <= 60: return "31-60_dias"
-                elif dias <= 90: return "61-90_dias"
-                return "mas_90_dias"
-            
-            pendientes["tramo"] = pendientes["dias"].apply(clasificar)
-            aging = pendientes.groupby("tramo").agg({
-                "importe": "sum",
-                "id_factura": "count"
-            }).reset_index()
-            aging.columns = ["tramo", "importe", "num_facturas"]
+            aging = calcular_aging(as_of)
             
             result = {
-                "total_pendiente": pendientes["importe"].sum(),
-                "total_facturas": len(pendientes),
-                "tramos": aging.to_dict(orient="records")
+                "as_of": as_of.isoformat(),
+                "total_pendiente": aging.total_importe,
+                "total_facturas": aging.total_facturas,
+                "tramos": a_registros(aging.presentes()[["tramo", "importe", "num_facturas"]])
             }
             
         elif name == "get_collection_forecast":
             days = arguments.get("days", 30)
-            facturas = load_csv("facturas_emitidas.csv")
-            pendientes = facturas[facturas["estado"] == "pendiente"].copy()
-            pendientes["fecha_vencimiento"] = pd.to_datetime(pendientes["fecha_vencimiento"])
-            
-            from datetime import timedelta
-            limite = datetime.now() + timedelta(days=days)
-            proximos = pendientes[pendientes["fecha_vencimiento"] <= limite]
+            resumen = resumen_cobros(horizonte_dias=days, ahora=as_of)
             
             result = {
+                "as_of": as_of.isoformat(),
                 "dias": days,
-                "total_previsto": proximos["importe"].sum(),
-                "num_facturas": len(proximos),
-                "cobros": proximos.to_dict(orient="records")
+                "total_previsto": resumen.importe_previsto,
+                "num_facturas": resumen.num_previstos,
+                "cobros": a_registros(resumen.cobros())
             }
             
         elif name == "get_occupancy":
@@ -231,7 +217,7 @@ async def call_tool(name: str, arguments: Dict[str, Any]) -> List[TextContent]:
                 "ocupacion_media": round((total_ocu / total_cap * 100) if total_cap > 0 else 0, 1),
                 "total_capacidad": total_cap,
                 "total_ocupadas": total_ocu,
-                "residencias": df.to_dict(orient="records")
+                "residencias": a_registros(df)
             }
             
         else:
@@ -245,6 +231,8 @@ async def call_tool(name: str, arguments: Dict[str, Any]) -> List[TextContent]:
 
 async def main():
     """Ejecuta el servidor MCP."""
+    # Las caches del DataStore se invalidan solo cuando cambia data/
+    data_store.versiones.vigilar()
     async with stdio_server() as (read_stream, write_stream):
         await server.run(read_stream, write_stream, server.create_initialization_options())
 
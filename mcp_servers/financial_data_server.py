@@ -5,23 +5,36 @@ Proporciona acceso a datos financieros de la empresa mediante el protocolo MCP.
 
 import json
 import os
+import sys
 import pandas as pd
-from datetime import datetime
+from datetime import timedelta
 from typing import Any, Dict, List
 from mcp.server import Server
 from mcp.server.stdio import stdio_server
 from mcp.types import Tool, TextContent
 
-# Configuración
-DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+# Asegurar que la raíz del proyecto está en el path (el servidor se lanza como script)
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from datastore import data_store, a_registros, ahora, resolver_as_of
+from engines import proyectar_caja, cuadro_amortizacion
+from agents.tools.web_tools import DATOS_MERCADO
 
 # Crear servidor MCP
 server = Server("financial-data-server")
 
+# Argumento común de las herramientas que dependen de la fecha
+PROPIEDAD_AS_OF = {
+    "type": "string",
+    "description": "Fecha de análisis YYYY-MM-DD (opcional, por defecto hoy)"
+}
+
 
 def load_csv(filename: str) -> pd.DataFrame:
-    """Carga un archivo CSV."""
-    return pd.read_csv(os.path.join(DATA_PATH, filename))
+    """Obtiene un dataset del DataStore compartido (sin releer el CSV)."""
+    return data_store.get(filename)
 
 
 # ============================================
@@ -50,7 +63,8 @@ async def list_tools() -> List[Tool]:
                     "days": {
                         "type": "integer",
                         "description": "Días hacia adelante para buscar (default: 30)"
-                    }
+                    },
+                    "as_of": PROPIEDAD_AS_OF
                 },
                 "required": []
             }
@@ -60,7 +74,9 @@ async def list_tools() -> List[Tool]:
             description="Obtiene el detalle de la deuda bancaria",
             inputSchema={
                 "type": "object",
-                "properties": {},
+                "properties": {
+                    "as_of": PROPIEDAD_AS_OF
+                },
                 "required": []
             }
         ),
@@ -90,6 +106,21 @@ async def list_tools() -> List[Tool]:
                 "properties": {},
                 "required": []
             }
+        ),
+        Tool(
+            name="get_cash_flow_projection",
+            description="Proyección diaria de caja: cobros previstos, pagos, gastos fijos y cuotas de deuda",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "days": {
+                        "type": "integer",
+                        "description": "Horizonte en días (default: 90)"
+                    },
+                    "as_of": PROPIEDAD_AS_OF
+                },
+                "required": []
+            }
         )
     ]
 
@@ -99,60 +130,68 @@ async def call_tool(name: str, arguments: Dict[str, Any]) -> List[TextContent]:
     """Ejecuta una herramienta del servidor MCP."""
     
     try:
+        as_of = resolver_as_of(arguments.get("as_of"))
+        
         if name == "get_cash_position":
             df = load_csv("posicion_caja.csv")
             total = df["saldo"].sum()
             result = {
-                "fecha": datetime.now().isoformat(),
+                "fecha": ahora().isoformat(),
                 "saldo_total": total,
-                "cuentas": df.to_dict(orient="records")
+                "cuentas": a_registros(df)
             }
             
         elif name == "get_pending_payments":
             days = arguments.get("days", 30)
             df = load_csv("pagos_pendientes.csv")
-            df["fecha_vencimiento"] = pd.to_datetime(df["fecha_vencimiento"])
-            from datetime import timedelta
-            limite = datetime.now() + timedelta(days=days)
+            limite = as_of + timedelta(days=days)
             df = df[df["fecha_vencimiento"] <= limite]
             result = {
+                "as_of": as_of.isoformat(),
                 "dias": days,
                 "total": df["importe"].sum(),
                 "num_pagos": len(df),
-                "pagos": df.to_dict(orient="records")
+                "pagos": a_registros(df)
             }
             
         elif name == "get_bank_debt":
-            df = load_csv("deuda_bancaria.csv")
+            cuadro = cuadro_amortizacion(as_of)
+            df = cuadro.prestamos
             result = {
+                "as_of": as_of.isoformat(),
                 "deuda_total": df["capital_pendiente"].sum(),
                 "cuota_mensual_total": df["cuota_mensual"].sum(),
-                "prestamos": df.to_dict(orient="records")
+                "cuota_calculada_total": df["cuota_calculada"].sum(),
+                "intereses_pendientes": df["intereses_pendientes"].sum(),
+                "modalidad_informada": cuadro.modalidad_informada,
+                "prestamos_variables": int(df["variable"].sum()),
+                "sensibilidad_euribor": a_registros(cuadro.rejilla_euribor(DATOS_MERCADO["euribor"])),
+                "prestamos": a_registros(df)
             }
             
         elif name == "get_balance_sheet":
             df = load_csv("balance.csv")
-            activo = df[df["tipo"] == "activo"]["importe"].sum()
-            pasivo = df[df["tipo"] == "pasivo"]["importe"].sum()
-            patrimonio = df[df["tipo"] == "patrimonio"]["importe"].sum()
+            activo = df[df["tipo_norm"] == "activo"]["importe"].sum()
+            pasivo = df[df["tipo_norm"] == "pasivo"]["importe"].sum()
+            patrimonio = df[df["tipo_norm"] == "patrimonio"]["importe"].sum()
             result = {
-                "fecha": datetime.now().isoformat(),
+                "fecha": ahora().isoformat(),
                 "activo_total": activo,
                 "pasivo_total": pasivo,
                 "patrimonio_neto": patrimonio,
-                "detalle": df.to_dict(orient="records")
+                "detalle": a_registros(df)
             }
             
         elif name == "get_income_statement":
             df = load_csv("cuenta_resultados.csv")
-            ingresos = df[df["tipo"] == "ingreso"]["importe"].sum()
-            gastos = df[df["tipo"] == "gasto"]["importe"].sum()
+            ingresos = df[df["tipo_norm"] == "ingreso"]["importe"].sum()
+            gastos = df[df["tipo_norm"] == "gasto"]["importe"].sum()
             result = {
                 "ingresos_totales": ingresos,
                 "gastos_totales": gastos,
                 "resultado_neto": ingresos - gastos,
                 "margen_porcentaje": ((ingresos - gastos) / ingresos * 100) if ingresos > 0 else 0,
-                "detalle": df.to_dict(orient="records")
+                "detalle": a_registros(df)
             }
             
         elif name == "calculate_liquidity_ratio":
@@ -168,6 +207,11 @@ async def call_tool(name: str, arguments: Dict[str, Any]) -> List[TextContent]:
                 "estado": "OPTIMO" if meses >= 4 else "ACEPTABLE" if meses >= 2 else "CRITICO"
             }
             
+        elif name == "get_cash_flow_projection":
+            days = arguments.get("days", 90)
+            proyeccion = proyectar_caja(horizonte_dias=days, as_of=as_of)
+            result = {"as_of": as_of.isoformat(), "dias": days, **proyeccion.resumen("W" if days <= 92 else "M")}
+            
         else:
             return [TextContent(type="text", text=f"Herramienta no encontrada: {name}")]
         
@@ -179,6 +223,8 @@ async def call_tool(name: str, arguments: Dict[str, Any]) -> List[TextContent]:
 
 async def main():
     """Ejecuta el servidor MCP."""
+    # Las caches del DataStore se invalidan solo cuando cambia data/
+    data_store.versiones.vigilar()
     async with stdio_server() as (read_stream, write_stream):
         await server.run(read_stream, write_stream, server.create_initialization_options())
 
@@ -6,19 +6,26 @@ Incluye datos de mercado (tipos de interés, indicadores).
 """
 
 import os
+import sys
 import json
 import pandas as pd
-from datetime import datetime, timedelta
 from typing import Dict, Any
 from langchain_core.tools import tool
 
-# Ruta a los datos
-DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+# Asegurar que la raíz del proyecto está en el path
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from datastore import (data_store, a_registros, ahora, cachear_herramientas, indice_estudiantes, resolver_as_of,
+                       resumen_cobros, fila_estudiante)
+from engines import calcular_aging, ranking_morosos, proyectar_caja, cuadro_amortizacion, scoring_pagos
+from agents.tools.web_tools import DATOS_MERCADO
 
 
 def load_csv(filename: str) -> pd.DataFrame:
-    """Carga un archivo CSV."""
-    return pd.read_csv(os.path.join(DATA_PATH, filename))
+    """Obtiene un dataset del DataStore compartido (sin releer el CSV)."""
+    return data_store.get(filename)
 
 
 def formato_euro(valor):
@@ -51,9 +58,9 @@ def mcp_get_cash_position() -> str:
         result = {
             "servidor": "MCP Financial Data Server",
             "herramienta": "get_cash_position",
-            "fecha": datetime.now().isoformat(),
+            "fecha": ahora().date().isoformat(),
             "saldo_total": float(total),
-            "cuentas": df.to_dict(orient="records")
+            "cuentas": a_registros(df)
         }
         return json.dumps(result, indent=2, default=str)
     except Exception as e:
@@ -61,22 +68,34 @@ def mcp_get_cash_position() -> str:
 
 
 @tool
-def mcp_get_bank_debt() -> str:
+def mcp_get_bank_debt(as_of: str = "") -> str:
     """
     [MCP Financial] Obtiene el detalle de la deuda bancaria.
     Herramienta del servidor MCP de datos financieros.
     
+    Args:
+        as_of: Fecha de análisis YYYY-MM-DD (opcional, por defecto hoy)
+    
     Returns:
-        JSON con préstamos, capital pendiente y cuotas
+        JSON con préstamos, capital pendiente, cuotas, intereses pendientes
+        y sensibilidad de la cuota a shocks del Euribor
     """
     try:
-        df = load_csv("deuda_bancaria.csv")
+        hoy = resolver_as_of(as_of)
+        cuadro = cuadro_amortizacion(hoy)
+        df = cuadro.prestamos
         result = {
             "servidor": "MCP Financial Data Server",
             "herramienta": "get_bank_debt",
+            "as_of": hoy.date().isoformat(),
             "deuda_total": float(df["capital_pendiente"].sum()),
             "cuota_mensual_total": float(df["cuota_mensual"].sum()),
-            "prestamos": df.to_dict(orient="records")
+            "cuota_calculada_total": float(df["cuota_calculada"].sum()),
+            "intereses_pendientes": float(df["intereses_pendientes"].sum()),
+            "modalidad_informada": cuadro.modalidad_informada,
+            "prestamos_variables": int(df["variable"].sum()),
+            "sensibilidad_euribor": a_registros(cuadro.rejilla_euribor(DATOS_MERCADO["euribor"])),
+            "prestamos": a_registros(df)
         }
         return json.dumps(result, indent=2, default=str)
     except Exception as e:
@@ -94,17 +113,17 @@ def mcp_get_balance_sheet() -> str:
     """
     try:
         df = load_csv("balance.csv")
-        activo = df[df["tipo"] == "activo"]["importe"].sum()
-        pasivo = df[df["tipo"] == "pasivo"]["importe"].sum()
-        patrimonio = df[df["tipo"] == "patrimonio"]["importe"].sum()
+        activo = df[df["tipo_norm"] == "activo"]["importe"].sum()
+        pasivo = df[df["tipo_norm"] == "pasivo"]["importe"].sum()
+        patrimonio = df[df["tipo_norm"] == "patrimonio"]["importe"].sum()
         result = {
             "servidor": "MCP Financial Data Server",
             "herramienta": "get_balance_sheet",
-            "fecha": datetime.now().isoformat(),
+            "fecha": ahora().date().isoformat(),
             "activo_total": float(activo),
             "pasivo_total": float(pasivo),
             "patrimonio_neto": float(patrimonio),
-            "detalle": df.to_dict(orient="records")
+            "detalle": a_registros(df)
         }
         return json.dumps(result, indent=2, default=str)
     except Exception as e:
@@ -139,55 +158,65 @@ def mcp_calculate_liquidity() -> str:
         return json.dumps({"error": str(e)})
 
 
+@tool
+def mcp_get_cash_flow_projection(days: int = 90, as_of: str = "") -> str:
+    """
+    [MCP Financial] Proyección diaria de caja (cobros, pagos, gastos fijos y cuotas de deuda).
+    Herramienta del servidor MCP de datos financieros.
+    
+    Args:
+        days: Horizonte de la proyección en días (default: 90)
+        as_of: Fecha de análisis YYYY-MM-DD (opcional, por defecto hoy)
+    
+    Returns:
+        JSON con saldos inicial, final y mínimo, totales por tipo de flujo y detalle por periodo
+    """
+    try:
+        proyeccion = proyectar_caja(horizonte_dias=days, as_of=resolver_as_of(as_of))
+        result = {
+            "servidor": "MCP Financial Data Server",
+            "herramienta": "get_cash_flow_projection",
+            "dias": days,
+            **proyeccion.resumen("W" if days <= 92 else "M")
+        }
+        return json.dumps(result, indent=2, default=str)
+    except Exception as e:
+        return json.dumps({"error": str(e)})
+
+
 # ============================================
 # MCP COLLECTIONS TOOLS (Servidor 2)
 # ============================================
 
 @tool
-def mcp_get_defaulters(min_days: int = 1) -> str:
+def mcp_get_defaulters(min_days: int = 1, limit: int = 20, offset: int = 0, as_of: str = "") -> str:
     """
     [MCP Collections] Obtiene listado de morosos.
     Herramienta del servidor MCP de gestión de cobros.
     
     Args:
         min_days: Días mínimos de retraso para considerar moroso
+        limit: Número máximo de morosos a devolver, de mayor a menor deuda (default: 20)
+        offset: Morosos que se saltan, para paginar (default: 0)
+        as_of: Fecha de análisis YYYY-MM-DD (opcional, por defecto hoy)
     
     Returns:
-        JSON con lista de morosos y deuda total
+        JSON con la página de morosos (con probabilidad de impago y perfil) y los totales de deuda
     """
     try:
-        facturas = load_csv("facturas_emitidas.csv")
-        estudiantes = load_csv("estudiantes.csv")
+        hoy = resolver_as_of(as_of)
+        ranking = ranking_morosos(dias_minimo=min_days, as_of=hoy)
         
-        vencidas = facturas[facturas["estado"] == "vencida"].copy()
-        vencidas["fecha_vencimiento"] = pd.to_datetime(vencidas["fecha_vencimiento"])
-        vencidas["dias_retraso"] = (datetime.now() - vencidas["fecha_vencimiento"]).dt.days
-        vencidas = vencidas[vencidas["dias_retraso"] >= min_days]
-        
-        if vencidas.empty:
-            result = {
-                "servidor": "MCP Collections Server",
-                "herramienta": "get_defaulters",
-                "total_morosos": 0,
-                "deuda_total": 0,
-                "morosos": []
-            }
-        else:
-            morosos = vencidas.groupby("id_estudiante").agg({
-                "importe": "sum",
-                "id_factura": "count",
-                "dias_retraso": "max"
-            }).reset_index()
-            morosos.columns = ["id_estudiante", "deuda_total", "num_facturas", "max_dias_retraso"]
-            morosos = morosos.merge(estudiantes, on="id_estudiante", how="left")
-            
-            result = {
-                "servidor": "MCP Collections Server",
-                "herramienta": "get_defaulters",
-                "total_morosos": len(morosos),
-                "deuda_total": float(morosos["deuda_total"].sum()),
-                "morosos": morosos.to_dict(orient="records")
-            }
+        result = {
+            "servidor": "MCP Collections Server",
+            "herramienta": "get_defaulters",
+            "as_of": hoy.date().isoformat(),
+            "total_morosos": ranking.total_morosos,
+            "deuda_total": ranking.deuda_total,
+            "offset": offset,
+            "siguiente_offset": offset + limit if ranking.hay_mas(limit, offset) else None,
+            "morosos": a_registros(scoring_pagos(hoy).anotar(ranking.pagina(limit, offset)))
+        }
         
         return json.dumps(result, indent=2, default=str)
     except Exception as e:
@@ -207,24 +236,22 @@ def mcp_get_student_info(student_id: str) -> str:
         JSON con datos del estudiante y su historial de facturas
     """
     try:
-        estudiantes = load_csv("estudiantes.csv")
-        facturas = load_csv("facturas_emitidas.csv")
-        
         student_id = student_id.upper()
-        est = estudiantes[estudiantes["id_estudiante"] == student_id]
+        est = fila_estudiante(student_id)
         
         if est.empty:
             return json.dumps({"error": f"Estudiante {student_id} no encontrado"})
         
-        est_dict = est.iloc[0].to_dict()
-        fact_est = facturas[facturas["id_estudiante"] == student_id]
+        est_dict = a_registros(est)[0]
+        indice = indice_estudiantes()
+        totales = indice.totales(student_id)
         
         est_dict["servidor"] = "MCP Collections Server"
         est_dict["herramienta"] = "get_student_info"
-        est_dict["facturas"] = fact_est.to_dict(orient="records")
-        est_dict["total_pagado"] = float(fact_est[fact_est["estado"] == "pagada"]["importe"].sum())
-        est_dict["total_pendiente"] = float(fact_est[fact_est["estado"] == "pendiente"]["importe"].sum())
-        est_dict["total_vencido"] = float(fact_est[fact_est["estado"] == "vencida"]["importe"].sum())
+        est_dict["facturas"] = a_registros(indice.facturas_de(student_id))
+        est_dict["total_pagado"] = totales["pagado"]
+        est_dict["total_pendiente"] = totales["pendiente"]
+        est_dict["total_vencido"] = totales["vencido"]
         
         return json.dumps(est_dict, indent=2, default=str)
     except Exception as e:
@@ -232,40 +259,27 @@ def mcp_get_student_info(student_id: str) -> str:
 
 
 @tool
-def mcp_get_aging_report() -> str:
+def mcp_get_aging_report(as_of: str = "") -> str:
     """
     [MCP Collections] Genera el aging report de cuentas por cobrar.
     Herramienta del servidor MCP de gestión de cobros.
     
+    Args:
+        as_of: Fecha de análisis YYYY-MM-DD (opcional, por defecto hoy)
+    
     Returns:
         JSON con análisis de antigüedad de cuentas por cobrar
     """
     try:
-        facturas = load_csv("facturas_emitidas.csv")
-        pendientes = facturas[facturas["estado"].isin(["pendiente", "vencida"])].copy()
-        pendientes["fecha_vencimiento"] = pd.to_datetime(pendientes["fecha_vencimiento"])
-        pendientes["dias"] = (datetime.now() - pendientes["fecha_vencimiento"]).dt.days
-        
-        def clasificar(dias):
-            if dias <= 0: return "no_vencido"
-            elif dias <= 30: return "1-30_dias"
-            elif dias <= 60: return "31-60_dias"
-            elif dias <= 90: return "61-90_dias"
-            return "mas_90_dias"
-        
-        pendientes["tramo"] = pendientes["dias"].apply(clasificar)
-        aging = pendientes.groupby("tramo").agg({
-            "importe": "sum",
-            "id_factura": "count"
-        }).reset_index()
-        aging.columns = ["tramo", "importe", "num_facturas"]
+        aging = calcular_aging(resolver_as_of(as_of))
         
         result = {
             "servidor": "MCP Collections Server",
             "herramienta": "get_aging_report",
-            "total_pendiente": float(pendientes["importe"].sum()),
-            "total_facturas": len(pendientes),
-            "tramos": aging.to_dict(orient="records")
+            "as_of": aging.as_of.date().isoformat(),
+            "total_pendiente": aging.total_importe,
+            "total_facturas": aging.total_facturas,
+            "tramos": a_registros(aging.presentes()[["tramo", "importe", "num_facturas"]])
         }
         
         return json.dumps(result, indent=2, default=str)
@@ -293,7 +307,7 @@ def mcp_get_occupancy() -> str:
             "ocupacion_media": round((total_ocu / total_cap * 100) if total_cap > 0 else 0, 1),
             "total_capacidad": int(total_cap),
             "total_ocupadas": int(total_ocu),
-            "residencias": df.to_dict(orient="records")
+            "residencias": a_registros(df)
         }
         
         return json.dumps(result, indent=2, default=str)
@@ -306,7 +320,8 @@ MCP_FINANCIAL_TOOLS = [
     mcp_get_cash_position,
     mcp_get_bank_debt,
     mcp_get_balance_sheet,
-    mcp_calculate_liquidity
+    mcp_calculate_liquidity,
+    mcp_get_cash_flow_projection
 ]
 
 MCP_COLLECTIONS_TOOLS = [
@@ -333,7 +348,7 @@ def mcp_get_interest_rates() -> str:
     result = {
         "servidor": "MCP Market Data Server",
         "herramienta": "get_interest_rates",
-        "fecha_consulta": datetime.now().isoformat(),
+        "fecha_consulta": ahora().date().isoformat(),
         "euribor": {
             "1_mes": 3.042,
             "3_meses": 3.108,
@@ -368,7 +383,7 @@ def mcp_get_tax_rates() -> str:
     result = {
         "servidor": "MCP Market Data Server",
         "herramienta": "get_tax_rates",
-        "fecha_consulta": datetime.now().isoformat(),
+        "fecha_consulta": ahora().date().isoformat(),
         "iva": {
             "general": 21,
             "reducido": 10,
@@ -403,7 +418,7 @@ def mcp_get_economic_indicators() -> str:
     result = {
         "servidor": "MCP Market Data Server",
         "herramienta": "get_economic_indicators",
-        "fecha_consulta": datetime.now().isoformat(),
+        "fecha_consulta": ahora().date().isoformat(),
         "ipc": {
             "interanual": 2.8,
             "mensual": 0.2,
@@ -431,4 +446,7 @@ MCP_MARKET_TOOLS = [
     mcp_get_economic_indicators
 ]
 
+# Resultados de las herramientas de datos en la cache versionada (las de mercado son datos fijos)
+cachear_herramientas(MCP_FINANCIAL_TOOLS + MCP_COLLECTIONS_TOOLS)
+
 ALL_MCP_TOOLS = MCP_FINANCIAL_TOOLS + MCP_COLLECTIONS_TOOLS + MCP_MARKET_TOOLS
@@ -0,0 +1,47 @@
+"""
+Fixtures comunes: cada test trabaja sobre una copia de data/ en un
+directorio temporal, con su propio DataStore, para poder modificar los CSV
+sin tocar los datos del proyecto.
+"""
+
+import os
+import shutil
+import sys
+
+import pandas as pd
+import pytest
+
+# Asegurar que la raíz del proyecto está en el path
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from datastore import DataStore
+
+DATA_DIR = os.path.join(ROOT_DIR, "data")
+
+
+def copiar_datos(destino) -> str:
+    """Copia los CSV de data/ a destino y devuelve la ruta."""
+    destino = str(destino)
+    for nombre in os.listdir(DATA_DIR):
+        if nombre.endswith(".csv"):
+            shutil.copy(os.path.join(DATA_DIR, nombre), destino)
+    return destino
+
+
+@pytest.fixture
+def store(tmp_path) -> DataStore:
+    """DataStore sobre una copia de los datos del proyecto."""
+    return DataStore(copiar_datos(tmp_path))
+
+
+@pytest.fixture
+def store_sin_pendientes(tmp_path) -> DataStore:
+    """DataStore con todas las facturas pendientes marcadas como pagadas."""
+    ruta = copiar_datos(tmp_path)
+    fichero = os.path.join(ruta, "facturas_emitidas.csv")
+    facturas = pd.read_csv(fichero)
+    facturas.loc[facturas["estado"] == "pendiente", "estado"] = "pagada"
+    facturas.to_csv(fichero, index=False)
+    return DataStore(ruta)
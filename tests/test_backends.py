@@ -0,0 +1,75 @@
+"""
+Equivalencia de los backends de cobros: en memoria, streaming por
+particiones y SQLite dan los mismos totales, morosos y vencimientos.
+"""
+
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import copiar_datos
+from datastore import DataStore, resumen_cobros
+from datastore.sql import backend_sql
+from engines import simular_estres_liquidez
+
+AHORA = datetime(2025, 10, 1)
+BACKENDS = ["memoria", "streaming", "sql"]
+
+
+def resumen(store, backend: str, **kwargs):
+    """Resumen de cobros calculado con el backend indicado."""
+    if backend == "sql":
+        backend_sql(store, crear=True)
+        return resumen_cobros(ahora=AHORA, store=store, **kwargs)
+    return resumen_cobros(ahora=AHORA, streaming=backend == "streaming", store=store, **kwargs)
+
+
+def _comparables(df: pd.DataFrame, clave: str) -> pd.DataFrame:
+    df = df.sort_values(clave, na_position="last").reset_index(drop=True)
+    return df.astype({c: float for c in df.columns if c != clave})
+
+
+@pytest.mark.parametrize("backend", BACKENDS[1:])
+def test_backends_equivalentes(store, backend):
+    referencia = resumen(store, "memoria", horizonte_dias=90)
+    otro = resumen(store, backend, horizonte_dias=90)
+    if backend == "sql":
+        assert type(otro).__name__ == "ResumenCobrosSQL"
+
+    for total in ("importe_abierto", "num_abiertas", "num_vencidas", "importe_previsto", "num_previstos"):
+        assert getattr(otro, total) == pytest.approx(getattr(referencia, total)), total
+    pd.testing.assert_frame_equal(_comparables(otro.morosos(), "id_estudiante"),
+                                  _comparables(referencia.morosos(), "id_estudiante"), check_dtype=False)
+    pd.testing.assert_frame_equal(_comparables(otro.vencimientos(), "fecha_vencimiento"),
+                                  _comparables(referencia.vencimientos(), "fecha_vencimiento"), check_dtype=False)
+    pd.testing.assert_frame_equal(otro.cobros_agregados(), referencia.cobros_agregados(), check_dtype=False)
+    assert otro.cobros()["id_factura"].tolist() == referencia.cobros()["id_factura"].tolist()
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_backends_sin_pendientes(store_sin_pendientes, backend):
+    vacio = resumen(store_sin_pendientes, backend, horizonte_dias=90)
+    assert vacio.num_previstos == 0
+    assert vacio.importe_previsto == 0
+    assert vacio.cobros().empty and "fecha_vencimiento" in vacio.cobros().columns
+    assert vacio.cobros_agregados().empty
+
+
+def test_estres_igual_con_sql(store, tmp_path):
+    destino = tmp_path / "sql"
+    destino.mkdir()
+    store_sql = DataStore(copiar_datos(destino))
+    backend_sql(store_sql, crear=True)
+    resultados = [simular_estres_liquidez(escenarios=200, horizonte_dias=90, as_of=AHORA, semilla=3, procesos=1,
+                                          store=s) for s in (store, store_sql)]
+    assert np.allclose(resultados[0].saldo_minimo, resultados[1].saldo_minimo)
+
+
+def test_estres_sin_pendientes_con_sql(store_sin_pendientes):
+    backend_sql(store_sin_pendientes, crear=True)
+    resultado = simular_estres_liquidez(escenarios=200, horizonte_dias=90, as_of=AHORA, semilla=1, procesos=1,
+                                        store=store_sin_pendientes)
+    assert resultado.escenarios == 200
+    assert np.isfinite(resultado.saldo_minimo).all()
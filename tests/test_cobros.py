@@ -0,0 +1,39 @@
+"""Previsión de cobros y proyección de caja."""
+
+import pytest
+
+from datastore import resumen_cobros
+from engines import proyectar_caja
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_cobros_agregados_cuadran_con_el_detalle(store, streaming):
+    resumen = resumen_cobros(horizonte_dias=100_000, streaming=streaming, store=store)
+    agregados = resumen.cobros_agregados()
+    assert agregados["importe"].sum() == pytest.approx(resumen.cobros()["importe"].sum())
+    assert agregados["num_facturas"].sum() == resumen.num_previstos == len(resumen.cobros())
+    assert not agregados.duplicated(["fecha_vencimiento", "id_estudiante"]).any()
+
+
+def test_detalle_de_cobros_requiere_cota(store):
+    resumen = resumen_cobros(streaming=True, store=store)
+    assert resumen._cobros is None
+    with pytest.raises(ValueError):
+        resumen.cobros()
+
+
+def test_cobros_sin_pendientes_conserva_columnas(store_sin_pendientes):
+    resumen = resumen_cobros(horizonte_dias=30, store=store_sin_pendientes)
+    cobros = resumen.cobros()
+    assert cobros.empty
+    assert {"id_estudiante", "importe", "fecha_vencimiento"} <= set(cobros.columns)
+    assert str(cobros["fecha_vencimiento"].dtype).startswith("datetime64")
+    assert resumen.cobros_agregados().empty
+
+
+def test_proyeccion_caja_sin_pendientes(store_sin_pendientes):
+    proyeccion = proyectar_caja(horizonte_dias=90, as_of="2025-10-01", store=store_sin_pendientes)
+    totales = proyeccion.totales()
+    assert totales["cobros"] == 0.0
+    assert totales["gastos_fijos"] < 0
+    assert len(proyeccion.resumen("W")["periodos"]) > 0
@@ -0,0 +1,20 @@
+"""Cubo de desviaciones presupuestarias."""
+
+import pandas as pd
+
+from engines import calcular_desviaciones, cubo_desviaciones
+
+
+def test_misma_seleccion_misma_entrada(store):
+    cubo = cubo_desviaciones(store)
+    residencia = cubo.residencias[0]
+    a = cubo.desviaciones("mes", residencia=residencia.upper(), desde="2025-01")
+    b = cubo.desviaciones("mes", residencia=residencia, desde="2025-1")
+    pd.testing.assert_frame_equal(a, b)
+    assert len(cubo._agregados) == 1
+
+
+def test_resultado_no_comparte_la_tabla_memoizada(store):
+    tabla = calcular_desviaciones("residencia", store=store)
+    tabla["desv_ingresos"] = 0.0
+    assert (calcular_desviaciones("residencia", store=store)["desv_ingresos"] != 0).any()
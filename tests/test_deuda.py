@@ -0,0 +1,38 @@
+"""Cuadros de amortización y sensibilidad al Euribor."""
+
+import os
+
+import pandas as pd
+
+from datastore import DataStore
+from engines import cuadro_amortizacion
+from engines.deuda import MAX_REJILLAS_EURIBOR
+
+CURVA = {"12_meses": 2.5}
+
+
+def test_memo_de_rejillas_euribor_acotada(store):
+    cuadro = cuadro_amortizacion("2025-10-01", store=store)
+    primera = cuadro.rejilla_euribor(CURVA, (0, 100))
+    assert cuadro.rejilla_euribor(CURVA, [0, 100]) is primera
+    for choque in range(MAX_REJILLAS_EURIBOR):
+        cuadro.rejilla_euribor(CURVA, (0, 200 + choque))
+    assert cuadro.rejilla_euribor(CURVA, (0, 100)) is not primera
+
+
+def test_modalidad_fija_no_cambia_con_el_euribor(store):
+    cuadro = cuadro_amortizacion("2025-10-01", store=store)
+    assert not cuadro.modalidad_informada and cuadro.prestamos["variable"].all()
+
+    fichero = os.path.join(store.data_path, "deuda_bancaria.csv")
+    deuda = pd.read_csv(fichero).assign(modalidad="fijo")
+    deuda.to_csv(fichero, index=False)
+    fijo = cuadro_amortizacion("2025-10-01", store=DataStore(store.data_path))
+    assert fijo.modalidad_informada and not fijo.prestamos["variable"].any()
+    assert (fijo.rejilla_euribor(CURVA, (-100, 0, 300))["variacion_cuota"] == 0).all()
+
+
+def test_conciliacion_cuota(store):
+    conciliacion = cuadro_amortizacion("2025-10-01", store=store).conciliacion_cuota()
+    assert conciliacion["cuota_contractual"] == store.get("deuda_bancaria")["cuota_mensual"].sum()
+    assert conciliacion["diferencia"] == conciliacion["cuota_calculada"] - conciliacion["cuota_contractual"]
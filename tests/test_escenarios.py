@@ -0,0 +1,23 @@
+"""Rejilla de escenarios FP&A."""
+
+import numpy as np
+
+from engines import escenarios_fpa, rango
+from engines.escenarios import MAX_REJILLAS
+
+
+def test_ingresos_no_dependen_de_la_morosidad(store):
+    rejilla = escenarios_fpa(store=store)
+    assert rejilla.ingresos.shape == rejilla.forma
+    assert np.array_equal(rejilla.ingresos[:, :, 0], rejilla.ingresos[:, :, -1])
+    assert (rejilla.ebitda[:, :, 0] >= rejilla.ebitda[:, :, -1]).all()
+
+
+def test_memo_de_rejillas_acotada(store):
+    primera = escenarios_fpa(store=store)
+    assert escenarios_fpa(store=store) is primera
+    recientes = [escenarios_fpa(variaciones_precio=rango(-maximo, maximo, 1), store=store)
+                 for maximo in range(1, MAX_REJILLAS + 1)]
+    # La primera rejilla ha salido de la memo; las últimas siguen dentro
+    assert escenarios_fpa(variaciones_precio=rango(-MAX_REJILLAS, MAX_REJILLAS, 1), store=store) is recientes[-1]
+    assert escenarios_fpa(store=store) is not primera
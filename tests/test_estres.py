@@ -0,0 +1,37 @@
+"""Test de estrés de liquidez."""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from engines import simular_estres_liquidez
+from engines.estres import ModeloEstres
+
+
+def test_estres_sin_pendientes(store_sin_pendientes):
+    resultado = simular_estres_liquidez(escenarios=200, horizonte_dias=90, as_of="2025-10-01",
+                                        semilla=1, procesos=1, store=store_sin_pendientes)
+    assert resultado.escenarios == 200
+    assert np.isfinite(resultado.saldo_minimo).all()
+
+
+def test_estres_reproducible_con_semilla(store):
+    a = simular_estres_liquidez(escenarios=200, horizonte_dias=90, as_of="2025-10-01", semilla=7, procesos=1,
+                                store=store)
+    b = simular_estres_liquidez(escenarios=200, horizonte_dias=90, as_of="2025-10-01", semilla=7, procesos=1,
+                                store=store)
+    assert np.array_equal(a.saldo_minimo, b.saldo_minimo)
+
+
+def test_choque_de_tipos_solo_en_prestamos_variables(store):
+    fichero = os.path.join(store.data_path, "deuda_bancaria.csv")
+    pd.read_csv(fichero).assign(modalidad="fijo").to_csv(fichero, index=False)
+    modelo = ModeloEstres(90, pd.Timestamp("2025-10-01"), store)
+    assert not modelo.capital_en_cuota.any()
+    parametros = {"subida_tipos_desviacion": 0.0}
+    a = simular_estres_liquidez(escenarios=200, horizonte_dias=90, as_of="2025-10-01", semilla=7, procesos=1,
+                                parametros={**parametros, "subida_tipos_media": 0.0}, store=store)
+    b = simular_estres_liquidez(escenarios=200, horizonte_dias=90, as_of="2025-10-01", semilla=7, procesos=1,
+                                parametros={**parametros, "subida_tipos_media": 3.0}, store=store)
+    assert np.array_equal(a.saldo_minimo, b.saldo_minimo)
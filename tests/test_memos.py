@@ -0,0 +1,36 @@
+"""Memos por día de análisis (as_of) acotadas a MAX_DIAS_MEMO."""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from datastore import MAX_DIAS_MEMO
+from engines import cuadro_amortizacion, ranking_morosos, scoring_pagos
+
+HOY = datetime(2025, 10, 1, 12, 0)
+
+
+@pytest.mark.parametrize("calcular", [
+    lambda store, dia: ranking_morosos(as_of=dia, store=store),
+    lambda store, dia: scoring_pagos(as_of=dia, store=store),
+    lambda store, dia: cuadro_amortizacion(as_of=dia, store=store),
+], ids=["morosos", "scoring", "deuda"])
+def test_memo_por_dia_acotada(store, calcular):
+    primero = calcular(store, HOY)
+    # Mismo día, otra hora: misma entrada
+    assert calcular(store, HOY + timedelta(hours=3)) is primero
+    dias = [HOY + timedelta(days=i) for i in range(1, MAX_DIAS_MEMO + 1)]
+    recientes = [calcular(store, dia) for dia in dias]
+    assert calcular(store, dias[-1]) is recientes[-1]
+    assert calcular(store, HOY) is not primero
+
+
+@pytest.mark.parametrize("calcular", [
+    lambda store, dia: ranking_morosos(as_of=dia, store=store),
+    lambda store, dia: scoring_pagos(as_of=dia, store=store),
+    lambda store, dia: cuadro_amortizacion(as_of=dia, store=store),
+], ids=["morosos", "scoring", "deuda"])
+def test_memo_por_dia_guarda_el_dia(store, calcular):
+    # La entrada compartida no conserva la hora del primer llamante
+    assert calcular(store, HOY).as_of == datetime(2025, 10, 1)
+    assert calcular(store, HOY + timedelta(hours=3)).as_of == datetime(2025, 10, 1)
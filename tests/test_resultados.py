@@ -0,0 +1,46 @@
+"""Cache de resultados de herramientas."""
+
+from typing import Optional
+
+import pytest
+
+from datastore import CacheResultados, cachear
+
+
+@pytest.fixture
+def cache(store) -> CacheResultados:
+    return CacheResultados(store=store)
+
+
+def contador(respuesta: str):
+    """Función de prueba que cuenta sus llamadas."""
+    llamadas = []
+
+    def herramienta(id_estudiante: str = "", semilla: Optional[int] = None) -> str:
+        llamadas.append(id_estudiante)
+        return respuesta
+    return herramienta, llamadas
+
+
+def test_resultados_repetidos_salen_de_la_cache(cache):
+    funcion, llamadas = contador("## Resultado")
+    envuelta = cachear("prueba", funcion, cache)
+    assert envuelta("EST-1", semilla=1) == envuelta(id_estudiante="EST-1", semilla=1)
+    assert len(llamadas) == 1
+
+
+@pytest.mark.parametrize("respuesta", ["Error: fallo", '{"error": "fallo"}', "❌ Estudiante EST-1 no encontrado."])
+def test_errores_no_se_cachean(cache, respuesta):
+    funcion, llamadas = contador(respuesta)
+    envuelta = cachear("prueba", funcion, cache)
+    envuelta("EST-1", semilla=1)
+    envuelta("EST-1", semilla=1)
+    assert len(llamadas) == 2
+
+
+def test_llamadas_sin_semilla_no_se_cachean(cache):
+    funcion, llamadas = contador("## Resultado")
+    envuelta = cachear("prueba", funcion, cache)
+    envuelta("EST-1")
+    envuelta("EST-1")
+    assert len(llamadas) == 2
@@ -0,0 +1,48 @@
+"""DataStore: derivados memoizados por versión de datos."""
+
+import os
+import threading
+
+from datastore.schemas import huella_esquema
+
+
+def test_derivados_distintos_se_construyen_a_la_vez(store):
+    # Cada constructor espera a que el otro haya empezado: con un lock común se bloquearían
+    empezados = [threading.Event(), threading.Event()]
+    resultados = {}
+
+    def construir(i):
+        empezados[i].set()
+        return empezados[1 - i].wait(timeout=5)
+
+    hilos = [threading.Thread(target=lambda i=i: resultados.update(
+        {i: store.derivado(f"prueba_{i}", ["ocupacion"], lambda: construir(i))})) for i in range(2)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join(timeout=10)
+    assert resultados == {0: True, 1: True}
+
+
+def test_misma_clave_se_construye_una_vez(store):
+    llamadas = []
+    barrera = threading.Barrier(4)
+
+    def pedir():
+        barrera.wait()
+        store.derivado("prueba", ["ocupacion"], lambda: llamadas.append(1) or len(llamadas))
+
+    hilos = [threading.Thread(target=pedir) for _ in range(4)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join(timeout=10)
+    assert llamadas == [1]
+
+
+def test_snapshot_escribe_metadatos_sin_temporales(store):
+    store.get("ocupacion")
+    ficheros = os.listdir(store.snapshots.directorio)
+    assert "ocupacion.json" in ficheros
+    assert not [f for f in ficheros if f.endswith(".tmp")]
+    assert store.snapshots.vigente("ocupacion", store.versiones.hash("ocupacion"), huella_esquema("ocupacion"))
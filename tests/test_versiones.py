@@ -0,0 +1,38 @@
+"""Servicio de versión de datos."""
+
+import os
+
+import pytest
+
+from datastore import VersionDatos
+from datastore import versiones as versiones_mod
+
+
+def test_hash_de_csv_borrado(store):
+    versiones = VersionDatos(store.data_path)
+    assert len(versiones.hash("ocupacion")) == 64
+    version = versiones.actual()
+
+    os.remove(os.path.join(store.data_path, "ocupacion.csv"))
+    with pytest.raises(FileNotFoundError):
+        versiones.hash("ocupacion")
+    # El borrado cuenta como cambio de versión
+    assert versiones.actual() > version
+
+
+def test_hash_de_csv_inexistente(store):
+    with pytest.raises(FileNotFoundError):
+        VersionDatos(store.data_path).hash("no_existe")
+
+
+def test_huella_sin_vigilante_reescanea_con_intervalo(store, monkeypatch):
+    versiones = VersionDatos(store.data_path)
+    huella = versiones.huella()
+    escaneos = []
+    monkeypatch.setattr(versiones, "escanear", lambda: escaneos.append(1) or [])
+    assert versiones.huella() == huella
+    assert escaneos == []
+
+    monkeypatch.setattr(versiones_mod, "INTERVALO_HUELLA", 0.0)
+    versiones.huella()
+    assert escaneos == [1]